@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Minecraft Server Activity
+Tell whether the server is paused and how much of the world changed.
+
+``autopause.py`` freezes the JVM with SIGSTOP when nobody is online; a
+frozen server neither answers RCON nor writes to disk. The backup scheduler
+uses the process state to avoid RCON calls that would only time out, and
+file modification times to skip backups when nothing changed since the last
+one or to take an extra one after heavy activity.
+"""
+
+import os
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVER_COMMANDS = ("paper.jar", "-jar")
+
+
+def find_server_pid() -> Optional[int]:
+    """Return the PID of the Java server process, as autopause.py pauses it."""
+    candidates = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                argv = f.read().split(b"\0")
+        except OSError:
+            continue
+        if not argv or b"java" not in os.path.basename(argv[0]):
+            continue
+        command = b" ".join(argv).decode("utf-8", errors="replace")
+        for rank, marker in enumerate(SERVER_COMMANDS):
+            if marker in command:
+                candidates.append((rank, int(entry)))
+                break
+    return min(candidates)[1] if candidates else None
+
+
+def process_state(pid: int) -> Optional[str]:
+    """Return the one-letter state from /proc/<pid>/stat (T = stopped)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name is in parentheses and may contain spaces
+            return f.read().rsplit(")", 1)[1].split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+class PauseTracker:
+    """Follow the server's paused state and when it last changed."""
+
+    def __init__(self):
+        self.pid: Optional[int] = None
+        self.paused = False
+        self.changed_at = 0.0
+
+    def poll(self) -> bool:
+        """Refresh and return the paused state."""
+        state = process_state(self.pid) if self.pid else None
+        if state is None:
+            self.pid = find_server_pid()
+            state = process_state(self.pid) if self.pid else None
+        paused = state in ("T", "t")
+        if paused != self.paused:
+            logger.info(f"Server {'paused' if paused else 'resumed'}")
+            self.paused = paused
+            self.changed_at = time.monotonic()
+        return paused
+
+    def settled(self, seconds: float) -> bool:
+        """Whether the state has held for at least ``seconds``."""
+        return time.monotonic() - self.changed_at >= seconds
+
+
+def scan_changes(data_dir: str, since: float, exclude: Callable[[str, bool], bool],
+                 stop_at_first: bool = False) -> Dict[str, int]:
+    """Count files (and their bytes) modified after ``since`` under data_dir.
+
+    Only stats files; excluded directories are not walked.
+    """
+    result = {"files": 0, "bytes": 0, "region_files": 0, "region_bytes": 0}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            entries = list(os.scandir(os.path.join(data_dir, rel_dir)))
+        except OSError:
+            continue
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not exclude(rel, True):
+                        stack.append(rel)
+                    continue
+                if not entry.is_file(follow_symlinks=False) or exclude(rel, False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if st.st_mtime <= since:
+                continue
+            result["files"] += 1
+            result["bytes"] += st.st_size
+            if entry.name.endswith(".mca"):
+                result["region_files"] += 1
+                result["region_bytes"] += st.st_size
+            if stop_at_first:
+                return result
+    return result
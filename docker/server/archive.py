@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup Archives
+Indexed tar archives that can be read and extracted selectively and in parallel.
+
+gz, bz2 and xz backups are written as independently compressed blocks (see
+``compression.ParallelBlockWriter``). Next to each archive a small index
+records where every block starts and where each tar member's header lies in
+the uncompressed stream. With it, a single world, dimension or region file
+is restored by decompressing only the blocks that hold it, and a full
+restore is split into runs of members that are extracted on all cores.
+zstd archives and archives without an index fall back to one sequential
+pass.
+
+The index doubles as the backup's integrity manifest: it holds the SHA-256
+of every file (hashed as tarfile reads it, so there is no second pass over
+the data directory) and of the compressed archive as a whole.
+"""
+
+import os
+import bz2
+import gzip
+import json
+import lzma
+import hashlib
+import time
+import zlib
+import tarfile
+import logging
+import threading
+import subprocess
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Set, Tuple
+
+import compression
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".index.json.gz"
+INDEX_VERSION = 1
+ARCHIVE_ROOT = "data"
+
+DECOMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    "gz": lambda data: zlib.decompress(data, 31),
+    "bz2": bz2.decompress,
+    "xz": lzma.decompress,
+}
+
+# The stdlib openers (unlike tarfile's own) read concatenated members/streams
+OPENERS = {
+    "gz": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open,
+}
+
+# "tar" filter: no absolute or escaping paths, no setuid bits (Python 3.12+, 3.11.4+)
+EXTRACT_ARGS = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+
+
+def archive_method(path: str) -> Optional[str]:
+    """Return the compression method of a backup archive from its name."""
+    for method, ext in compression.EXTENSIONS.items():
+        if path.endswith(f".{ext}"):
+            return method
+    return None
+
+
+def index_path(archive: str) -> str:
+    return f"{archive}{INDEX_SUFFIX}"
+
+
+def write_index(archive: str, method: str, members: List[List[Any]],
+                blocks: Optional[List[Tuple[int, int, int, int]]],
+                checksum: Optional[str] = None, size: Optional[int] = None):
+    index = {
+        "version": INDEX_VERSION,
+        "method": method,
+        "checksum": checksum,
+        "size": size,
+        "blocks": [list(block) for block in blocks] if blocks is not None else None,
+        "members": members,
+    }
+    path = index_path(archive)
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_index(archive: str) -> Optional[Dict[str, Any]]:
+    try:
+        with gzip.open(index_path(archive), "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable archive index: {e}")
+        return None
+
+
+class HashingReader:
+    """Pass-through reader that hashes everything read from it."""
+
+    def __init__(self, source: BinaryIO):
+        self.source = source
+        self.hash = hashlib.sha256()
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        self.hash.update(data)
+        self.bytes += len(data)
+        return data
+
+    def close(self):
+        self.source.close()
+
+
+class _IndexingTarFile(tarfile.TarFile):
+    """TarFile that records each member's offset and content hash as it is added."""
+
+    members_index: List[List[Any]]
+    store: Optional[Callable[[str], bool]] = None
+
+    def addfile(self, tarinfo, fileobj=None):
+        entry = [tarinfo.name, self.offset, tarinfo.size, tarinfo.type.decode(), None]
+        if self.store is not None and tarinfo.isreg() and hasattr(self.fileobj.fileobj, "set_stored"):
+            # A hint only: up to one tar buffer of neighbouring data may land on either side
+            self.fileobj.fileobj.set_stored(self.store(member_path(tarinfo.name)))
+        if fileobj is not None:
+            fileobj = HashingReader(fileobj)
+        super().addfile(tarinfo, fileobj)
+        if fileobj is not None:
+            entry[4] = fileobj.hash.hexdigest()
+        self.members_index.append(entry)
+
+
+def write_tar(source_dir: str, output: BinaryIO, exclude: Callable[[str, bool], bool],
+              store: Optional[Callable[[str], bool]] = None) -> List[List[Any]]:
+    """Write source_dir as a tar stream under data/ and return the member index.
+
+    ``exclude`` is called with each data-relative path and whether it is a
+    directory; excluded directories are not descended into. Files for which
+    ``store`` returns true are passed to the writer uncompressed where it
+    supports that.
+
+    Each member is ``[name, header_offset, size, type, sha256]``, with the
+    offset in the uncompressed tar stream and sha256 set for regular files.
+    """
+    def keep(tarinfo: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
+        rel = member_path(tarinfo.name)
+        return None if rel and exclude(rel, tarinfo.isdir()) else tarinfo
+
+    with _IndexingTarFile.open(fileobj=output, mode="w|") as tar:
+        tar.members_index = []
+        tar.store = store
+        tar.add(source_dir, arcname=ARCHIVE_ROOT, filter=keep)
+    return tar.members_index
+
+
+def plan_runs(members: List[List[Any]], wanted: List[bool], threads: int) -> List[Tuple[int, int]]:
+    """Group wanted members into (start offset, count) runs sized for the workers."""
+    total = sum(m[2] for m, keep in zip(members, wanted) if keep)
+    target = max(total // (threads * 4), 8 * 1024 * 1024)
+
+    runs: List[Tuple[int, int]] = []
+    start, count, size = None, 0, 0
+    for member, keep in zip(members, wanted):
+        if not keep or (count and size >= target):
+            if count:
+                runs.append((start, count))
+            start, count, size = None, 0, 0
+            if not keep:
+                continue
+        if start is None:
+            start = member[1]
+        count += 1
+        size += member[2]
+    if count:
+        runs.append((start, count))
+    return runs
+
+
+def open_stream(raw: BinaryIO, method: Optional[str]) -> Tuple[BinaryIO, Callable[[], None]]:
+    """Wrap a compressed byte stream in a decompressing reader.
+
+    Returns the reader and a function to call once reading is finished,
+    which raises if decompression failed.
+    """
+    if method != "zstd":
+        opener = OPENERS.get(method)
+        return (opener(raw, "rb") if opener else raw), lambda: None
+
+    process = subprocess.Popen(["zstd", "-dcq"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def pump():
+        try:
+            for data in iter(lambda: raw.read(1024 * 1024), b""):
+                process.stdin.write(data)
+        except (BrokenPipeError, ValueError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    thread = threading.Thread(target=pump, name="zstd-feed", daemon=True)
+    thread.start()
+
+    def finish():
+        process.stdout.close()
+        thread.join()
+        if process.wait() != 0:
+            raise RuntimeError("zstd failed to decompress the archive")
+
+    return process.stdout, finish
+
+
+def member_path(name: str) -> str:
+    """Strip the archive root (data/) from a member name."""
+    return name.split("/", 1)[1] if "/" in name else ""
+
+
+def path_selector(paths: List[str]) -> Callable[[str], bool]:
+    """Match data-relative paths that equal or lie inside any of ``paths``."""
+    prefixes = [p.strip("/") for p in paths]
+    return lambda rel: any(rel == p or rel.startswith(f"{p}/") for p in prefixes)
+
+
+class BlockReader:
+    """Sequential reader over an archive's uncompressed stream, from any offset."""
+
+    def __init__(self, path: str, method: str, blocks: List[List[int]], start: int = 0):
+        self.file = open(path, "rb")
+        self.decompress = DECOMPRESSORS[method]
+        self.blocks = blocks
+        self.starts = [block[2] for block in blocks]
+        self.position = start
+        self.current = -1
+        self.data = b""
+
+    def read(self, size: int = -1) -> bytes:
+        out = bytearray()
+        while size < 0 or len(out) < size:
+            number = bisect_right(self.starts, self.position) - 1
+            if number < 0 or number >= len(self.blocks):
+                break
+            if number != self.current:
+                offset, length = self.blocks[number][:2]
+                self.file.seek(offset)
+                self.data = self.decompress(self.file.read(length))
+                self.current = number
+            start = self.position - self.starts[number]
+            if start >= len(self.data):
+                break
+            end = len(self.data) if size < 0 else min(len(self.data), start + size - len(out))
+            out += self.data[start:end]
+            self.position += end - start
+        return bytes(out)
+
+    def close(self):
+        self.file.close()
+
+
+class Extractor:
+    """Extract all or part of a backup archive into a data directory."""
+
+    def __init__(self, archive: str, dest: str, select: Optional[Callable[[str], bool]] = None,
+                 threads: int = 0):
+        self.archive = archive
+        self.dest = dest
+        self.select = select
+        self.threads = compression.resolve_threads(threads)
+        self.method = archive_method(archive)
+        self.index = load_index(archive)
+        self.links: List[tarfile.TarInfo] = []
+        self.stats = {"files": 0, "bytes": 0}
+        self.lock = threading.Lock()
+
+    def _wanted(self, name: str) -> bool:
+        rel = member_path(name)
+        return bool(rel) and (self.select is None or self.select(rel))
+
+    def _extract(self, tar: tarfile.TarFile, tarinfo: tarfile.TarInfo):
+        tarinfo.name = member_path(tarinfo.name)
+        if tarinfo.islnk():
+            # Hard link targets may belong to another worker; link them at the end
+            tarinfo.linkname = member_path(tarinfo.linkname)
+            with self.lock:
+                self.links.append(tarinfo)
+            return
+        tar.extract(tarinfo, self.dest, **EXTRACT_ARGS)
+        with self.lock:
+            self.stats["files"] += 1
+            self.stats["bytes"] += tarinfo.size
+
+    def _run_sequential(self):
+        with open(self.archive, "rb") as raw:
+            stream, finish = open_stream(raw, self.method)
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for tarinfo in tar:
+                    if self._wanted(tarinfo.name):
+                        self._extract(tar, tarinfo)
+            finish()
+
+    def _run_members(self, start: int, count: int):
+        reader = BlockReader(self.archive, self.method, self.index["blocks"], start)
+        try:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                for _ in range(count):
+                    tarinfo = tar.next()
+                    if tarinfo is None:
+                        break
+                    self._extract(tar, tarinfo)
+        finally:
+            reader.close()
+
+    def _prepare_dirs(self):
+        # Create parents up front so workers never race on os.makedirs
+        dirs: Set[str] = set()
+        for member in self.index["members"]:
+            if self._wanted(member[0]):
+                rel = member_path(member[0])
+                dirs.add(rel if member[3] == "5" else os.path.dirname(rel))
+        for rel in sorted(dirs):
+            os.makedirs(os.path.join(self.dest, rel), exist_ok=True)
+
+    def _link(self):
+        for tarinfo in self.links:
+            target = os.path.join(self.dest, tarinfo.linkname)
+            path = os.path.join(self.dest, tarinfo.name)
+            try:
+                if os.path.lexists(path):
+                    os.remove(path)
+                os.link(target, path)
+                self.stats["files"] += 1
+            except OSError as e:
+                logger.warning(f"Could not restore hard link {tarinfo.name}: {e}")
+
+    def run(self) -> Dict[str, float]:
+        started = time.monotonic()
+        os.makedirs(self.dest, exist_ok=True)
+
+        if self.index and self.index.get("blocks") and self.method in DECOMPRESSORS:
+            members = self.index["members"]
+            runs = plan_runs(members, [self._wanted(m[0]) for m in members], self.threads)
+            logger.info(f"Extracting {len(runs)} run(s) of members on {self.threads} thread(s)")
+            self._prepare_dirs()
+            with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="extract") as executor:
+                for future in [executor.submit(self._run_members, *run) for run in runs]:
+                    future.result()
+        else:
+            logger.info("No block index for this archive, extracting sequentially")
+            self._run_sequential()
+
+        self._link()
+        self.stats["seconds"] = round(time.monotonic() - started, 3)
+        return self.stats
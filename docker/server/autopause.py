@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Minecraft Autopause - Pause the server when nobody is using it, wake it on
+the next login.
+
+External clients connect to port 25565, which is owned by the proxy (see
+proxy.py) running in this process. While the server runs, the proxy
+forwards to it on port 25566. While it is paused (SIGSTOP), the proxy shows
+"server sleeping" and wakes it on a login.
+
+Pause conditions (all must hold for AUTOPAUSE_TIMEOUT minutes):
+  1. No players online
+  2. Chunker not actively generating
+
+Everything is driven by events rather than polling:
+  - Players are counted from the logins passing through the proxy, so there
+    is no RCON traffic and no process is forked while anyone is online
+  - Chunker progress files are watched with inotify
+  - The proxy calls back directly when a login asks for a wake
+
+A single timer is armed for the moment the idle deadline is reached, so the
+server pauses exactly then and resumes as soon as a login arrives. Just
+before pausing, the server's own status response is captured, so the
+proxy shows the real MOTD, version, player limit and icon while it sleeps.
+
+Speculative wake (AUTOPAUSE_PING_WAKE): players usually refresh the server
+list a few seconds before clicking Join. With this on, a server list ping
+from an address that played recently, or several pings from one address in
+a minute, start resuming the server right away. The wake-up then overlaps
+with the player picking the server. If no login follows within the grace
+period, the server is paused again.
+
+Every pause and wake is timed. Each step is appended to a JSON-lines event
+log (AUTOPAUSE_EVENT_LOG), with milliseconds since the idle deadline or the
+wake trigger. Percentiles of recent transitions go into the proxy's stats
+file, which the monitor exports. The steps are:
+  pause: idle_deadline, status_captured, paused (SIGSTOP sent)
+  wake:  wake_trigger, sigcont, forwarding (proxy passing connections
+         through), responsive (first status response), player_joined
+
+Wake modes (AUTOPAUSE_WAKE_MODE):
+  hold       - the proxy keeps the login open and splices it through to the
+               server once it is back, so the player just sees a slow login
+  disconnect - the proxy disconnects with a "please reconnect" message
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import ctypes
+import signal
+import struct
+import asyncio
+import collections
+
+from activity import find_server_pid
+from mcproto import fetch_status, server_responds
+from proxy import FORWARD, SLEEPING, STATS_FILE, STATUS_PROTOCOLS, WAKE_MODES, Proxy
+
+# Configuration
+TIMEOUT = int(os.getenv("AUTOPAUSE_TIMEOUT", "10")) * 60
+WAKE_MODE = os.getenv("AUTOPAUSE_WAKE_MODE", "hold")
+STATUS_PROTOCOL = os.getenv("AUTOPAUSE_STATUS_PROTOCOL", "client")
+PING_WAKE = os.getenv("AUTOPAUSE_PING_WAKE", "false").lower() == "true"
+PING_WAKE_RECENT = float(os.getenv("AUTOPAUSE_PING_WAKE_RECENT", "24")) * 3600
+PING_WAKE_PINGS = int(os.getenv("AUTOPAUSE_PING_WAKE_PINGS", "3"))
+PING_WAKE_GRACE = float(os.getenv("AUTOPAUSE_PING_WAKE_GRACE", "60"))
+PING_WINDOW = 60.0                 # Seconds in which AUTOPAUSE_PING_WAKE_PINGS pings count
+PING_WAKE_COOLDOWN = 600.0         # Seconds an address is ignored after a wasted speculative wake
+EVENT_LOG = os.getenv("AUTOPAUSE_EVENT_LOG", "/data/logs/autopause-events.jsonl")
+EVENT_LOG_MAX_BYTES = 1024 * 1024  # Rotated to .1 beyond this
+TIMING_SAMPLES = 100               # Recent transitions the percentiles are taken over
+CHUNKER_ACTIVITY_THRESHOLD = 120   # Seconds since a progress file changed that count as generating
+CHUNKER_FILES = ("/data/*_pregenerator.txt", "/data/plugins/Chunker/*.txt")
+PLUGINS_DIR = "/data/plugins"
+CHUNKER_DIR = "/data/plugins/Chunker"
+
+# Ports
+PROXY_PORT = 25565
+MC_PORT = 25566
+
+STARTUP_CHECK_INTERVAL = 2.0   # Seconds between status pings while the server starts
+RESPONSIVE_TIMEOUT = 30.0      # Seconds to wait for a resumed server to answer
+RESPONSIVE_INTERVAL = 0.05     # Seconds between status pings to a resumed server
+UNCLASSIFIED_RETRY = 1.0       # Seconds to put off a pause for connections still handshaking
+
+# inotify event flags (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+
+def log(message):
+    print(f"[AutoPause] {time.strftime('%H:%M:%S')} {message}", flush=True)
+
+def format_age(seconds):
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+def chunker_last_write():
+    """Newest modification time of any Chunker progress file, or 0."""
+    newest = 0
+    for pattern in CHUNKER_FILES:
+        for path in glob.glob(pattern):
+            try:
+                newest = max(newest, os.path.getmtime(path))
+            except OSError:
+                pass
+    return newest
+
+
+class Inotify:
+    """Just enough of inotify (through libc) to watch a few directories."""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}   # watch descriptor -> directory
+
+    def watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, path.encode(), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"cannot watch {path}")
+        self.watches[wd] = path
+
+    def read(self):
+        """Return the pending events as (directory, mask, name) tuples."""
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0").decode(errors="replace")
+            offset += 16 + length
+            if mask & IN_IGNORED:
+                # The directory is gone
+                self.watches.pop(wd, None)
+                continue
+            events.append((self.watches.get(wd, ""), mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[max(int(len(ordered) * fraction + 0.999999) - 1, 0)]
+
+
+class Timeline:
+    """Time the steps of each pause and wake, log them as JSON lines and keep percentiles."""
+
+    PHASES = ("paused", "sigcont", "forwarding", "responsive", "player_joined")
+
+    def __init__(self, path):
+        self.path = path
+        self.samples = {phase: collections.deque(maxlen=TIMING_SAMPLES) for phase in self.PHASES}
+        self.counts = {phase: 0 for phase in self.PHASES}
+        self.cycles = 0
+        self.kind = None        # "pause" or "wake"
+        self.started = 0.0
+        self.marked = set()
+        self.failed = False
+
+    def begin(self, kind, event, **fields):
+        self.cycles += 1
+        self.kind = kind
+        self.started = time.monotonic()
+        self.marked = set()
+        self.write(event, 0.0, fields)
+
+    def mark(self, kind, event, **fields):
+        """Record a step of the current cycle, once; return milliseconds since it began."""
+        if self.kind != kind or event in self.marked:
+            return None
+        self.marked.add(event)
+        ms = round((time.monotonic() - self.started) * 1000, 1)
+        if event in self.samples:
+            self.samples[event].append(ms)
+            self.counts[event] += 1
+        self.write(event, ms, fields)
+        return ms
+
+    def write(self, event, ms, fields):
+        if not self.path:
+            return
+        line = json.dumps({"time": round(time.time(), 3), "cycle": self.cycles, "kind": self.kind,
+                           "event": event, "ms": ms, **fields})
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > EVENT_LOG_MAX_BYTES:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            if not self.failed:
+                log(f"Cannot write event log {self.path}: {e}")
+            self.failed = True
+
+    def summary(self):
+        """Count and p50/p90/p99/max milliseconds of each step over recent transitions."""
+        result = {}
+        for phase, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[phase] = {"count": self.counts[phase]}
+            if ordered:
+                result[phase].update(p50=percentile(ordered, 0.5), p90=percentile(ordered, 0.9),
+                                     p99=percentile(ordered, 0.99), max=ordered[-1])
+        return result
+
+
+class AutoPause:
+    """Pause the server at the idle deadline and resume it on a wake."""
+
+    def __init__(self, timeout, wake_mode, status_protocol="client"):
+        self.timeout = timeout
+        self.wake_mode = wake_mode
+        self.proxy = Proxy(MC_PORT, wake_mode, STATS_FILE, FORWARD, on_wake=self.wake,
+                           on_players=self.players_changed, on_ping=self.ping,
+                           status_protocol=status_protocol)
+        self.paused = False
+        self.pausing = False
+        self.resuming = False
+        self.java_pid = None
+        self.idle_since = time.time()
+        self.chunker_until = 0.0   # Chunker counts as generating until then
+        self.timer = None
+        self.inotify = None
+        self.timeline = Timeline(EVENT_LOG)
+        self.paused_at = 0.0
+        self.pauses = 0
+        self.wakes = {"login": 0, "ping": 0}
+        # Speculative wake
+        self.last_played = {}      # ip -> when a player from there last joined or left
+        self.pings = {}            # ip -> times of recent server list pings while paused
+        self.cooldown = {}         # ip -> ignore its pings until then
+        self.speculative = None    # Address whose ping woke the server, until a login follows
+        self.speculative_until = None
+
+    # Idle deadline
+
+    def deadline(self):
+        if self.speculative_until:
+            return self.speculative_until
+        return max(self.idle_since, self.chunker_until) + self.timeout
+
+    def schedule(self):
+        """(Re)arm the pause timer for the idle deadline, if the server is idle."""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if self.paused or self.resuming or self.proxy.players:
+            return
+        delay = max(self.deadline() - time.time(), 0)
+        self.timer = asyncio.get_running_loop().call_later(delay, self.deadline_reached)
+
+    def deadline_reached(self):
+        self.timer = None
+        if self.inotify is None:
+            # Without inotify, look at the progress files now
+            self.chunker_until = max(self.chunker_until, chunker_last_write() + CHUNKER_ACTIVITY_THRESHOLD)
+        if self.deadline() > time.time():
+            log("Chunker active, holding off the pause")
+            self.schedule()
+            return
+        if self.proxy.unclassified():
+            # A new connection has not said yet whether it is a login
+            self.timer = asyncio.get_running_loop().call_later(UNCLASSIFIED_RETRY, self.deadline_reached)
+            return
+        if self.speculative:
+            log(f"No login within {PING_WAKE_GRACE:.0f}s of the speculative wake, pausing again")
+            self.cooldown[self.speculative] = time.time() + PING_WAKE_COOLDOWN
+            self.speculative = self.speculative_until = None
+            reason = "no_login_after_ping"
+        else:
+            log(f"Server idle for {self.timeout // 60} minutes, pausing...")
+            reason = "idle"
+        self.timeline.begin("pause", "idle_deadline", reason=reason,
+                            idle_seconds=round(time.time() - self.idle_since, 1))
+        self.proxy.spawn(self.pause())
+
+    # Events
+
+    def players_changed(self, count, ip):
+        self.last_played[ip] = time.time()
+        if count:
+            self.timeline.mark("wake", "player_joined", ip=ip)
+        if count and self.speculative:
+            log("Login followed the speculative wake")
+            self.speculative = self.speculative_until = None
+        if count:
+            if self.timer:
+                log(f"Players online ({count}), idle timer stopped")
+                self.timer.cancel()
+                self.timer = None
+            return
+        self.idle_since = time.time()
+        self.schedule()
+        if self.timer:
+            log(f"No players online, pausing in {self.timeout // 60} minutes unless someone joins")
+
+    def chunker_written(self):
+        was_active = self.chunker_until > time.time()
+        self.chunker_until = time.time() + CHUNKER_ACTIVITY_THRESHOLD
+        if self.timer:
+            if not was_active:
+                log("Chunker active, idle timer pushed back")
+            self.schedule()
+
+    def wake(self, ip):
+        if self.paused and not self.resuming:
+            self.begin_wake("login", ip)
+            self.proxy.spawn(self.resume())
+
+    def begin_wake(self, trigger, ip):
+        self.wakes[trigger] += 1
+        self.timeline.begin("wake", "wake_trigger", trigger=trigger, ip=ip,
+                            slept_seconds=round(time.time() - self.paused_at, 1))
+
+    def ping(self, ip):
+        """A server list ping while paused: start waking if a login looks likely."""
+        if not PING_WAKE or not self.paused or self.resuming:
+            return
+        now = time.time()
+        if self.cooldown.get(ip, 0) > now:
+            return
+        if len(self.pings) > 1000:
+            self.pings = {k: v for k, v in self.pings.items() if now - v[-1] < PING_WINDOW}
+        pings = [t for t in self.pings.get(ip, ()) if now - t < PING_WINDOW] + [now]
+        self.pings[ip] = pings
+
+        played = self.last_played.get(ip)
+        if PING_WAKE_RECENT and played is not None and now - played < PING_WAKE_RECENT:
+            reason = f"played {format_age(now - played)} ago"
+        elif PING_WAKE_PINGS and len(pings) >= PING_WAKE_PINGS:
+            reason = f"{len(pings)} pings in {PING_WINDOW:.0f}s"
+        else:
+            return
+        log(f"Server list ping from {ip} ({reason}), waking speculatively")
+        self.pings.pop(ip, None)
+        self.speculative = ip
+        self.begin_wake("ping", ip)
+        self.proxy.spawn(self.resume())
+
+    def inotify_ready(self):
+        for directory, mask, name in self.inotify.read():
+            if directory == PLUGINS_DIR:
+                if name == "Chunker" and mask & IN_ISDIR:
+                    self.watch_chunker_dir()
+            elif name.endswith("_pregenerator.txt") or (directory == CHUNKER_DIR and name.endswith(".txt")):
+                self.chunker_written()
+
+    def watch_chunker(self):
+        """Watch Chunker progress files, or fall back to checking them at the deadline."""
+        try:
+            self.inotify = Inotify()
+            files = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            self.inotify.watch("/data", files)
+            if os.path.isdir(PLUGINS_DIR):
+                self.inotify.watch(PLUGINS_DIR, IN_CREATE | IN_MOVED_TO)
+            self.watch_chunker_dir()
+        except (OSError, AttributeError) as e:
+            log(f"inotify unavailable ({e}), checking Chunker progress at the idle deadline")
+            if self.inotify:
+                self.inotify.close()
+            self.inotify = None
+            return
+        asyncio.get_running_loop().add_reader(self.inotify.fd, self.inotify_ready)
+        # Generation may already be running
+        self.chunker_until = chunker_last_write() + CHUNKER_ACTIVITY_THRESHOLD
+
+    def watch_chunker_dir(self):
+        if os.path.isdir(CHUNKER_DIR):
+            try:
+                self.inotify.watch(CHUNKER_DIR, IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            except OSError as e:
+                log(f"Cannot watch {CHUNKER_DIR}: {e}")
+
+    # Pause and resume
+
+    async def pause(self):
+        if self.paused or self.pausing:
+            return
+        self.java_pid = find_server_pid()
+        if not self.java_pid:
+            log("Cannot find Java process, trying again in a minute")
+            self.timer = asyncio.get_running_loop().call_later(60, self.deadline_reached)
+            return
+
+        self.pausing = True
+        try:
+            # Show the server's own status while it sleeps
+            status = await fetch_status(MC_PORT)
+            if status is not None:
+                self.proxy.status.set(status)
+                self.timeline.mark("pause", "status_captured")
+            else:
+                log("Server did not answer a status ping, keeping the previous sleeping status")
+            if self.proxy.players or self.proxy.unclassified():
+                log("Connection arrived while pausing, staying awake")
+                self.timeline.mark("pause", "pause_aborted")
+                self.schedule()
+                return
+
+            log(f"Pausing server (PID: {self.java_pid})...")
+            self.proxy.set_mode(SLEEPING)
+            try:
+                os.kill(self.java_pid, signal.SIGSTOP)
+            except OSError as e:
+                log(f"Cannot pause server: {e}")
+                self.proxy.set_mode(FORWARD)
+                return
+            self.paused = True
+            self.paused_at = time.time()
+            self.pauses += 1
+            self.timeline.mark("pause", "paused")
+            self.publish_timings()
+        finally:
+            self.pausing = False
+
+    async def wait_responsive(self):
+        """Ping the resumed server until it answers; record when it first does."""
+        deadline = time.monotonic() + RESPONSIVE_TIMEOUT
+        while not await server_responds(MC_PORT):
+            if time.monotonic() > deadline or self.paused:
+                return False
+            await asyncio.sleep(RESPONSIVE_INTERVAL)
+        self.timeline.mark("wake", "responsive")
+        self.publish_timings()
+        return True
+
+    def publish_timings(self):
+        """Put the transition counts and percentiles into the proxy's stats file."""
+        self.proxy.extra["autopause"] = {
+            "paused": self.paused,
+            "pauses": self.pauses,
+            "wakes": dict(self.wakes),
+            "timings_ms": self.timeline.summary(),
+        }
+        self.proxy.write_stats()
+
+    async def resume(self):
+        self.resuming = True
+        try:
+            self.java_pid = find_server_pid() or self.java_pid
+            if self.java_pid:
+                log(f"Resuming server (PID: {self.java_pid})...")
+                try:
+                    os.kill(self.java_pid, signal.SIGCONT)
+                except OSError as e:
+                    log(f"Cannot resume server: {e}")
+            self.timeline.mark("wake", "sigcont")
+            self.paused = False
+
+            # Held logins are replayed as soon as the server accepts connections, so in
+            # hold mode forwarding can start right away. Otherwise keep telling clients
+            # the server is starting until it answers a status ping.
+            if self.wake_mode != "hold":
+                log("Waiting for server to be responsive...")
+                if not await self.wait_responsive():
+                    log(f"Server not responding after {RESPONSIVE_TIMEOUT:.0f}s, forwarding anyway")
+            else:
+                # Not waited for, only timed
+                self.proxy.spawn(self.wait_responsive())
+            self.proxy.set_mode(FORWARD)
+            ms = self.timeline.mark("wake", "forwarding")
+            log(f"Server resumed and proxy forwarding ({ms or 0:.0f} ms after the wake trigger)")
+            self.publish_timings()
+        finally:
+            self.resuming = False
+        self.idle_since = time.time()
+        if self.speculative and not self.proxy.players:
+            # Pause again soon unless the login we expect arrives
+            self.speculative_until = self.idle_since + PING_WAKE_GRACE
+        self.schedule()
+
+    async def run(self):
+        log("Waiting for server to be ready...")
+        while not await server_responds(MC_PORT):
+            await asyncio.sleep(STARTUP_CHECK_INTERVAL)
+        log("Server is ready")
+        self.watch_chunker()
+        self.idle_since = time.time()
+        self.publish_timings()
+        self.schedule()
+        await self.proxy.serve(PROXY_PORT)
+
+    def cleanup(self):
+        log("Cleaning up...")
+        if self.paused:
+            pid = find_server_pid() or self.java_pid
+            if pid:
+                try:
+                    os.kill(pid, signal.SIGCONT)
+                except OSError:
+                    pass
+        if os.path.exists(STATS_FILE):
+            os.remove(STATS_FILE)
+
+
+def main():
+    if WAKE_MODE not in WAKE_MODES:
+        log(f"Unknown AUTOPAUSE_WAKE_MODE '{WAKE_MODE}', expected one of: {', '.join(WAKE_MODES)}")
+        sys.exit(1)
+    if STATUS_PROTOCOL not in STATUS_PROTOCOLS:
+        log(f"Unknown AUTOPAUSE_STATUS_PROTOCOL '{STATUS_PROTOCOL}', expected one of: {', '.join(STATUS_PROTOCOLS)}")
+        sys.exit(1)
+    log(f"Auto-pause enabled (timeout: {TIMEOUT // 60}m, wake mode: {WAKE_MODE})")
+    controller = AutoPause(TIMEOUT, WAKE_MODE, STATUS_PROTOCOL)
+    try:
+        asyncio.run(controller.run())
+    except OSError as e:
+        log(f"Cannot listen on port {PROXY_PORT}: {e}")
+        sys.exit(1)
+    finally:
+        controller.cleanup()
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, lambda s, f: sys.exit(0))
+    signal.signal(signal.SIGINT, lambda s, f: sys.exit(0))
+    main()
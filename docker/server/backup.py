@@ -10,35 +10,88 @@ import time
 import json
 import signal
 import logging
+import threading
 import subprocess
-import tarfile
 import shutil
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import List, Optional
-from glob import glob
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import archive
+import chunkstore
+import compression
+import pathpolicy
+import s3stream
+import verify
+from activity import PauseTracker, scan_changes
+from catalog import BackupCatalog, ChecksumWriter, RetentionPolicy, file_checksum, format_report
+from chunkstore import ChunkStore
+from notify import DiscordDispatcher
+from pathpolicy import PathPolicy
+from snapshot import SnapshotSync
+from throttle import Throttle, lower_priority, parse_tps
+from uploads import RcloneDestination, S3Destination, UploadManager
+from rcon import RconError, get_client, strip_formatting
 
 # Configuration from environment variables
 BACKUP_ENABLED = os.getenv("BACKUP_ENABLED", "true").lower() == "true"
 BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "86400"))  # 24 hours
+BACKUP_SKIP_UNCHANGED = os.getenv("BACKUP_SKIP_UNCHANGED", "true").lower() == "true"
+BACKUP_ACTIVITY_MB = float(os.getenv("BACKUP_ACTIVITY_MB", "0"))  # Extra backup after this much change, 0 = off
+BACKUP_MIN_INTERVAL = int(os.getenv("BACKUP_MIN_INTERVAL", "3600"))  # Minimum spacing for extra backups
+BACKUP_ACTIVITY_CHECK_INTERVAL = int(os.getenv("BACKUP_ACTIVITY_CHECK_INTERVAL", "300"))
+BACKUP_SETTLE_SECONDS = int(os.getenv("BACKUP_SETTLE_SECONDS", "120"))  # Wait after pause/resume
+SCHEDULER_TICK = 30  # Seconds between pause-state checks while waiting
 BACKUP_DIR = os.getenv("BACKUP_DIR", "/backups")
 DATA_DIR = os.getenv("DATA_DIR", "/data")
-BACKUP_RETENTION_DAYS = int(os.getenv("BACKUP_RETENTION_DAYS", "7"))
-BACKUP_RETENTION_WEEKS = int(os.getenv("BACKUP_RETENTION_WEEKS", "4"))
-BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "gz")  # gz, bz2, xz
+BACKUP_RETENTION = RetentionPolicy.from_env()  # BACKUP_RETENTION_DAYS/HOURLY/DAILY/WEEKLY/MONTHLY/KEEP_LAST
+BACKUP_RETENTION_DRY_RUN = os.getenv("BACKUP_RETENTION_DRY_RUN", "false").lower() == "true"
+BACKUP_RETENTION_REMOTE = os.getenv("BACKUP_RETENTION_REMOTE", "false").lower() == "true"  # Also prune S3/rclone
+BACKUP_CATALOG_FILE = os.getenv("BACKUP_CATALOG_FILE", os.path.join(BACKUP_DIR, "catalog.json"))
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "gz")  # gz, bz2, xz, zstd
+BACKUP_COMPRESSION_LEVEL = os.getenv("BACKUP_COMPRESSION_LEVEL", "")  # Empty = per-format default
+BACKUP_COMPRESSION_THREADS = int(os.getenv("BACKUP_COMPRESSION_THREADS", "0"))  # 0 = all cores
+BACKUP_MODE = os.getenv("BACKUP_MODE", "archive")  # archive, incremental
+BACKUP_POLICY = os.getenv("BACKUP_POLICY", "")  # Extra path rules, appended to the defaults below
+BACKUP_STORE_DIR = os.getenv("BACKUP_STORE_DIR", os.path.join(BACKUP_DIR, "store"))
+BACKUP_SNAPSHOT = os.getenv("BACKUP_SNAPSHOT", "true").lower() == "true"
+BACKUP_SNAPSHOT_DIR = os.getenv("BACKUP_SNAPSHOT_DIR", os.path.join(BACKUP_DIR, ".snapshot"))
+BACKUP_VERIFY = os.getenv("BACKUP_VERIFY", "true").lower() == "true"  # Check new archives after writing
+BACKUP_STATUS_FILE = os.getenv("BACKUP_STATUS_FILE", os.path.join(BACKUP_DIR, "last-backup.json"))
+BACKUP_RATE_LIMIT_MBPS = float(os.getenv("BACKUP_RATE_LIMIT_MBPS", "0"))  # 0 = unlimited
+BACKUP_NICE = int(os.getenv("BACKUP_NICE", "10"))
+BACKUP_IONICE = os.getenv("BACKUP_IONICE", "best-effort")  # best-effort, idle, none
+BACKUP_TPS_THROTTLE = os.getenv("BACKUP_TPS_THROTTLE", "true").lower() == "true"
+BACKUP_TPS_POLL_INTERVAL = float(os.getenv("BACKUP_TPS_POLL_INTERVAL", "5"))
+TPS_WARNING_THRESHOLD = float(os.getenv("TPS_WARNING_THRESHOLD", "15.0"))
 RCON_HOST = os.getenv("RCON_HOST", "localhost")
 RCON_PORT = os.getenv("RCON_PORT", "25575")
 RCON_PASSWORD = os.getenv("RCON_PASSWORD", "minecraft")
+RCON_TIMEOUT = 10
+BACKUP_FLUSH_TIMEOUT = float(os.getenv("BACKUP_FLUSH_TIMEOUT", "300"))  # Seconds "save-all flush" may take
 
 # S3 configuration (optional)
 S3_ENABLED = os.getenv("S3_ENABLED", "false").lower() == "true"
 S3_BUCKET = os.getenv("S3_BUCKET", "")
 S3_PREFIX = os.getenv("S3_PREFIX", "minecraft-backups")
 S3_ENDPOINT = os.getenv("S3_ENDPOINT", "")  # For S3-compatible services
+BACKUP_S3_STREAM = os.getenv("BACKUP_S3_STREAM", "false").lower() == "true"  # Upload while compressing
+BACKUP_S3_PART_SIZE = int(os.getenv("BACKUP_S3_PART_SIZE", str(64 * 1024 * 1024)))  # Min 5 MiB
+BACKUP_S3_CONCURRENCY = int(os.getenv("BACKUP_S3_CONCURRENCY", "4"))  # Parts in flight
+BACKUP_S3_PART_TIMEOUT = int(os.getenv("BACKUP_S3_PART_TIMEOUT", "300"))  # Seconds per part
+BACKUP_KEEP_LOCAL = os.getenv("BACKUP_KEEP_LOCAL", "true").lower() == "true"
+BACKUP_S3_SPOOL_DIR = os.path.join(BACKUP_DIR, ".s3-parts")
+S3_BANDWIDTH_LIMIT_MBPS = float(os.getenv("S3_BANDWIDTH_LIMIT_MBPS", "0"))  # 0 = unlimited
 
 # Rclone configuration (optional)
 RCLONE_ENABLED = os.getenv("RCLONE_ENABLED", "false").lower() == "true"
 RCLONE_DEST = os.getenv("RCLONE_DEST", "")  # e.g., "remote:bucket/path"
+RCLONE_BANDWIDTH_LIMIT_MBPS = float(os.getenv("RCLONE_BANDWIDTH_LIMIT_MBPS", "0"))  # 0 = unlimited
+
+# Upload retries and total bandwidth, shared by all destinations
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "5"))
+UPLOAD_BACKOFF = float(os.getenv("UPLOAD_BACKOFF", "30"))  # Seconds before the first retry, doubling
+UPLOAD_BANDWIDTH_LIMIT_MBPS = float(os.getenv("UPLOAD_BANDWIDTH_LIMIT_MBPS", "0"))  # 0 = unlimited
 
 # Discord webhook for backup notifications (optional)
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL", "")
@@ -51,52 +104,259 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# What not to back up, and what is already compressed (see pathpolicy.py for the syntax)
+DEFAULT_BACKUP_POLICY = """
+exclude cache/
+exclude logs/
+exclude *.tmp
+exclude *.log
+exclude session.lock
+exclude bluemap/web/maps/*/tiles/
+store *.mca
+store *.png
+store *.jar
+"""
+BACKUP_RULES = pathpolicy.parse_rules(f"{DEFAULT_BACKUP_POLICY}\n{BACKUP_POLICY}")
+# The snapshot keeps scheduled paths whether or not they are due, so it never
+# deletes and later recopies them; due/not due is decided when archiving
+SNAPSHOT_POLICY = PathPolicy(BACKUP_RULES, [r.pattern for r in BACKUP_RULES if r.action == pathpolicy.EVERY])
+
 shutdown_flag = False
+notifier = DiscordDispatcher(DISCORD_WEBHOOK_URL, "Backup Notification")
+pause = PauseTracker()
+save_on_pending = False
+# Upload workers update the catalog while the main loop creates and prunes backups
+catalog_lock = threading.Lock()
 
 
-def rcon_command(command: str) -> Optional[str]:
+def rcon_command(command: str, timeout: Optional[float] = None) -> Optional[str]:
     """Execute RCON command and return output."""
     try:
-        result = subprocess.run(
-            ["mcrcon", "-H", RCON_HOST, "-P", RCON_PORT, "-p", RCON_PASSWORD, command],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception as e:
+        client = get_client(RCON_HOST, RCON_PORT, RCON_PASSWORD, timeout=RCON_TIMEOUT)
+        return strip_formatting(client.command(command, timeout)).strip()
+    except RconError as e:
         logger.error(f"RCON error: {e}")
         return None
 
 
+def current_tps() -> Optional[float]:
+    """Return the server's 1m TPS, or None if it cannot be read right now."""
+    if pause.poll():
+        return None
+    try:
+        client = get_client(RCON_HOST, RCON_PORT, RCON_PASSWORD, timeout=RCON_TIMEOUT)
+        return parse_tps(strip_formatting(client.command("tps")))
+    except RconError:
+        return None
+
+
+throttle = Throttle(
+    BACKUP_RATE_LIMIT_MBPS * 1024 * 1024,
+    TPS_WARNING_THRESHOLD if BACKUP_TPS_THROTTLE else 0,
+    current_tps, BACKUP_TPS_POLL_INTERVAL
+)
+
+
 def send_discord_notification(message: str, color: int = 0x00ff00):
-    """Send backup notification to Discord webhook."""
-    if not DISCORD_WEBHOOK_URL:
+    """Queue a backup notification for the Discord webhook without blocking."""
+    notifier.send(message, color=color)
+
+
+def write_backup_status(success: bool, duration: float, size_bytes: int = 0,
+                        backup_file: Optional[str] = None, **details: Any):
+    """Record the outcome of the last backup run for the monitor's /metrics endpoint."""
+    status = {
+        "success": success,
+        "timestamp": time.time(),
+        "duration_seconds": round(duration, 3),
+        "size_bytes": size_bytes,
+        "file": os.path.basename(backup_file) if backup_file else None,
+        "checked_timestamp": time.time(),
+        **details
+    }
+
+    try:
+        os.makedirs(os.path.dirname(BACKUP_STATUS_FILE), exist_ok=True)
+        tmp_file = f"{BACKUP_STATUS_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(status, f)
+        os.replace(tmp_file, BACKUP_STATUS_FILE)
+    except OSError as e:
+        logger.error(f"Failed to write backup status: {e}")
+
+
+def mark_backup_checked(reason: str):
+    """Note in the status file that a due backup was skipped because it had nothing new."""
+    try:
+        with open(BACKUP_STATUS_FILE) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
         return
+    status["checked_timestamp"] = time.time()
+    status["skipped_reason"] = reason
+    try:
+        tmp_file = f"{BACKUP_STATUS_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(status, f)
+        os.replace(tmp_file, BACKUP_STATUS_FILE)
+    except OSError as e:
+        logger.error(f"Failed to write backup status: {e}")
+
 
+def record_backup(backup_file: str, created: float, size_bytes: int, details: Dict[str, Any]):
+    """Add a finished backup to the catalog."""
+    name = os.path.basename(backup_file)
     try:
-        import urllib.request
-        import json
-
-        data = {
-            "embeds": [{
-                "title": "Backup Notification",
-                "description": message,
-                "color": color,
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            }]
-        }
-
-        req = urllib.request.Request(
-            DISCORD_WEBHOOK_URL,
-            data=json.dumps(data).encode("utf-8"),
-            headers={"Content-Type": "application/json"}
-        )
-        urllib.request.urlopen(req, timeout=10)
-    except Exception as e:
-        logger.error(f"Failed to send Discord notification: {e}")
+        with catalog_lock:
+            catalog = BackupCatalog(BACKUP_CATALOG_FILE)
+            catalog.add(name, created, size_bytes, details.get("checksum"), details["compression"],
+                        local=os.path.exists(backup_file), scheduled=details.get("scheduled"))
+            if details.get("s3_streamed"):
+                catalog.set_destination(name, "s3", s3_url(backup_file))
+            catalog.save()
+    except OSError as e:
+        logger.error(f"Failed to update backup catalog: {e}")
+
+
+def record_upload(backup_file: str, destination: str, result: Dict[str, Any]):
+    """Note in the catalog how uploading a backup to a destination went."""
+    name = os.path.basename(backup_file)
+    try:
+        with catalog_lock:
+            catalog = BackupCatalog(BACKUP_CATALOG_FILE)
+            catalog.set_upload(name, destination, result)
+            if result.get("ok"):
+                catalog.set_destination(name, destination, result["location"])
+            catalog.save()
+    except OSError as e:
+        logger.error(f"Failed to update backup catalog: {e}")
+
+
+def run_policy(now: float) -> PathPolicy:
+    """Compile the path policy for a backup taken now, deciding which scheduled paths are due."""
+    scheduled = [rule for rule in BACKUP_RULES if rule.action == pathpolicy.EVERY]
+    last_included: Dict[str, Optional[float]] = {}
+    if scheduled:
+        catalog = BackupCatalog(BACKUP_CATALOG_FILE)
+        last_included = {rule.pattern: catalog.last_scheduled(rule.pattern) for rule in scheduled}
+    due = pathpolicy.due_rules(scheduled, last_included, now)
+    if due:
+        logger.info(f"Scheduled paths due this run: {', '.join(due)}")
+    return PathPolicy(BACKUP_RULES, due)
+
+
+def s3_key(backup_file: str) -> str:
+    return f"{S3_PREFIX}/{os.path.basename(backup_file)}"
+
+
+def s3_url(backup_file: str) -> str:
+    return f"s3://{S3_BUCKET}/{s3_key(backup_file)}"
+
+
+def s3_client() -> s3stream.S3Client:
+    return s3stream.S3Client(S3_BUCKET, S3_ENDPOINT, timeout=BACKUP_S3_PART_TIMEOUT)
+
+
+def s3_streaming() -> bool:
+    return S3_ENABLED and bool(S3_BUCKET) and BACKUP_S3_STREAM
+
+
+def open_s3_stream(backup_file: str) -> s3stream.TeeWriter:
+    """Open the archive output: a multipart upload, plus the local file if it is kept."""
+    key = s3_key(backup_file)
+    logger.info(f"Streaming to s3://{S3_BUCKET}/{key} "
+                f"({BACKUP_S3_PART_SIZE // (1024 * 1024)} MB parts, {BACKUP_S3_CONCURRENCY} concurrent)")
+    upload = s3stream.MultipartUpload(
+        s3_client(), key, s3stream.state_file_for(backup_file),
+        BACKUP_S3_SPOOL_DIR, BACKUP_S3_CONCURRENCY
+    )
+    # If streaming fails with a local copy kept, the upload is resumed from it afterwards
+    local = open(backup_file, "wb") if BACKUP_KEEP_LOCAL else None
+    return s3stream.TeeWriter(local, upload, BACKUP_S3_PART_SIZE)
+
+
+def write_archive(source_dir: str, backup_file: str, method: str, policy: PathPolicy) -> Dict[str, Any]:
+    """Compress source_dir into a tar archive and return compression details."""
+    level = int(BACKUP_COMPRESSION_LEVEL) if BACKUP_COMPRESSION_LEVEL else None
+    threads = compression.resolve_threads(BACKUP_COMPRESSION_THREADS)
+    logger.info(f"Compressing {source_dir} ({method}, {threads} threads)...")
+
+    tee = open_s3_stream(backup_file) if s3_streaming() else None
+    sink = ChecksumWriter(tee or open(backup_file, "wb"))
+    writer = compression.open_writer(sink, method, level, threads)
+    try:
+        with writer:
+            members = archive.write_tar(source_dir, throttle.wrap(writer), policy.excluded, policy.stored)
+    except BaseException:
+        # Never let a half-written archive complete the multipart upload
+        if tee is not None:
+            tee.discard()
+        raise
+    if tee is not None:
+        tee.finish()
+
+    stats = writer.stats()
+    # Kept even when the archive itself is not: restore.py and verify.py both rely on it
+    archive.write_index(backup_file, method, members, getattr(writer, "blocks", None),
+                        sink.checksum(), stats["compressed_bytes"])
+    logger.info(
+        f"Compression: {stats['uncompressed_bytes'] / (1024 * 1024):.2f} MB in "
+        f"{stats['seconds']:.1f}s ({stats['throughput_mbps']:.2f} MB/s, ratio {stats['ratio']:.2f})"
+    )
+    details = {
+        "compression": method,
+        "compression_ratio": stats["ratio"],
+        "compression_throughput_mbps": stats["throughput_mbps"],
+        "size_bytes": stats["compressed_bytes"],
+        "checksum": sink.checksum(),
+        "summary": f"{method}, ratio {stats['ratio']:.2f}, {stats['throughput_mbps']:.1f} MB/s"
+    }
+    if tee is not None:
+        details["s3_streamed"] = tee.uploaded
+        if tee.uploaded:
+            logger.info("S3 streaming upload complete")
+            details["summary"] += ", streamed to S3"
+    return details
+
+
+def verify_archive(backup_file: str, details: Dict[str, Any]):
+    """Read a new archive back against its index and record the outcome in details."""
+    if not os.path.exists(backup_file):
+        logger.info("No local copy kept, skipping verification (run verify.py --remote)")
+        return
+    results = verify.verify_backup(backup_file, threads=BACKUP_COMPRESSION_THREADS)
+    result = results["local"]
+    verify.log_results(os.path.basename(backup_file), results)
+    details["verified"] = result["ok"]
+    details["verify_seconds"] = result["seconds"]
+    details["summary"] += ", verified" if result["ok"] else ", VERIFICATION FAILED"
+
+
+def write_incremental(source_dir: str, backup_file: str, policy: PathPolicy) -> Dict[str, Any]:
+    """Store new chunks and files in the chunk store and write a manifest."""
+    store = ChunkStore(BACKUP_STORE_DIR, throttle.consume)
+    previous_file = chunkstore.latest_manifest(BACKUP_DIR)
+    previous = chunkstore.load_manifest(previous_file) if previous_file else None
+    logger.info(f"Storing {source_dir} incrementally"
+                f"{f' against {os.path.basename(previous_file)}' if previous_file else ''}...")
+
+    manifest = store.backup(source_dir, policy.excluded, previous)
+    chunkstore.write_manifest(manifest, backup_file)
+
+    stats = store.stats
+    new_mb = stats["bytes_written"] / (1024 * 1024)
+    logger.info(
+        f"Incremental: {stats['files_read']} files read, {stats['files_unchanged']} unchanged, "
+        f"{stats['chunks_read']} chunks read, {stats['chunks_unchanged']} unchanged, "
+        f"{stats['blobs_written']} new blobs ({new_mb:.2f} MB)"
+    )
+    return {
+        "compression": "incremental",
+        "new_bytes": stats["bytes_written"],
+        "size_bytes": os.path.getsize(backup_file),
+        "checksum": file_checksum(backup_file),
+        "summary": f"incremental, {stats['blobs_written']} new blobs ({new_mb:.2f} MB)"
+    }
 
 
 def create_backup() -> Optional[str]:
@@ -105,64 +365,112 @@ def create_backup() -> Optional[str]:
     backup_name = f"minecraft-backup-{timestamp}"
 
     # Determine compression mode
-    if BACKUP_COMPRESSION == "bz2":
-        ext = "tar.bz2"
-        mode = "w:bz2"
-    elif BACKUP_COMPRESSION == "xz":
-        ext = "tar.xz"
-        mode = "w:xz"
+    if BACKUP_MODE == "incremental":
+        method = "incremental"
+        ext = chunkstore.MANIFEST_EXT
     else:
-        ext = "tar.gz"
-        mode = "w:gz"
+        method = BACKUP_COMPRESSION if BACKUP_COMPRESSION in compression.EXTENSIONS else "gz"
+        ext = compression.EXTENSIONS[method]
 
     backup_file = os.path.join(BACKUP_DIR, f"{backup_name}.{ext}")
+    created = time.time()
+    started = time.monotonic()
 
-    try:
-        logger.info(f"Creating backup: {backup_name}")
+    save_off_started = None
+    save_off_seconds = None
 
-        # Disable world saving (optional - prevents corruption)
+    def stop_saving():
+        nonlocal save_off_started
         logger.info("Disabling auto-save...")
+        save_off_started = time.monotonic()
         rcon_command("save-off")
-        rcon_command("save-all flush")
-        time.sleep(2)  # Wait for save to complete
+        # The server answers once the flush has written every chunk to disk
+        if rcon_command("save-all flush", timeout=BACKUP_FLUSH_TIMEOUT) is None:
+            logger.warning("The save did not confirm it finished; backing up anyway")
+
+    def resume_saving():
+        global save_on_pending
+        nonlocal save_off_started, save_off_seconds
+        if save_off_started is None:
+            return
+        if pause.poll():
+            # Paused mid-backup: RCON would time out, so send save-on once it resumes
+            logger.info("Server was paused during the backup, auto-save will be re-enabled on resume")
+            save_on_pending = True
+        else:
+            logger.info("Re-enabling auto-save...")
+            rcon_command("save-on")
+        save_off_seconds = time.monotonic() - save_off_started
+        save_off_started = None
+        logger.info(f"Auto-save was disabled for {save_off_seconds:.2f}s")
 
-        # Create backup directory if it doesn't exist
-        os.makedirs(BACKUP_DIR, exist_ok=True)
+    try:
+        logger.info(f"Creating backup: {backup_name}")
+        policy = run_policy(created)
 
-        # Create compressed archive
-        logger.info(f"Compressing {DATA_DIR}...")
-        with tarfile.open(backup_file, mode) as tar:
-            # Exclude certain files/dirs that don't need backing up
-            excludes = [
-                "cache",
-                "logs",
-                "*.tmp",
-                "*.log",
-                "session.lock"
-            ]
+        if pause.poll():
+            # A frozen server writes nothing and would not answer RCON anyway
+            logger.info("Server is paused, its files are not changing; skipping save-off")
+        else:
+            # Disable world saving (optional - prevents corruption)
+            stop_saving()
 
-            def filter_func(tarinfo):
-                # Skip excluded files
-                for pattern in excludes:
-                    if pattern in tarinfo.name:
-                        return None
-                return tarinfo
+        # Create backup directory if it doesn't exist
+        os.makedirs(BACKUP_DIR, exist_ok=True)
 
-            tar.add(DATA_DIR, arcname="data", filter=filter_func)
+        if save_off_started is None and not pause.poll():
+            # Woken (a login or ping) since the check above: it saves into the world from now on
+            logger.info("Server resumed since the backup started")
+            stop_saving()
+
+        source_dir = DATA_DIR
+        if BACKUP_SNAPSHOT:
+            # Take a point-in-time copy so saving can resume before compression
+            logger.info(f"Snapshotting {DATA_DIR} to {BACKUP_SNAPSHOT_DIR}...")
+            sync = SnapshotSync(DATA_DIR, BACKUP_SNAPSHOT_DIR, SNAPSHOT_POLICY.excluded)
+            snap = sync.run()
+            resume_saving()
+            logger.info(
+                f"Snapshot updated in {snap['seconds']:.2f}s: {snap['copied']} copied, "
+                f"{snap['reflinked']} reflinked, {snap['unchanged']} unchanged, "
+                f"{snap['removed']} removed ({snap['bytes'] / (1024 * 1024):.2f} MB written)"
+            )
+            source_dir = BACKUP_SNAPSHOT_DIR
+
+        with throttle:
+            if method == "incremental":
+                details = write_incremental(source_dir, backup_file, policy)
+            else:
+                details = write_archive(source_dir, backup_file, method, policy)
+        details["scheduled"] = policy.due
+        logger.info(f"Throttling: {throttle.summary()}")
+        details["throttle_seconds"] = throttle.stats["sleep_seconds"]
 
         # Re-enable world saving
-        logger.info("Re-enabling auto-save...")
-        rcon_command("save-on")
-
-        # Get backup size
-        size_mb = os.path.getsize(backup_file) / (1024 * 1024)
-        logger.info(f"Backup created: {backup_file} ({size_mb:.2f} MB)")
+        resume_saving()
+
+        if BACKUP_VERIFY and method != "incremental":
+            verify_archive(backup_file, details)
+
+        size_bytes = details.pop("size_bytes")
+        size_mb = size_bytes / (1024 * 1024)
+        duration = time.monotonic() - started
+        location = backup_file if os.path.exists(backup_file) else s3_url(backup_file)
+        logger.info(f"Backup created: {location} ({size_mb:.2f} MB in {duration:.1f}s)")
+        summary = details.pop("summary")
+        write_backup_status(
+            True, duration, size_bytes, backup_file,
+            save_off_seconds=round(save_off_seconds or 0, 3),
+            **details
+        )
+        record_backup(backup_file, created, size_bytes, details)
 
         # Send notification
         send_discord_notification(
             f"✅ Backup completed successfully\n"
             f"**File**: {backup_name}.{ext}\n"
-            f"**Size**: {size_mb:.2f} MB",
+            f"**Size**: {size_mb:.2f} MB\n"
+            f"**Compression**: {summary}",
             color=0x00ff00
         )
 
@@ -170,7 +478,8 @@ def create_backup() -> Optional[str]:
 
     except Exception as e:
         logger.error(f"Backup failed: {e}")
-        rcon_command("save-on")  # Ensure save is re-enabled
+        resume_saving()  # Ensure save is re-enabled
+        write_backup_status(False, time.monotonic() - started)
         send_discord_notification(
             f"❌ Backup failed\n**Error**: {str(e)}",
             color=0xff0000
@@ -178,110 +487,140 @@ def create_backup() -> Optional[str]:
         return None
 
 
-def upload_to_s3(backup_file: str) -> bool:
-    """Upload backup to S3-compatible storage."""
-    if not S3_ENABLED or not S3_BUCKET:
-        return True  # Skip if not configured
+def upload_destinations() -> List[Any]:
+    """The configured remote destinations."""
+    destinations: List[Any] = []
+    if S3_ENABLED and S3_BUCKET:
+        destinations.append(S3Destination(
+            S3_BUCKET, S3_PREFIX, S3_ENDPOINT, BACKUP_S3_PART_SIZE, BACKUP_S3_SPOOL_DIR,
+            BACKUP_S3_CONCURRENCY, BACKUP_S3_PART_TIMEOUT,
+            rate_limit=S3_BANDWIDTH_LIMIT_MBPS * 1024 * 1024, store_dir=BACKUP_STORE_DIR
+        ))
+    if RCLONE_ENABLED and RCLONE_DEST:
+        destinations.append(RcloneDestination(
+            RCLONE_DEST, rate_limit=RCLONE_BANDWIDTH_LIMIT_MBPS * 1024 * 1024, store_dir=BACKUP_STORE_DIR
+        ))
+    return destinations
+
+
+def upload_finished(backup_file: str, destination: Any, result: Dict[str, Any]):
+    """Record an upload's outcome and report one that gave up."""
+    record_upload(backup_file, destination.name, result)
+    if not result["ok"]:
+        send_discord_notification(
+            f"❌ Upload failed\n"
+            f"**File**: {os.path.basename(backup_file)}\n"
+            f"**Destination**: {destination.name}\n"
+            f"**Attempts**: {result['attempts']}\n"
+            f"**Error**: {result['error']}",
+            color=0xff0000
+        )
+
+
+uploader = UploadManager(
+    upload_destinations(), UPLOAD_BANDWIDTH_LIMIT_MBPS * 1024 * 1024,
+    UPLOAD_RETRIES, UPLOAD_BACKOFF, on_result=upload_finished
+)
 
-    try:
-        logger.info(f"Uploading to S3: {S3_BUCKET}/{S3_PREFIX}/")
 
-        cmd = [
-            "aws", "s3", "cp",
-            backup_file,
-            f"s3://{S3_BUCKET}/{S3_PREFIX}/{os.path.basename(backup_file)}"
+def queue_upload(backup_file: str, destinations: List[str]):
+    """Hand a backup to the upload workers, marking it queued so a restart picks it up again."""
+    for destination in destinations:
+        record_upload(backup_file, destination, {"ok": False, "queued": time.time()})
+    uploader.submit(backup_file, destinations)
+
+
+def resume_uploads():
+    """Queue again the uploads that failed, or were cut short by a restart."""
+    with catalog_lock:
+        catalog = BackupCatalog(BACKUP_CATALOG_FILE)
+        entries = catalog.entries()
+    for name, entry in reversed(entries):
+        backup_file = os.path.join(BACKUP_DIR, name)
+        # A streamed upload that failed part-way leaves its state file next to the archive
+        interrupted = {"s3"} if os.path.exists(s3stream.state_file_for(backup_file)) else set()
+        failed = {d for d, result in entry.get("uploads", {}).items() if not result.get("ok")}
+        missing = [
+            d.name for d in uploader.destinations
+            if d.name in failed | interrupted and d.name not in entry["destinations"]
         ]
+        if missing and entry["destinations"].get("local") and os.path.exists(backup_file):
+            logger.info(f"Resuming upload of {name} to {', '.join(missing)}")
+            uploader.submit(backup_file, missing)
 
+
+def delete_remote(name: str, entry: Dict[str, Any]):
+    """Delete the remote copies of a backup recorded in the catalog."""
+    s3 = entry["destinations"].get("s3")
+    if s3:
+        cmd = ["aws", "s3", "rm", s3]
         if S3_ENDPOINT:
             cmd.extend(["--endpoint-url", S3_ENDPOINT])
-
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        if result.returncode != 0:
+            logger.error(f"Failed to remove {s3}: {result.stderr}")
 
-        if result.returncode == 0:
-            logger.info("S3 upload successful")
-            return True
-        else:
-            logger.error(f"S3 upload failed: {result.stderr}")
-            return False
-
-    except Exception as e:
-        logger.error(f"S3 upload error: {e}")
-        return False
-
-
-def upload_to_rclone(backup_file: str) -> bool:
-    """Upload backup using rclone."""
-    if not RCLONE_ENABLED or not RCLONE_DEST:
-        return True  # Skip if not configured
-
-    try:
-        logger.info(f"Uploading to rclone: {RCLONE_DEST}")
-
-        result = subprocess.run(
-            ["rclone", "copy", backup_file, RCLONE_DEST],
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
-
-        if result.returncode == 0:
-            logger.info("Rclone upload successful")
-            return True
-        else:
-            logger.error(f"Rclone upload failed: {result.stderr}")
-            return False
-
-    except Exception as e:
-        logger.error(f"Rclone upload error: {e}")
-        return False
+    rclone = entry["destinations"].get("rclone")
+    if rclone:
+        result = subprocess.run(["rclone", "deletefile", rclone], capture_output=True, text=True, timeout=300)
+        if result.returncode != 0:
+            logger.error(f"Failed to remove {rclone}: {result.stderr}")
 
 
 def cleanup_old_backups():
-    """Remove old backups based on retention policy."""
+    """Remove old backups based on the retention policy."""
     try:
-        logger.info("Cleaning up old backups...")
-
-        # Get all backups sorted by creation time
-        backups = []
-        for ext in ["tar.gz", "tar.bz2", "tar.xz"]:
-            pattern = os.path.join(BACKUP_DIR, f"minecraft-backup-*.{ext}")
-            backups.extend(glob(pattern))
-
-        backups.sort(key=os.path.getmtime, reverse=True)
-
-        if not backups:
-            logger.info("No backups found for cleanup")
-            return
-
-        # Keep daily backups
-        daily_cutoff = datetime.now() - timedelta(days=BACKUP_RETENTION_DAYS)
-        weekly_cutoff = datetime.now() - timedelta(weeks=BACKUP_RETENTION_WEEKS)
-
-        kept_daily = []
-        kept_weekly = []
-        removed = []
-
-        for backup_file in backups:
-            mtime = datetime.fromtimestamp(os.path.getmtime(backup_file))
-
-            # Keep all recent daily backups
-            if mtime > daily_cutoff:
-                kept_daily.append(backup_file)
-                continue
-
-            # Keep weekly backups (one per week)
-            if mtime > weekly_cutoff:
-                week = mtime.isocalendar()[1]
-                if week not in [datetime.fromtimestamp(os.path.getmtime(f)).isocalendar()[1] for f in kept_weekly]:
-                    kept_weekly.append(backup_file)
-                    continue
-
-            # Remove old backups
-            logger.info(f"Removing old backup: {os.path.basename(backup_file)}")
-            os.remove(backup_file)
-            removed.append(backup_file)
+        logger.info(f"Applying retention ({BACKUP_RETENTION.describe()})...")
+
+        with catalog_lock:
+            catalog = BackupCatalog(BACKUP_CATALOG_FILE)
+            catalog.sync_local(BACKUP_DIR)
+            entries = catalog.entries()
+
+            if not entries:
+                logger.info("No backups found for cleanup")
+                return
+
+            keep, remove = BACKUP_RETENTION.apply(entries)
+
+            if BACKUP_RETENTION_DRY_RUN:
+                for line in format_report(catalog, keep, remove):
+                    logger.info(f"Retention (dry run): {line}")
+                catalog.save()
+                return
+
+            # Backups still being uploaded are pruned on a later run instead
+            uploading = uploader.busy()
+            removed = [name for name in remove if name not in uploading]
+            for name in remove:
+                if name in uploading:
+                    logger.info(f"Keeping {name} until its upload finishes")
+
+            for name in removed:
+                entry = catalog.backups[name]
+                backup_file = os.path.join(BACKUP_DIR, name)
+                if entry["destinations"].get("local"):
+                    logger.info(f"Removing old backup: {name}")
+                    os.remove(backup_file)
+                for sidecar in (archive.index_path(backup_file), s3stream.state_file_for(backup_file)):
+                    if os.path.exists(sidecar):
+                        os.remove(sidecar)
+                if BACKUP_RETENTION_REMOTE:
+                    delete_remote(name, entry)
+                catalog.remove(name)
+
+            catalog.save()
+            manifests = [
+                os.path.join(BACKUP_DIR, name) for name, entry in catalog.entries()
+                if name.endswith(chunkstore.MANIFEST_EXT) and entry["destinations"].get("local")
+            ]
+        logger.info(f"Cleanup complete. Kept: {len(entries) - len(removed)}, Removed: {len(removed)}")
 
-        logger.info(f"Cleanup complete. Daily: {len(kept_daily)}, Weekly: {len(kept_weekly)}, Removed: {len(removed)}")
+        # Drop chunk store blobs that no remaining manifest refers to; not while
+        # the store is being copied to a remote
+        if any(name.endswith(chunkstore.MANIFEST_EXT) for name in removed) and not uploading:
+            blobs, freed = ChunkStore(BACKUP_STORE_DIR).gc(manifests)
+            logger.info(f"Chunk store: removed {blobs} unreferenced blobs ({freed / (1024 * 1024):.2f} MB)")
 
     except Exception as e:
         logger.error(f"Cleanup failed: {e}")
@@ -293,34 +632,122 @@ def backup_loop():
 
     logger.info(f"Backup system started (interval: {BACKUP_INTERVAL}s)")
     logger.info(f"Backup directory: {BACKUP_DIR}")
-    logger.info(f"Retention: {BACKUP_RETENTION_DAYS} days, {BACKUP_RETENTION_WEEKS} weeks")
+    logger.info(f"Retention: {BACKUP_RETENTION.describe()}")
     logger.info(f"S3: {'enabled' if S3_ENABLED else 'disabled'}")
     logger.info(f"Rclone: {'enabled' if RCLONE_ENABLED else 'disabled'}")
+    if uploader.destinations:
+        logger.info(f"Uploads: {UPLOAD_RETRIES} retries, total bandwidth "
+                    f"{f'{UPLOAD_BANDWIDTH_LIMIT_MBPS:g} MB/s' if UPLOAD_BANDWIDTH_LIMIT_MBPS else 'unlimited'}")
+        uploader.start()
+        resume_uploads()
+    logger.info(f"Throttle: nice {BACKUP_NICE}, ionice {BACKUP_IONICE}, "
+                f"rate limit {f'{BACKUP_RATE_LIMIT_MBPS:g} MB/s' if BACKUP_RATE_LIMIT_MBPS else 'none'}, "
+                f"TPS backoff {f'below {TPS_WARNING_THRESHOLD:g}' if BACKUP_TPS_THROTTLE else 'off'}")
+
+    logger.info(f"Scheduling: skip unchanged {'on' if BACKUP_SKIP_UNCHANGED else 'off'}, extra backups "
+                f"{f'after {BACKUP_ACTIVITY_MB:g} MB of changes' if BACKUP_ACTIVITY_MB else 'off'}")
 
     # Run first backup after short delay
     time.sleep(60)
 
+    last = last_backup_time()
+    next_due = last + BACKUP_INTERVAL if last else time.time()
+    next_scan = 0.0
+    deferred = False
+
     while not shutdown_flag:
         try:
-            # Create backup
-            backup_file = create_backup()
+            now = time.time()
+            paused = pause.poll()
+            if save_on_pending and not paused:
+                resend_save_on()
+
+            reason = None
+            if now >= next_due or (BACKUP_ACTIVITY_MB and last and now >= next_scan
+                                   and now - last >= BACKUP_MIN_INTERVAL):
+                if not pause.settled(BACKUP_SETTLE_SECONDS):
+                    # Let a resumed server finish loading (or a pause settle) before reading its files
+                    if not deferred:
+                        logger.info(f"Server {'paused' if paused else 'resumed'} just now, deferring backup check")
+                        deferred = True
+                elif now >= next_due:
+                    deferred = False
+                    reason = due_backup_reason(last)
+                    if reason is None:
+                        next_due = now + BACKUP_INTERVAL
+                else:
+                    next_scan = now + BACKUP_ACTIVITY_CHECK_INTERVAL
+                    reason = activity_reason(last)
+
+            if reason:
+                logger.info(f"Starting backup ({reason})")
+                run_backup()
+                last = last_backup_time()
+                next_due = time.time() + BACKUP_INTERVAL
 
-            if backup_file:
-                # Upload to remote destinations
-                if S3_ENABLED:
-                    upload_to_s3(backup_file)
+        except Exception as e:
+            logger.error(f"Backup loop error: {e}")
 
-                if RCLONE_ENABLED:
-                    upload_to_rclone(backup_file)
+        # Wait for next backup, waking up to follow pause/resume and activity
+        time.sleep(max(1.0, min(SCHEDULER_TICK, next_due - time.time())))
 
-                # Cleanup old backups
-                cleanup_old_backups()
 
-        except Exception as e:
-            logger.error(f"Backup loop error: {e}")
+def last_backup_time() -> Optional[float]:
+    """When the newest cataloged backup was started."""
+    catalog = BackupCatalog(BACKUP_CATALOG_FILE)
+    catalog.sync_local(BACKUP_DIR)
+    entries = catalog.entries()
+    return entries[0][1]["timestamp"] if entries else None
 
-        # Wait for next backup
-        time.sleep(BACKUP_INTERVAL)
+
+def due_backup_reason(last: Optional[float]) -> Optional[str]:
+    """Why the scheduled backup should run, or None to skip it."""
+    if not (BACKUP_SKIP_UNCHANGED and last):
+        return "scheduled"
+    changes = scan_changes(DATA_DIR, last, PathPolicy(BACKUP_RULES).excluded, stop_at_first=True)
+    if changes["files"]:
+        return "scheduled"
+    state = "paused" if pause.paused else "running"
+    logger.info(f"No changes since the last backup (server {state}), skipping")
+    mark_backup_checked("unchanged")
+    return None
+
+
+def activity_reason(last: float) -> Optional[str]:
+    """Why an extra backup should run now, or None if activity is below the threshold."""
+    changes = scan_changes(DATA_DIR, last, PathPolicy(BACKUP_RULES).excluded)
+    changed_mb = changes["bytes"] / (1024 * 1024)
+    if changed_mb < BACKUP_ACTIVITY_MB:
+        return None
+    return (f"activity: {changes['files']} files ({changed_mb:.0f} MB, "
+            f"{changes['region_files']} region files) changed since the last backup")
+
+
+def run_backup():
+    """Create a backup, queue its uploads and apply retention."""
+    # Create backup
+    backup_file = create_backup()
+
+    if backup_file:
+        # Upload in the background; a slow remote must not hold up the next backup
+        streamed = not os.path.exists(s3stream.state_file_for(backup_file)) and s3_streaming() \
+            and not backup_file.endswith(chunkstore.MANIFEST_EXT)
+        destinations = [d.name for d in uploader.destinations if not (d.name == "s3" and streamed)]
+        if destinations and not os.path.exists(backup_file):
+            logger.warning(f"Upload to {', '.join(destinations)} skipped: no local copy kept (BACKUP_KEEP_LOCAL=false)")
+        elif destinations:
+            queue_upload(backup_file, destinations)
+
+        # Cleanup old backups
+        cleanup_old_backups()
+
+
+def resend_save_on():
+    """Re-enable auto-save that a backup left off because the server paused mid-run."""
+    global save_on_pending
+    if rcon_command("save-on") is not None:
+        logger.info("Server resumed, auto-save re-enabled")
+        save_on_pending = False
 
 
 def signal_handler(signum, frame):
@@ -328,6 +755,7 @@ def signal_handler(signum, frame):
     global shutdown_flag
     logger.info("Shutting down backup system...")
     shutdown_flag = True
+    # Unwinds to main(), which delivers pending notifications outside the handler
     sys.exit(0)
 
 
@@ -339,12 +767,23 @@ def main():
 
     logger.info("Starting backup system...")
 
+    # Compression threads and the zstd process inherit this
+    lower_priority(BACKUP_NICE, BACKUP_IONICE)
+
+    # Parts spooled by S3 uploads that were running when the container stopped
+    removed = s3stream.clear_spool(BACKUP_S3_SPOOL_DIR)
+    if removed:
+        logger.info(f"Removed {removed} leftover S3 upload part(s)")
+
     # Setup signal handlers
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
     # Run backup loop
-    backup_loop()
+    try:
+        backup_loop()
+    finally:
+        notifier.flush(timeout=5)
 
 
 if __name__ == "__main__":
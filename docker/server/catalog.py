@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup Catalog
+Persistent index of backups and grandfather-father-son retention.
+
+``create_backup()`` records every backup (timestamp, size, checksum,
+compression and the destinations it reached) in a JSON catalog next to the
+archives, so listing and retention never have to stat or glob thousands of
+files. Retention is a single pass over the catalog, newest first: for each
+of the hourly, daily, weekly (ISO year and week) and monthly rules, the
+newest backup of each of the last N periods that have a backup is kept, on
+top of every backup from the last BACKUP_RETENTION_DAYS days.
+
+Usage:
+    catalog.py list <backup-dir>        List cataloged backups
+    catalog.py retention <backup-dir>   Show what retention would keep/remove
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import chunkstore
+import compression
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION = 1
+BACKUP_NAME_RE = re.compile(r"^minecraft-backup-(\d{8}_\d{6})\.")
+BACKUP_EXTENSIONS = [*compression.EXTENSIONS.values(), chunkstore.MANIFEST_EXT]
+
+# Period key functions for each retention rule, coarsest last
+PERIODS: Dict[str, Callable[[datetime], Tuple[int, ...]]] = {
+    "hourly": lambda t: (t.year, t.month, t.day, t.hour),
+    "daily": lambda t: (t.year, t.month, t.day),
+    "weekly": lambda t: tuple(t.isocalendar()[:2]),
+    "monthly": lambda t: (t.year, t.month),
+}
+
+
+class ChecksumWriter:
+    """Pass-through binary sink that hashes everything written to it."""
+
+    def __init__(self, output: BinaryIO, algorithm: str = "sha256"):
+        self.output = output
+        self.algorithm = algorithm
+        self.hash = hashlib.new(algorithm)
+
+    def write(self, data: bytes) -> int:
+        self.hash.update(data)
+        return self.output.write(data)
+
+    def flush(self):
+        self.output.flush()
+
+    def close(self):
+        self.output.close()
+
+    def checksum(self) -> str:
+        return f"{self.algorithm}:{self.hash.hexdigest()}"
+
+
+def file_checksum(path: str, algorithm: str = "sha256") -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return f"{algorithm}:{digest.hexdigest()}"
+
+
+def timestamp_from_name(name: str) -> Optional[float]:
+    """Recover the creation time encoded in a backup file name."""
+    match = BACKUP_NAME_RE.match(name)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+
+
+class BackupCatalog:
+    """JSON index of backups keyed by file name."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.backups: Dict[str, Dict[str, Any]] = {}
+        self.exists = False
+        try:
+            with open(path) as f:
+                self.backups = json.load(f)["backups"]
+            self.exists = True
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Backup catalog unreadable, rebuilding it: {e}")
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": CATALOG_VERSION, "backups": self.backups}, f, indent=1)
+        os.replace(tmp, self.path)
+        self.exists = True
+
+    def add(self, name: str, timestamp: float, size_bytes: int, checksum: Optional[str],
+            compression: str, local: bool = True, scheduled: Optional[List[str]] = None):
+        self.backups[name] = {
+            "timestamp": timestamp,
+            "size_bytes": size_bytes,
+            "checksum": checksum,
+            "compression": compression,
+            "destinations": {"local": local},
+        }
+        if scheduled:
+            # Patterns of "every" policy rules this backup included
+            self.backups[name]["scheduled"] = scheduled
+
+    def last_scheduled(self, pattern: str) -> Optional[float]:
+        """When a backup that still exists last included a scheduled path pattern."""
+        times = [e["timestamp"] for e in self.backups.values() if pattern in e.get("scheduled", ())]
+        return max(times) if times else None
+
+    def set_destination(self, name: str, destination: str, location: Any):
+        entry = self.backups.get(name)
+        if entry is not None:
+            entry["destinations"][destination] = location
+
+    def set_upload(self, name: str, destination: str, result: Dict[str, Any]):
+        """Record the outcome (or queued state) of uploading a backup to a destination."""
+        entry = self.backups.get(name)
+        if entry is not None:
+            entry.setdefault("uploads", {})[destination] = result
+
+    def remove(self, name: str):
+        self.backups.pop(name, None)
+
+    def entries(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return (name, entry) pairs, newest first."""
+        return sorted(self.backups.items(), key=lambda item: item[1]["timestamp"], reverse=True)
+
+    def sync_local(self, backup_dir: str) -> int:
+        """Reconcile the catalog with the backup directory in one listing; return changes."""
+        suffixes = tuple(f".{ext}" for ext in BACKUP_EXTENSIONS)
+        try:
+            present = {n for n in os.listdir(backup_dir) if n.endswith(suffixes) and BACKUP_NAME_RE.match(n)}
+        except FileNotFoundError:
+            present = set()
+
+        changes = 0
+        for name, entry in list(self.backups.items()):
+            local = name in present
+            if entry["destinations"].get("local") == local:
+                continue
+            entry["destinations"]["local"] = local
+            changes += 1
+            # Deleted by hand and never uploaded anywhere
+            if not any(entry["destinations"].values()):
+                del self.backups[name]
+
+        # Archives made by hand or before the catalog existed
+        methods = {ext: method for method, ext in compression.EXTENSIONS.items()}
+        methods[chunkstore.MANIFEST_EXT] = "incremental"
+        for name in present - self.backups.keys():
+            st = os.stat(os.path.join(backup_dir, name))
+            ext = name[len(BACKUP_NAME_RE.match(name).group(0)):]
+            self.add(name, timestamp_from_name(name) or st.st_mtime, st.st_size, None, methods[ext])
+            changes += 1
+        return changes
+
+
+class RetentionPolicy:
+    """Grandfather-father-son retention over cataloged backups.
+
+    recent_days keeps every backup younger than that many days, as
+    BACKUP_RETENTION_DAYS always has; the period rules thin out what is older.
+    """
+
+    def __init__(self, recent_days: float = 7, hourly: int = 0, daily: int = 0, weekly: int = 4,
+                 monthly: int = 0, keep_last: int = 1):
+        self.recent_days = recent_days
+        self.counts = {"hourly": hourly, "daily": daily, "weekly": weekly, "monthly": monthly}
+        self.keep_last = keep_last
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        # The older week setting stays the default for the weekly rule
+        return cls(
+            recent_days=float(os.getenv("BACKUP_RETENTION_DAYS", "7")),
+            hourly=int(os.getenv("BACKUP_RETENTION_HOURLY", "0")),
+            daily=int(os.getenv("BACKUP_RETENTION_DAILY", "0")),
+            weekly=int(os.getenv("BACKUP_RETENTION_WEEKLY", os.getenv("BACKUP_RETENTION_WEEKS", "4"))),
+            monthly=int(os.getenv("BACKUP_RETENTION_MONTHLY", "0")),
+            keep_last=int(os.getenv("BACKUP_RETENTION_KEEP_LAST", "1")),
+        )
+
+    def describe(self) -> str:
+        rules = [f"{count} {rule}" for rule, count in self.counts.items() if count > 0]
+        recent = [f"all from the last {self.recent_days:g} days"] if self.recent_days > 0 else []
+        return ", ".join([f"last {self.keep_last}"] + recent + rules)
+
+    def apply(self, entries: List[Tuple[str, Dict[str, Any]]], now: Optional[float] = None
+              ) -> Tuple[List[Tuple[str, List[str]]], List[str]]:
+        """Split newest-first entries into (kept with reasons, removed)."""
+        recent_cutoff = (now if now is not None else time.time()) - self.recent_days * 86400
+        last_period: Dict[str, Optional[Tuple[int, ...]]] = {rule: None for rule in PERIODS}
+        kept_periods = {rule: 0 for rule in PERIODS}
+        keep: List[Tuple[str, List[str]]] = []
+        remove: List[str] = []
+
+        for position, (name, entry) in enumerate(entries):
+            when = datetime.fromtimestamp(entry["timestamp"])
+            reasons = ["last"] if position < self.keep_last else []
+            if self.recent_days > 0 and entry["timestamp"] > recent_cutoff:
+                reasons.append("recent")
+            for rule, period_of in PERIODS.items():
+                period = period_of(when)
+                # Entries are newest first, so the first one seen in a period is its newest
+                if period != last_period[rule]:
+                    last_period[rule] = period
+                    if kept_periods[rule] < self.counts[rule]:
+                        kept_periods[rule] += 1
+                        reasons.append(rule)
+            if reasons:
+                keep.append((name, reasons))
+            else:
+                remove.append(name)
+        return keep, remove
+
+
+def format_report(catalog: BackupCatalog, keep: List[Tuple[str, List[str]]],
+                  remove: List[str]) -> List[str]:
+    lines = [f"KEEP    {name}  ({', '.join(reasons)})" for name, reasons in keep]
+    lines += [f"REMOVE  {name}" for name in remove]
+    freed = sum(catalog.backups[name]["size_bytes"] for name in remove)
+    lines.append(f"{len(keep)} kept, {len(remove)} removed ({freed / (1024 * 1024):.2f} MB)")
+    return lines
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [BACKUP] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    if len(sys.argv) != 3 or sys.argv[1] not in ("list", "retention"):
+        print(__doc__.strip().split("Usage:")[1], file=sys.stderr)
+        sys.exit(1)
+
+    backup_dir = sys.argv[2]
+    catalog = BackupCatalog(os.getenv("BACKUP_CATALOG_FILE", os.path.join(backup_dir, "catalog.json")))
+    if not catalog.exists:
+        logger.info("No catalog yet, indexing the backup directory")
+        catalog.sync_local(backup_dir)
+
+    if sys.argv[1] == "list":
+        for name, entry in catalog.entries():
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["timestamp"]))
+            places = ",".join(d for d, v in entry["destinations"].items() if v)
+            print(f"{when}  {entry['size_bytes'] / (1024 * 1024):10.2f} MB  {name}  [{places or 'none'}]")
+    else:
+        policy = RetentionPolicy.from_env()
+        print(f"Retention policy: {policy.describe()} (dry run)")
+        keep, remove = policy.apply(catalog.entries())
+        print("\n".join(format_report(catalog, keep, remove)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Minecraft Incremental Backup Store
+Content-addressed, chunk-level deduplicating backups of the data directory.
+
+Anvil region files (.mca) are split into their individual chunk records and
+every chunk and every other file is stored once, keyed by its SHA-256. Each
+backup is a small gzip-compressed JSON manifest that lists which blobs make
+up which file. Region headers (chunk locations and per-chunk timestamps) are
+compared against the previous manifest, so unchanged chunks and files are
+never re-read or re-hashed.
+
+Usage:
+    chunkstore.py restore <manifest> <dest>   Rebuild a data directory
+    chunkstore.py gc <backup-dir>             Delete unreferenced blobs
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import struct
+import hashlib
+import logging
+from glob import glob
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SECTOR_SIZE = 4096
+HEADER_SIZE = 2 * SECTOR_SIZE
+CHUNKS_PER_REGION = 1024
+REGION_SUFFIXES = (".mca", ".mcr")
+MANIFEST_EXT = "manifest.json.gz"
+MANIFEST_VERSION = 1
+READ_SIZE = 1024 * 1024
+
+
+def parse_region_header(header: bytes) -> List[Tuple[int, int, int, int]]:
+    """Return (index, offset_sectors, sector_count, timestamp) for each present chunk."""
+    chunks = []
+    for index in range(CHUNKS_PER_REGION):
+        location = struct.unpack_from(">I", header, index * 4)[0]
+        offset, count = location >> 8, location & 0xFF
+        if offset == 0 and count == 0:
+            continue
+        timestamp = struct.unpack_from(">I", header, SECTOR_SIZE + index * 4)[0]
+        chunks.append((index, offset, count, timestamp))
+    return chunks
+
+
+class ChunkStore:
+    """Deduplicating blob store with per-backup manifests."""
+
+    def __init__(self, store_dir: str, on_read: Optional[Callable[[int], None]] = None):
+        self.store_dir = store_dir
+        self.on_read = on_read  # Called with the size of every read, e.g. to throttle I/O
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.stats: Dict[str, int] = {}
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put(self, data: bytes) -> str:
+        """Store a blob if it is new and return its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            self.stats["blobs_reused"] += 1
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.stats["blobs_written"] += 1
+        self.stats["bytes_written"] += len(data)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def put_file(self, path: str) -> List[str]:
+        """Store a plain file in fixed-size pieces and return their digests."""
+        digests = []
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                if self.on_read:
+                    self.on_read(len(data))
+                digests.append(self.put(data))
+        return digests
+
+    def put_region(self, path: str, previous: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Store a region file chunk by chunk; return None if it is not a valid region."""
+        reuse = {}
+        if previous and previous.get("type") == "region":
+            reuse = {c[0]: c for c in previous["chunks"]}
+
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                return None
+            size = os.fstat(f.fileno()).st_size
+
+            chunks = []
+            for index, offset, count, timestamp in parse_region_header(header):
+                old = reuse.get(index)
+                # Same slot and same timestamp means the chunk was not rewritten
+                if old and old[1] == timestamp and old[3] == offset and old[4] == count:
+                    chunks.append(old)
+                    self.stats["chunks_unchanged"] += 1
+                    continue
+
+                if offset < 2 or (offset + count) * SECTOR_SIZE > size:
+                    return None
+                f.seek(offset * SECTOR_SIZE)
+                length = struct.unpack(">I", f.read(4))[0]
+                if length == 0 or 4 + length > count * SECTOR_SIZE:
+                    return None
+                record = struct.pack(">I", length) + f.read(length)
+                if self.on_read:
+                    self.on_read(len(record))
+                chunks.append([index, timestamp, self.put(record), offset, count])
+                self.stats["chunks_read"] += 1
+
+        return {"type": "region", "chunks": chunks}
+
+    def backup(self, source: str, exclude: Callable[[str, bool], bool],
+               previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Store every file under ``source`` and return the new manifest."""
+        self.stats = {
+            "files_unchanged": 0, "files_read": 0, "chunks_unchanged": 0, "chunks_read": 0,
+            "blobs_written": 0, "blobs_reused": 0, "bytes_written": 0, "links": 0,
+        }
+        old_files = previous["files"] if previous else {}
+        files: Dict[str, Dict[str, Any]] = {}
+
+        for root, dirs, names in os.walk(source):
+            rel_root = os.path.relpath(root, source)
+            rel_root = "" if rel_root == "." else rel_root
+            if rel_root:
+                # Recorded so that empty directories come back too
+                try:
+                    st = os.stat(root)
+                    files[rel_root] = {"type": "dir", "mtime_ns": st.st_mtime_ns, "mode": st.st_mode & 0o7777}
+                except FileNotFoundError:
+                    continue
+            dirs[:] = [d for d in dirs if not exclude(os.path.join(rel_root, d), True)]
+            # os.walk lists links to directories with the directories but never enters them
+            links = [d for d in dirs if os.path.islink(os.path.join(root, d))]
+            dirs[:] = [d for d in dirs if d not in links]
+
+            for name in names:
+                rel_path = os.path.join(rel_root, name)
+                path = os.path.join(root, name)
+                if exclude(rel_path, False):
+                    continue
+                if os.path.islink(path):
+                    links.append(name)
+                    continue
+                try:
+                    st = os.stat(path)
+                    old = old_files.get(rel_path)
+                    if old and old.get("size") == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                        files[rel_path] = old
+                        self.stats["files_unchanged"] += 1
+                        continue
+
+                    entry = None
+                    if name.endswith(REGION_SUFFIXES) and st.st_size >= HEADER_SIZE:
+                        entry = self.put_region(path, old)
+                    if entry is None:
+                        entry = {"type": "file", "blobs": self.put_file(path)}
+                except FileNotFoundError:
+                    continue
+
+                entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns, mode=st.st_mode & 0o7777)
+                files[rel_path] = entry
+                self.stats["files_read"] += 1
+
+            for name in links:
+                path = os.path.join(root, name)
+                try:
+                    files[os.path.join(rel_root, name)] = {
+                        "type": "symlink", "target": os.readlink(path),
+                        "mtime_ns": os.lstat(path).st_mtime_ns,
+                    }
+                except FileNotFoundError:
+                    continue
+                self.stats["links"] += 1
+
+        return {"version": MANIFEST_VERSION, "created": time.time(), "files": files}
+
+    def restore(self, manifest: Dict[str, Any], dest: str,
+                select: Optional[Callable[[str], bool]] = None):
+        """Rebuild files, directories and symlinks described by a manifest under ``dest``."""
+        directories = []
+        for rel_path, entry in manifest["files"].items():
+            if select is not None and not select(rel_path):
+                continue
+            path = os.path.join(dest, rel_path)
+            if entry["type"] == "dir":
+                os.makedirs(path, exist_ok=True)
+                os.chmod(path, entry["mode"])
+                directories.append((path, entry))
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.restore-tmp"
+            if entry["type"] == "symlink":
+                os.symlink(entry["target"], tmp)
+                os.replace(tmp, path)
+                os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]), follow_symlinks=False)
+                continue
+            with open(tmp, "wb") as f:
+                if entry["type"] == "region":
+                    self._write_region(f, entry["chunks"])
+                else:
+                    for digest in entry["blobs"]:
+                        f.write(self.get(digest))
+            os.chmod(tmp, entry.get("mode", 0o644))
+            os.replace(tmp, path)
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+        # Last, and deepest first, as restoring their contents changed them
+        for path, entry in sorted(directories, key=lambda d: d[0], reverse=True):
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    def _write_region(self, f, chunks: List[List[Any]]):
+        locations = bytearray(SECTOR_SIZE)
+        timestamps = bytearray(SECTOR_SIZE)
+        f.write(bytes(HEADER_SIZE))
+        sector = 2
+        for index, timestamp, digest, _, _ in sorted(chunks, key=lambda c: c[3]):
+            record = self.get(digest)
+            count = -(-len(record) // SECTOR_SIZE)
+            f.write(record + bytes(count * SECTOR_SIZE - len(record)))
+            struct.pack_into(">I", locations, index * 4, (sector << 8) | count)
+            struct.pack_into(">I", timestamps, index * 4, timestamp)
+            sector += count
+        f.seek(0)
+        f.write(locations + timestamps)
+
+    def referenced(self, manifests: Iterable[str]) -> Set[str]:
+        """Collect every blob digest referenced by the given manifest files."""
+        digests: Set[str] = set()
+        for path in manifests:
+            for entry in load_manifest(path)["files"].values():
+                if entry["type"] == "region":
+                    digests.update(chunk[2] for chunk in entry["chunks"])
+                elif entry["type"] == "file":
+                    digests.update(entry["blobs"])
+        return digests
+
+    def gc(self, manifests: Iterable[str]) -> Tuple[int, int]:
+        """Delete blobs no manifest refers to; return (blobs, bytes) removed."""
+        keep = self.referenced(manifests)
+        removed = freed = 0
+        for path in glob(os.path.join(self.objects_dir, "*", "*")):
+            digest = os.path.basename(os.path.dirname(path)) + os.path.basename(path)
+            if digest not in keep:
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        return removed, freed
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest: Dict[str, Any], path: str):
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def latest_manifest(backup_dir: str) -> Optional[str]:
+    """Return the newest manifest in a backup directory, if any."""
+    manifests = sorted(glob(os.path.join(backup_dir, f"minecraft-backup-*.{MANIFEST_EXT}")))
+    return manifests[-1] if manifests else None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [BACKUP] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    if len(sys.argv) == 4 and sys.argv[1] == "restore":
+        manifest_path, dest = sys.argv[2], sys.argv[3]
+        default_store = os.path.join(os.path.dirname(os.path.abspath(manifest_path)), "store")
+        store = ChunkStore(os.getenv("BACKUP_STORE_DIR", default_store))
+        store.restore(load_manifest(manifest_path), dest)
+        logger.info(f"Restored {manifest_path} to {dest}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "gc":
+        backup_dir = sys.argv[2]
+        store = ChunkStore(os.getenv("BACKUP_STORE_DIR", os.path.join(backup_dir, "store")))
+        removed, freed = store.gc(glob(os.path.join(backup_dir, f"minecraft-backup-*.{MANIFEST_EXT}")))
+        logger.info(f"Removed {removed} unreferenced blobs ({freed / (1024 * 1024):.2f} MB)")
+    else:
+        print(__doc__.strip().split("Usage:")[1], file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
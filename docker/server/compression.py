@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup Compression
+Multi-core compressed writers for backup archives.
+
+gzip, bzip2 and xz archives are compressed in independent blocks on a thread
+pool and written as concatenated members/streams, which every standard
+decompressor (gzip, bzip2, xz, tar and Python's own modules) reads as a
+single file. Because every block is independent, ``blocks`` records where
+each one starts so readers can later decompress only the blocks they need.
+zstd is delegated to the ``zstd`` binary and its native multithreading.
+
+Writers accept either a path or an already open binary file object, so the
+compressed stream can be sent somewhere other than a local file.
+"""
+
+import abc
+import bz2
+import lzma
+import os
+import time
+import zlib
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+EXTENSIONS = {
+    "gz": "tar.gz",
+    "bz2": "tar.bz2",
+    "xz": "tar.xz",
+    "zstd": "tar.zst",
+}
+
+DEFAULT_LEVELS = {
+    "gz": 6,
+    "bz2": 9,
+    "xz": 6,
+    "zstd": 3,
+}
+
+# Cheapest setting per format for data that is already compressed (gzip level 0 stores it)
+STORE_LEVELS = {
+    "gz": 0,
+    "bz2": 1,
+    "xz": 0,
+}
+
+# Larger blocks compress better; smaller ones spread across cores sooner
+BLOCK_SIZES = {
+    "gz": 4 * 1024 * 1024,
+    "bz2": 8 * 1024 * 1024,
+    "xz": 16 * 1024 * 1024,
+}
+
+
+def resolve_threads(threads: int) -> int:
+    """Map 0 (or less) to the number of available cores."""
+    if threads > 0:
+        return threads
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def gzip_block(level: int) -> Callable[[bytes], bytes]:
+    def compress(data: bytes) -> bytes:
+        # wbits=31 emits a complete gzip member with header and CRC trailer
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    return compress
+
+
+def bz2_block(level: int) -> Callable[[bytes], bytes]:
+    return lambda data: bz2.compress(data, compresslevel=level)
+
+
+def xz_block(level: int) -> Callable[[bytes], bytes]:
+    return lambda data: lzma.compress(data, format=lzma.FORMAT_XZ, preset=level)
+
+
+BLOCK_COMPRESSORS = {
+    "gz": gzip_block,
+    "bz2": bz2_block,
+    "xz": xz_block,
+}
+
+
+class CompressedWriter(abc.ABC):
+    """Write-only file object that compresses everything written to it."""
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @abc.abstractmethod
+    def write(self, data: bytes) -> int:
+        """Compress data and return how many bytes were taken."""
+
+    def set_stored(self, stored: bool):
+        """Hint that the data written next is already compressed."""
+
+    @abc.abstractmethod
+    def close(self):
+        """Flush everything still buffered and finish the stream."""
+
+    def stats(self) -> Dict[str, float]:
+        """Return size, ratio and throughput of the finished stream."""
+        elapsed = (self.finished or time.monotonic()) - self.started
+        mb_in = self.bytes_in / (1024 * 1024)
+        return {
+            "uncompressed_bytes": self.bytes_in,
+            "compressed_bytes": self.bytes_out,
+            "ratio": round(self.bytes_in / self.bytes_out, 3) if self.bytes_out else 0.0,
+            "seconds": round(elapsed, 3),
+            "throughput_mbps": round(mb_in / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ParallelBlockWriter(CompressedWriter):
+    """Compress fixed-size blocks concurrently and emit them in order."""
+
+    def __init__(self, output: BinaryIO, compress: Callable[[bytes], bytes],
+                 block_size: int, threads: int, close_output: bool = True,
+                 store: Optional[Callable[[bytes], bytes]] = None):
+        super().__init__()
+        self.output = output
+        self.close_output = close_output
+        self.compress = compress
+        self.store = store
+        self.stored = False
+        self.block_size = block_size
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="compress")
+        self.pending: Deque[Tuple[Future, int]] = deque()
+        self.buffer = bytearray()
+        self.closed = False
+        # (compressed offset, compressed size, uncompressed offset, uncompressed size)
+        self.blocks: List[Tuple[int, int, int, int]] = []
+        self.submitted = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self.bytes_in += len(data)
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def set_stored(self, stored: bool):
+        if self.store is None or stored == self.stored:
+            return
+        # End the block here so compressed and stored data never share one
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.stored = stored
+
+    def _submit(self, block: bytes):
+        compress = self.store if self.stored else self.compress
+        self.pending.append((self.executor.submit(compress, block), len(block)))
+        # Bound memory: at most two blocks per worker in flight
+        while len(self.pending) > self.threads * 2:
+            self._drain_one()
+
+    def _drain_one(self):
+        future, size = self.pending.popleft()
+        compressed = future.result()
+        self.output.write(compressed)
+        self.blocks.append((self.bytes_out, len(compressed), self.submitted, size))
+        self.bytes_out += len(compressed)
+        self.submitted += size
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.buffer or self.bytes_in == 0:
+                self._submit(bytes(self.buffer))
+                self.buffer = bytearray()
+            while self.pending:
+                self._drain_one()
+            self.output.flush()
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            if self.close_output:
+                self.output.close()
+            self.finished = time.monotonic()
+
+
+class ZstdWriter(CompressedWriter):
+    """Pipe data through the multithreaded zstd binary."""
+
+    def __init__(self, output: Union[str, BinaryIO], level: int, threads: int):
+        super().__init__()
+        self.path = output if isinstance(output, str) else None
+        cmd = ["zstd", "-q", "-f", f"-T{threads}", f"-{level}"]
+        if level > 19:
+            cmd.insert(1, "--ultra")
+        cmd += ["-o", self.path] if self.path else ["-c"]
+        self.process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+            stdout=None if self.path else subprocess.PIPE
+        )
+        self.closed = False
+
+        self.output = None if self.path else output
+        self.pump: Optional[threading.Thread] = None
+        self.pump_error: Optional[BaseException] = None
+        if self.output is not None:
+            self.pump = threading.Thread(target=self._pump, name="zstd-pump", daemon=True)
+            self.pump.start()
+
+    def _pump(self):
+        try:
+            while True:
+                data = self.process.stdout.read(1024 * 1024)
+                if not data:
+                    break
+                self.output.write(data)
+                self.bytes_out += len(data)
+        except BaseException as e:
+            self.pump_error = e
+            self.process.kill()
+
+    def write(self, data: bytes) -> int:
+        try:
+            self.process.stdin.write(data)
+        except BrokenPipeError:
+            if self.pump_error:
+                raise self.pump_error
+            raise
+        self.bytes_in += len(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.process.stdin.close()
+            stderr = self.process.stderr.read().decode("utf-8", errors="replace")
+            returncode = self.process.wait()
+            if self.pump is not None:
+                self.pump.join()
+            if self.pump_error:
+                raise self.pump_error
+            if returncode != 0:
+                raise RuntimeError(f"zstd failed: {stderr.strip()}")
+        finally:
+            if self.output is not None:
+                self.output.close()
+        if self.path:
+            self.bytes_out = os.path.getsize(self.path)
+        self.finished = time.monotonic()
+
+
+def open_writer(output: Union[str, BinaryIO], method: str, level: Optional[int] = None,
+                threads: int = 0) -> CompressedWriter:
+    """Open a compressed writer for a path or binary file object; the writer closes it."""
+    if method not in EXTENSIONS:
+        raise ValueError(f"Unsupported compression: {method}")
+    level = DEFAULT_LEVELS[method] if level is None else level
+    threads = resolve_threads(threads)
+
+    if method == "zstd":
+        return ZstdWriter(output, level, threads)
+
+    if isinstance(output, str):
+        output = open(output, "wb")
+    return ParallelBlockWriter(
+        output, BLOCK_COMPRESSORS[method](level), BLOCK_SIZES[method], threads,
+        store=BLOCK_COMPRESSORS[method](STORE_LEVELS[method])
+    )
@@ -207,9 +207,9 @@ if [ -f "/init-worlds.sh" ]; then
 fi
 
 # Auto-pause (monitors players and Chunker, pauses when idle)
-if [ "${ENABLE_AUTOPAUSE}" = "true" ] && [ -f "/autopause.sh" ]; then
+if [ "${ENABLE_AUTOPAUSE}" = "true" ] && [ -f "/autopause.py" ]; then
     log "Starting auto-pause monitor (timeout: ${AUTOPAUSE_TIMEOUT:-10}m)..."
-    /autopause.sh &
+    python3 /autopause.py &
 fi
 
 # Automated backups (daily backups with retention)
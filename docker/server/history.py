@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Minecraft Server Status History
+Fixed-memory, multi-resolution ring buffers of monitor samples.
+
+Samples are kept raw for an hour, averaged per minute for a day and per ten
+minutes for a week. Every tier is backed by preallocated ``array('d')``
+columns, so memory use is constant regardless of uptime.
+"""
+
+import math
+import re
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FIELDS = ("tps", "players", "memory_rss", "rcon_latency")
+
+DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)([smhdw]?)$")
+DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+NAN = float("nan")
+
+
+def parse_duration(value: str) -> float:
+    """Parse a duration such as 90, 15m, 24h or 7d into seconds."""
+    match = DURATION_RE.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration: {value}")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class RingBuffer:
+    """Preallocated circular buffer of timestamped sample rows."""
+
+    def __init__(self, capacity: int, width: int):
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        self.columns = [array("d", [NAN]) * capacity for _ in range(width)]
+        self.head = 0
+        self.size = 0
+
+    def append(self, timestamp: float, values: Sequence[float]):
+        self.times[self.head] = timestamp
+        for column, value in zip(self.columns, values):
+            column[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def rows(self, since: float) -> List[Tuple[float, List[float]]]:
+        """Return rows newer than ``since`` in chronological order."""
+        rows = []
+        start = (self.head - self.size) % self.capacity
+        for i in range(self.size):
+            index = (start + i) % self.capacity
+            timestamp = self.times[index]
+            if timestamp >= since:
+                rows.append((timestamp, [column[index] for column in self.columns]))
+        return rows
+
+
+class Accumulator:
+    """Running per-field sums for the bucket currently being filled."""
+
+    def __init__(self, width: int):
+        self.bucket: Optional[float] = None
+        self.sums = [0.0] * width
+        self.counts = [0] * width
+
+    def add(self, values: Sequence[float]):
+        for i, value in enumerate(values):
+            if not math.isnan(value):
+                self.sums[i] += value
+                self.counts[i] += 1
+
+    def means(self) -> List[float]:
+        return [total / count if count else NAN for total, count in zip(self.sums, self.counts)]
+
+    def reset(self, bucket: float):
+        self.bucket = bucket
+        self.sums = [0.0] * len(self.sums)
+        self.counts = [0] * len(self.counts)
+
+
+class Tier:
+    """One resolution level: a ring buffer plus its downsampling accumulator."""
+
+    def __init__(self, resolution: float, retention: float, width: int):
+        self.resolution = resolution
+        self.retention = retention
+        self.buffer = RingBuffer(max(1, math.ceil(retention / resolution)) + 1, width)
+        self.accumulator = Accumulator(width)
+
+    def add(self, timestamp: float, values: Sequence[float]):
+        bucket = timestamp - timestamp % self.resolution
+        if self.accumulator.bucket is None:
+            self.accumulator.reset(bucket)
+        elif bucket != self.accumulator.bucket:
+            self.buffer.append(self.accumulator.bucket, self.accumulator.means())
+            self.accumulator.reset(bucket)
+        self.accumulator.add(values)
+
+
+class StatusHistory:
+    """Thread-safe multi-resolution store of monitor samples."""
+
+    def __init__(self, sample_interval: float, fields: Sequence[str] = FIELDS):
+        self.fields = tuple(fields)
+        width = len(self.fields)
+        self.sample_interval = max(1.0, float(sample_interval))
+        self.raw = RingBuffer(math.ceil(3600 / self.sample_interval) + 1, width)
+        self.tiers = [
+            Tier(60, 86400, width),
+            Tier(600, 7 * 86400, width),
+        ]
+        self._lock = threading.Lock()
+
+    def record(self, timestamp: float, **values: Optional[float]):
+        """Add one sample; missing fields are stored as NaN."""
+        row = [NAN if values.get(name) is None else float(values[name]) for name in self.fields]
+        with self._lock:
+            self.raw.append(timestamp, row)
+            for tier in self.tiers:
+                tier.add(timestamp, row)
+
+    def query(self, now: float, range_seconds: float, step: Optional[float] = None) -> Dict[str, Any]:
+        """Return samples for the last ``range_seconds``, averaged into ``step`` buckets."""
+        since = now - range_seconds
+        with self._lock:
+            if range_seconds <= 3600:
+                resolution, rows = self.sample_interval, self.raw.rows(since)
+            else:
+                tier = next((t for t in self.tiers if range_seconds <= t.retention), self.tiers[-1])
+                resolution, rows = tier.resolution, tier.buffer.rows(since)
+
+        if step and step > resolution:
+            rows = self._downsample(rows, step)
+            resolution = step
+
+        return {
+            "fields": list(self.fields),
+            "range": range_seconds,
+            "step": resolution,
+            "points": [
+                [timestamp] + [None if math.isnan(v) else round(v, 4) for v in values]
+                for timestamp, values in rows
+            ]
+        }
+
+    def _downsample(self, rows: List[Tuple[float, List[float]]], step: float):
+        result = []
+        accumulator = Accumulator(len(self.fields))
+        for timestamp, values in rows:
+            bucket = timestamp - timestamp % step
+            if accumulator.bucket is not None and bucket != accumulator.bucket:
+                result.append((accumulator.bucket, accumulator.means()))
+                accumulator.reset(bucket)
+            elif accumulator.bucket is None:
+                accumulator.reset(bucket)
+            accumulator.add(values)
+        if accumulator.bucket is not None:
+            result.append((accumulator.bucket, accumulator.means()))
+        return result
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Minecraft Protocol Helpers
+VarInt and packet framing, and the handful of packets needed to answer or
+send a server list ping, a legacy (pre-1.7) ping and the start of a login.
+
+Shared by the autopause proxy and the load-testing tools in scripts/, so
+both speak exactly the same protocol.
+"""
+
+import json
+import struct
+import asyncio
+
+PROTOCOL_VERSION = 767         # Sent when pinging the server
+LEGACY_PROTOCOL = 127          # Reported to legacy pings; pre-1.7 clients cannot join anyway
+MAX_PACKET_LENGTH = 2048       # Handshake, status, ping and login start all fit
+MAX_STATUS_LENGTH = 262144     # A status response from the server, favicon included
+READ_TIMEOUT = 5.0             # Seconds to wait for each packet
+
+# Protocol states requested by the handshake
+STATE_STATUS = 1
+STATE_LOGIN = 2
+STATE_TRANSFER = 3
+
+
+class ProtocolError(Exception):
+    """Raised for data that is not a valid Minecraft packet."""
+
+
+def write_varint(value):
+    """Encode an integer as a Minecraft VarInt."""
+    result = b''
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value != 0:
+            byte |= 0x80
+        result += bytes([byte])
+        if value == 0:
+            break
+    return result
+
+def read_varint(data, offset=0):
+    """Decode a VarInt from bytes, return (value, bytes_read)."""
+    result = 0
+    shift = 0
+    for i in range(5):
+        if offset + i >= len(data):
+            return None, 0
+        byte = data[offset + i]
+        result |= (byte & 0x7F) << shift
+        if not (byte & 0x80):
+            return result, i + 1
+        shift += 7
+    return None, 0
+
+async def read_varint_stream(reader, raw=None, first=None):
+    """Read a VarInt from a stream one byte at a time, appending the bytes to raw.
+
+    The first byte may already have been read, and is passed as first.
+    """
+    result = 0
+    for i in range(5):
+        if first is not None:
+            byte, first = first, None
+        else:
+            byte = await reader.readexactly(1)
+        if raw is not None:
+            raw += byte
+        result |= (byte[0] & 0x7F) << (7 * i)
+        if not (byte[0] & 0x80):
+            return result
+    raise ProtocolError("VarInt too long")
+
+async def read_packet(reader, raw=None, first=None, max_length=MAX_PACKET_LENGTH, timeout=READ_TIMEOUT):
+    """Read one length-prefixed packet and return (packet_id, payload).
+
+    The packet's bytes as received are appended to raw, if given.
+    """
+    length = await asyncio.wait_for(read_varint_stream(reader, raw, first), timeout)
+    if length < 1 or length > max_length:
+        raise ProtocolError(f"bad packet length {length}")
+    data = await asyncio.wait_for(reader.readexactly(length), timeout)
+    if raw is not None:
+        raw += data
+    packet_id, id_len = read_varint(data)
+    if packet_id is None:
+        raise ProtocolError("bad packet id")
+    return packet_id, data[id_len:]
+
+def read_string(payload, offset=0):
+    """Decode a length-prefixed UTF-8 string, return (text, bytes_read)."""
+    length, read = read_varint(payload, offset)
+    if length is None or offset + read + length > len(payload):
+        raise ProtocolError("bad string")
+    return payload[offset + read:offset + read + length].decode('utf-8', errors='replace'), read + length
+
+def parse_handshake(payload):
+    """Return (protocol_version, next_state) from a handshake packet payload."""
+    protocol_version, offset = read_varint(payload)
+    if protocol_version is None:
+        raise ProtocolError("bad handshake")
+    str_len, read = read_varint(payload, offset)
+    if str_len is None:
+        raise ProtocolError("bad handshake")
+    # Skip server address string and port (2 bytes)
+    offset += read + str_len + 2
+    next_state, read = read_varint(payload, offset)
+    if next_state is None:
+        raise ProtocolError("bad handshake")
+    return protocol_version, next_state
+
+def create_packet(packet_id, body=b''):
+    """Frame a packet: length, packet ID, body."""
+    payload = write_varint(packet_id) + body
+    return write_varint(len(payload)) + payload
+
+def create_string_packet(packet_id, text):
+    """Create a Minecraft packet with a string payload."""
+    text_bytes = text.encode('utf-8')
+    return create_packet(packet_id, write_varint(len(text_bytes)) + text_bytes)
+
+def create_handshake(next_state, host='localhost', port=25565, protocol_version=PROTOCOL_VERSION):
+    """Create the handshake a client opens every connection with."""
+    host_bytes = host.encode('utf-8')
+    return create_packet(0x00, write_varint(protocol_version) + write_varint(len(host_bytes)) + host_bytes
+                         + port.to_bytes(2, 'big') + write_varint(next_state))
+
+def create_status_request():
+    """Create the empty status request that follows a status handshake."""
+    return create_packet(0x00)
+
+def create_ping_packet(payload):
+    """Create a ping (packet ID 0x01) carrying 8 bytes for the server to echo."""
+    return create_packet(0x01, payload)
+
+def create_pong_packet(payload):
+    """Echo a ping's 8-byte payload back as a pong (packet ID 0x01)."""
+    return create_packet(0x01, payload)
+
+def create_login_start(name, uuid=b'\0' * 16):
+    """Create a login start (1.20.2+ layout: name, then the player's UUID)."""
+    name_bytes = name.encode('utf-8')
+    return create_packet(0x00, write_varint(len(name_bytes)) + name_bytes + uuid)
+
+def create_status_response(status):
+    """Create a server status response (for server list ping)."""
+    return create_string_packet(0x00, json.dumps(status))
+
+def plain_text(component):
+    """Flatten a chat component (the MOTD) to plain text for legacy clients."""
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return "".join(plain_text(part) for part in component)
+    if isinstance(component, dict):
+        return component.get("text", "") + "".join(plain_text(part) for part in component.get("extra", ()))
+    return ""
+
+def create_legacy_ping():
+    """The ping a 1.4 to 1.6 client sends instead of a handshake."""
+    return b"\xfe\x01"
+
+def create_legacy_status_response(status):
+    """Create the kick packet (0xFF) that answers a pre-1.7 (0xFE) server list ping."""
+    motd = plain_text(status.get("description", "")).replace("\n", " ")
+    fields = ["§1", str(LEGACY_PROTOCOL), status.get("version", {}).get("name", ""), motd,
+              str(status.get("players", {}).get("online", 0)), str(status.get("players", {}).get("max", 0))]
+    text = "\0".join(fields).encode("utf-16-be")
+    return b"\xff" + struct.pack(">H", len(text) // 2) + text
+
+async def fetch_status(port, timeout=2.0, host='127.0.0.1'):
+    """Ask a server for its status, as a server list would; None if it does not answer."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write(create_handshake(STATE_STATUS, 'localhost', port) + create_status_request())
+        await writer.drain()
+        packet_id, payload = await read_packet(reader, max_length=MAX_STATUS_LENGTH, timeout=timeout)
+        if packet_id != 0x00:
+            return None
+        status = json.loads(read_string(payload)[0])
+        return status if isinstance(status, dict) else None
+    except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, ProtocolError):
+        return None
+    finally:
+        writer.close()
+
+async def server_responds(port, timeout=2.0):
+    """Whether the server on a local port answers a status request."""
+    return await fetch_status(port, timeout) is not None
@@ -1,21 +1,28 @@
 #!/usr/bin/env python3
 """
 Minecraft Server Monitor
-Provides health check endpoint and optional Discord webhooks for server status.
+Provides health check and Prometheus metrics endpoints and optional Discord
+webhooks for server status.
 """
 
 import os
+import re
 import sys
 import time
 import json
 import signal
 import logging
-import subprocess
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from threading import Thread
-from typing import Optional, Dict, Any
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, RLock
+from urllib.parse import urlsplit, parse_qs
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+import metrics
+from history import StatusHistory, parse_duration
+from notify import DiscordDispatcher
+from rcon import RconError, get_client, strip_formatting
+
 # Configuration from environment variables
 RCON_HOST = os.getenv("RCON_HOST", "localhost")
 RCON_PORT = os.getenv("RCON_PORT", "25575")
@@ -24,6 +31,12 @@ MONITOR_PORT = int(os.getenv("MONITOR_PORT", "8080"))
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL", "")
 CHECK_INTERVAL = int(os.getenv("MONITOR_CHECK_INTERVAL", "60"))
 TPS_WARNING_THRESHOLD = float(os.getenv("TPS_WARNING_THRESHOLD", "15.0"))
+MAX_STALENESS = float(os.getenv("MONITOR_MAX_STALENESS", str(CHECK_INTERVAL * 2)))
+MEMORY = os.getenv("MEMORY", "")
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/backups")
+BACKUP_STATUS_FILE = os.getenv("BACKUP_STATUS_FILE", os.path.join(BACKUP_DIR, "last-backup.json"))
+PROXY_STATS_FILE = os.getenv("PROXY_STATS_FILE", "/tmp/proxy-stats.json")
+AUTOPAUSE_EVENT_LOG = os.getenv("AUTOPAUSE_EVENT_LOG", "/data/logs/autopause-events.jsonl")
 
 # Setup logging
 logging.basicConfig(
@@ -39,8 +52,11 @@ server_status = {
     "players": 0,
     "max_players": 0,
     "tps": 0.0,
+    "tps_5m": 0.0,
+    "tps_15m": 0.0,
     "memory_used": 0,
     "memory_max": 0,
+    "rcon_latency_ms": None,
     "uptime": 0,
     "last_check": None,
     "error": None
@@ -49,27 +65,139 @@ server_status = {
 start_time = time.time()
 shutdown_flag = False
 
+# Latest serialized /health response, published by monitor_loop
+snapshot_body = b""
+snapshot_time = 0.0
+status_lock = RLock()
+java_pid: Optional[int] = None
+history = StatusHistory(CHECK_INTERVAL)
+notifier = DiscordDispatcher(DISCORD_WEBHOOK_URL, "Minecraft Server Alert")
+
+# Prometheus metrics
+TPS_WINDOWS = ("1m", "5m", "15m")
+PLAYER_COUNT_RE = re.compile(r"There are (\d+)\D+?(\d+)")
+MEMORY_SIZE_RE = re.compile(r"^(\d+)([kKmMgGtT]?)$")
+
+SERVER_UP = metrics.gauge("minecraft_up", "Whether the server answers RCON (1) or not (0)")
+PLAYERS_ONLINE = metrics.gauge("minecraft_players_online", "Players currently online")
+PLAYERS_MAX = metrics.gauge("minecraft_players_max", "Maximum player slots")
+TPS = metrics.gauge("minecraft_tps", "Ticks per second averaged over a window", ["window"])
+JVM_RSS = metrics.gauge("minecraft_jvm_memory_rss_bytes", "Resident memory of the server JVM")
+JVM_MAX = metrics.gauge("minecraft_jvm_memory_max_bytes", "Configured maximum JVM heap")
+RCON_LATENCY = metrics.histogram(
+    "minecraft_rcon_request_duration_seconds", "RCON command round-trip latency", ["command"]
+)
+RCON_ERRORS = metrics.counter("minecraft_rcon_errors_total", "Failed RCON commands", ["command"])
+BACKUP_DURATION = metrics.gauge("minecraft_backup_last_duration_seconds", "Duration of the last backup run")
+BACKUP_SIZE = metrics.gauge("minecraft_backup_last_size_bytes", "Size of the last backup archive")
+BACKUP_TIMESTAMP = metrics.gauge("minecraft_backup_last_timestamp_seconds", "Unix time the last backup finished")
+BACKUP_CHECKED = metrics.gauge(
+    "minecraft_backup_last_check_timestamp_seconds",
+    "Unix time backups were last confirmed current (a backup, or a skipped one with no changes)"
+)
+BACKUP_RATIO = metrics.gauge(
+    "minecraft_backup_last_compression_ratio", "Uncompressed to compressed size of the last backup"
+)
+BACKUP_THROUGHPUT = metrics.gauge(
+    "minecraft_backup_last_throughput_mbps", "Compression throughput of the last backup in MB/s"
+)
+BACKUP_SAVE_OFF = metrics.gauge(
+    "minecraft_backup_last_save_off_seconds", "How long auto-save was disabled during the last backup"
+)
+BACKUP_SUCCESS = metrics.gauge("minecraft_backup_last_success", "Whether the last backup succeeded (1) or not (0)")
+PROXY_SLEEPING = metrics.gauge("minecraft_proxy_sleeping", "Whether the autopause proxy stands in for a paused server (1) or forwards (0)")
+PROXY_CONNECTIONS = metrics.gauge("minecraft_proxy_connections", "Open client connections through the autopause proxy")
+PROXY_ACCEPTED = metrics.counter("minecraft_proxy_connections_total", "Client connections accepted by the proxy")
+PROXY_REFUSED = metrics.counter("minecraft_proxy_refused_connections_total", "Client connections refused by per-IP limits")
+PROXY_BYTES = metrics.counter("minecraft_proxy_bytes_total", "Bytes passed through the proxy", ["direction"])
+PROXY_CONNECT_SECONDS = metrics.counter(
+    "minecraft_proxy_connect_seconds_total", "Total time spent connecting to the server"
+)
+PROXY_CONNECTS = metrics.counter("minecraft_proxy_connects_total", "Connections made to the server")
+PROXY_CONNECT_LAST = metrics.gauge(
+    "minecraft_proxy_last_connect_seconds", "Time the most recent connection to the server took"
+)
+AUTOPAUSE_PAUSES = metrics.counter("minecraft_autopause_pauses_total", "Times autopause paused the server")
+AUTOPAUSE_WAKES = metrics.counter("minecraft_autopause_wakes_total", "Times autopause woke the server", ["trigger"])
+AUTOPAUSE_STEP_SECONDS = metrics.gauge(
+    "minecraft_autopause_step_seconds",
+    "Time from the idle deadline or wake trigger to each step, over recent transitions", ["step", "quantile"]
+)
+AUTOPAUSE_STEPS = metrics.counter("minecraft_autopause_steps_total", "Timed autopause steps", ["step"])
+
+
+def observe_rcon(command: str, seconds: float, ok: bool):
+    """Record the latency of a single RCON command."""
+    # Label by command name only to keep cardinality bounded
+    name = command.split(" ", 1)[0]
+    RCON_LATENCY.observe(seconds, command=name)
+    if not ok:
+        RCON_ERRORS.inc(command=name)
+
 
 def rcon_command(command: str) -> Optional[str]:
     """Execute RCON command and return output."""
+    results = rcon_commands([command])
+    return results[0]
+
+
+def rcon_commands(commands: List[str]) -> List[Optional[str]]:
+    """Pipeline several RCON commands over the shared connection."""
     try:
-        result = subprocess.run(
-            ["mcrcon", "-H", RCON_HOST, "-P", RCON_PORT, "-p", RCON_PASSWORD, command],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-        else:
-            logger.error(f"RCON command failed: {result.stderr}")
-            return None
-    except subprocess.TimeoutExpired:
-        logger.error("RCON command timed out")
-        return None
-    except Exception as e:
+        client = get_client(RCON_HOST, RCON_PORT, RCON_PASSWORD, timeout=5, observer=observe_rcon)
+        return [strip_formatting(output).strip() for output in client.commands(commands)]
+    except RconError as e:
         logger.error(f"RCON error: {e}")
-        return None
+        return [None] * len(commands)
+
+
+def find_java_pid() -> Optional[int]:
+    """Locate the Paper JVM process by its command line."""
+    global java_pid
+
+    if java_pid is not None and os.path.exists(f"/proc/{java_pid}"):
+        return java_pid
+
+    java_pid = None
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ")
+        except OSError:
+            continue
+        if b"java" in cmdline and b"paper.jar" in cmdline:
+            java_pid = int(entry)
+            break
+    return java_pid
+
+
+def parse_memory_size(value: str) -> int:
+    """Convert a JVM size such as 4G or 512M to bytes."""
+    match = MEMORY_SIZE_RE.match(value.strip())
+    if not match:
+        return 0
+    exponent = " KMGT".index(match.group(2).upper() or " ")
+    return int(match.group(1)) * 1024 ** exponent
+
+
+def get_jvm_memory() -> Dict[str, int]:
+    """Read the JVM resident set size from /proc."""
+    memory = {"memory_used": 0, "memory_max": parse_memory_size(MEMORY)}
+    pid = find_java_pid()
+    if pid is None:
+        return memory
+
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    memory["memory_used"] = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    return memory
 
 
 def get_server_status() -> Dict[str, Any]:
@@ -77,46 +205,47 @@ def get_server_status() -> Dict[str, Any]:
     global server_status
 
     try:
+        # Pipeline all status queries over one round-trip
+        rcon_started = time.monotonic()
+        list_output, tps_output = rcon_commands(["list", "tps"])
+        rcon_latency = round((time.monotonic() - rcon_started) * 1000, 2)
+
+        # Memory is read locally, so it is reported even when RCON is down
+        server_status.update(get_jvm_memory())
+
         # Check if server is online with list command
-        list_output = rcon_command("list")
         if not list_output:
             server_status["online"] = False
             server_status["error"] = "Server not responding to RCON"
+            server_status["rcon_latency_ms"] = None
             return server_status
 
         server_status["online"] = True
         server_status["error"] = None
+        server_status["rcon_latency_ms"] = rcon_latency
 
-        # Parse player count from "There are X of Y players online"
-        try:
-            parts = list_output.split()
-            if "are" in parts:
-                idx = parts.index("are")
-                server_status["players"] = int(parts[idx + 1])
-                server_status["max_players"] = int(parts[idx + 3])
-        except (ValueError, IndexError):
+        # Parse player count from "There are X of a max of Y players online"
+        match = PLAYER_COUNT_RE.search(list_output)
+        if match:
+            server_status["players"] = int(match.group(1))
+            server_status["max_players"] = int(match.group(2))
+        else:
             logger.warning(f"Could not parse player count from: {list_output}")
 
         # Get TPS
-        tps_output = rcon_command("tps")
         if tps_output:
             try:
                 # Parse TPS from output like "TPS from last 1m, 5m, 15m: 20.0, 20.0, 20.0"
                 if ":" in tps_output:
-                    tps_values = tps_output.split(":")[1].strip()
-                    tps_1m = float(tps_values.split(",")[0].strip())
+                    tps_values = tps_output.split(":")[1].strip().split(",")
+                    # Paper prefixes values capped at 20 with an asterisk
+                    tps_1m, tps_5m, tps_15m = (float(v.strip().lstrip("*")) for v in tps_values[:3])
                     server_status["tps"] = round(tps_1m, 2)
+                    server_status["tps_5m"] = round(tps_5m, 2)
+                    server_status["tps_15m"] = round(tps_15m, 2)
             except (ValueError, IndexError):
                 logger.warning(f"Could not parse TPS from: {tps_output}")
 
-        # Get memory usage
-        mem_output = rcon_command("forge:tps")  # Try forge command first
-        if not mem_output:
-            # Fallback to checking via external commands
-            # This is a placeholder - actual memory tracking would need plugin support
-            server_status["memory_used"] = 0
-            server_status["memory_max"] = 0
-
         # Calculate uptime
         server_status["uptime"] = int(time.time() - start_time)
         server_status["last_check"] = datetime.utcnow().isoformat() + "Z"
@@ -129,33 +258,131 @@ def get_server_status() -> Dict[str, Any]:
     return server_status
 
 
-def send_discord_webhook(message: str, color: int = 0x00ff00):
-    """Send notification to Discord webhook."""
-    if not DISCORD_WEBHOOK_URL:
+def update_status_metrics(status: Dict[str, Any]):
+    """Mirror a status snapshot into the Prometheus gauges."""
+    SERVER_UP.set(1 if status["online"] else 0)
+    PLAYERS_ONLINE.set(status["players"] if status["online"] else 0)
+    PLAYERS_MAX.set(status["max_players"])
+    for window, key in zip(TPS_WINDOWS, ("tps", "tps_5m", "tps_15m")):
+        TPS.set(status[key], window=window)
+    JVM_RSS.set(status["memory_used"])
+    JVM_MAX.set(status["memory_max"])
+
+
+def update_backup_metrics():
+    """Load the last backup result written by backup.py."""
+    try:
+        with open(BACKUP_STATUS_FILE) as f:
+            backup = json.load(f)
+    except (OSError, ValueError):
         return
 
+    BACKUP_DURATION.set(backup.get("duration_seconds", 0))
+    BACKUP_SIZE.set(backup.get("size_bytes", 0))
+    BACKUP_TIMESTAMP.set(backup.get("timestamp", 0))
+    BACKUP_CHECKED.set(backup.get("checked_timestamp", backup.get("timestamp", 0)))
+    BACKUP_RATIO.set(backup.get("compression_ratio", 0))
+    BACKUP_THROUGHPUT.set(backup.get("compression_throughput_mbps", 0))
+    BACKUP_SAVE_OFF.set(backup.get("save_off_seconds", 0))
+    BACKUP_SUCCESS.set(1 if backup.get("success") else 0)
+
+
+def load_proxy_stats() -> Optional[Dict[str, Any]]:
+    """Load the live stats written by proxy.py, if autopause runs it."""
     try:
-        import urllib.request
-        import json
-
-        data = {
-            "embeds": [{
-                "title": "Minecraft Server Alert",
-                "description": message,
-                "color": color,
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            }]
+        with open(PROXY_STATS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_proxy_metrics():
+    """Mirror the proxy's connection counts and traffic into the Prometheus metrics."""
+    stats = load_proxy_stats()
+    if not stats:
+        return
+
+    PROXY_SLEEPING.set(1 if stats["mode"] == "sleeping" else 0)
+    PROXY_CONNECTIONS.set(stats["connections"]["active"])
+    PROXY_ACCEPTED.set_total(stats["connections"]["accepted"])
+    PROXY_REFUSED.set_total(stats["connections"]["refused"])
+    PROXY_BYTES.set_total(stats["bytes"]["up"], direction="up")
+    PROXY_BYTES.set_total(stats["bytes"]["down"], direction="down")
+    PROXY_CONNECT_SECONDS.set_total(stats["connect_ms"]["sum"] / 1000)
+    PROXY_CONNECTS.set_total(stats["connect_ms"]["count"])
+    if stats["connect_ms"]["last"] is not None:
+        PROXY_CONNECT_LAST.set(stats["connect_ms"]["last"] / 1000)
+
+    autopause = stats.get("autopause")
+    if not autopause:
+        return
+    AUTOPAUSE_PAUSES.set_total(autopause["pauses"])
+    for trigger, count in autopause["wakes"].items():
+        AUTOPAUSE_WAKES.set_total(count, trigger=trigger)
+    for step, timing in autopause["timings_ms"].items():
+        AUTOPAUSE_STEPS.set_total(timing["count"], step=step)
+        for quantile, key in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99"), ("1", "max")):
+            if key in timing:
+                AUTOPAUSE_STEP_SECONDS.set(timing[key] / 1000, step=step, quantile=quantile)
+
+
+def load_autopause_events(limit: int) -> List[Dict[str, Any]]:
+    """Return the last ``limit`` pause/wake events from the autopause event log."""
+    try:
+        with open(AUTOPAUSE_EVENT_LOG, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 256 * 1024, 0))
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    events = []
+    for line in lines[max(len(lines) - limit, 0):]:
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue  # The first line may be cut off
+    return events
+
+
+def send_discord_webhook(message: str, color: int = 0x00ff00, key: Optional[str] = None):
+    """Queue a notification for the Discord webhook without blocking."""
+    notifier.send(message, color=color, key=key)
+
+
+def refresh_snapshot() -> Dict[str, Any]:
+    """Query the server and publish a pre-serialized /health response."""
+    global snapshot_body, snapshot_time
+
+    with status_lock:
+        status = dict(get_server_status())
+        update_status_metrics(status)
+
+        response = {
+            "status": "healthy" if status["online"] else "unhealthy",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "server": status
         }
 
-        req = urllib.request.Request(
-            DISCORD_WEBHOOK_URL,
-            data=json.dumps(data).encode("utf-8"),
-            headers={"Content-Type": "application/json"}
-        )
-        urllib.request.urlopen(req, timeout=10)
-        logger.info(f"Discord notification sent: {message}")
-    except Exception as e:
-        logger.error(f"Failed to send Discord webhook: {e}")
+        snapshot_body = json.dumps(response, indent=2).encode("utf-8")
+        snapshot_time = time.monotonic()
+
+    return status
+
+
+def snapshot_is_stale() -> bool:
+    """Check whether the cached snapshot is missing or older than MAX_STALENESS."""
+    return not snapshot_body or time.monotonic() - snapshot_time > MAX_STALENESS
+
+
+def get_snapshot(fresh: bool = False) -> bytes:
+    """Return the cached /health body, refreshing it if forced or too stale."""
+    requested = time.monotonic()
+    if fresh or snapshot_is_stale():
+        with status_lock:
+            # Concurrent requests share whichever refresh finished while they waited
+            if (snapshot_time < requested) if fresh else snapshot_is_stale():
+                refresh_snapshot()
+    return snapshot_body
 
 
 class HealthCheckHandler(BaseHTTPRequestHandler):
@@ -167,27 +394,98 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
 
     def do_GET(self):
         """Handle GET requests."""
-        if self.path == "/health" or self.path == "/":
+        url = urlsplit(self.path)
+        if url.path == "/health" or url.path == "/":
+            fresh = parse_qs(url.query).get("fresh", ["0"])[0] in ("1", "true")
+            body = get_snapshot(fresh=fresh)
+
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
             self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/history":
+            query = parse_qs(url.query)
+            try:
+                range_seconds = parse_duration(query.get("range", ["1h"])[0])
+                step = parse_duration(query["step"][0]) if "step" in query else None
+            except ValueError as e:
+                self.send_response(400)
+                self.end_headers()
+                self.wfile.write(str(e).encode("utf-8"))
+                return
 
-            # Refresh status
-            status = get_server_status()
+            body = json.dumps(history.query(time.time(), range_seconds, step)).encode("utf-8")
 
-            response = {
-                "status": "healthy" if status["online"] else "unhealthy",
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "server": status
-            }
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/proxy":
+            stats = load_proxy_stats()
+            if stats is None:
+                self.send_response(404)
+                self.end_headers()
+                self.wfile.write(b"Proxy not running")
+                return
+
+            body = json.dumps(stats, indent=2).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/autopause":
+            stats = load_proxy_stats()
+            if not stats or "autopause" not in stats:
+                self.send_response(404)
+                self.end_headers()
+                self.wfile.write(b"Autopause not running")
+                return
+
+            try:
+                limit = int(parse_qs(url.query).get("events", ["50"])[0])
+            except ValueError:
+                limit = 50
+            body = json.dumps(dict(stats["autopause"], events=load_autopause_events(max(limit, 0))),
+                              indent=2).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/metrics":
+            update_backup_metrics()
+            update_proxy_metrics()
+            body = metrics.REGISTRY.render()
 
-            self.wfile.write(json.dumps(response, indent=2).encode("utf-8"))
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
         else:
             self.send_response(404)
             self.end_headers()
             self.wfile.write(b"Not found")
 
 
+def record_history(status: Dict[str, Any]):
+    """Append the latest status to the in-memory history."""
+    online = status["online"]
+    latency = status["rcon_latency_ms"]
+    history.record(
+        time.time(),
+        tps=status["tps"] if online else None,
+        players=status["players"] if online else None,
+        memory_rss=status["memory_used"] or None,
+        rcon_latency=latency / 1000 if latency is not None else None
+    )
+
+
 def monitor_loop():
     """Background monitoring loop."""
     global shutdown_flag
@@ -195,19 +493,22 @@ def monitor_loop():
     last_tps_warning = 0
 
     while not shutdown_flag:
-        status = get_server_status()
+        status = refresh_snapshot()
+        record_history(status)
 
         # Check for server down/up
         if last_online is not None and last_online != status["online"]:
             if status["online"]:
                 send_discord_webhook(
                     "✅ Server is now **ONLINE**",
-                    color=0x00ff00
+                    color=0x00ff00,
+                    key="status"
                 )
             else:
                 send_discord_webhook(
                     "❌ Server is **DOWN** or not responding",
-                    color=0xff0000
+                    color=0xff0000,
+                    key="status"
                 )
 
         last_online = status["online"]
@@ -231,6 +532,7 @@ def signal_handler(signum, frame):
     global shutdown_flag
     logger.info("Shutting down monitor...")
     shutdown_flag = True
+    # Unwinds to main(), which delivers pending notifications outside the handler
     sys.exit(0)
 
 
@@ -238,7 +540,7 @@ def main():
     """Main entry point."""
     logger.info(f"Starting Minecraft server monitor on port {MONITOR_PORT}")
     logger.info(f"RCON: {RCON_HOST}:{RCON_PORT}")
-    logger.info(f"Check interval: {CHECK_INTERVAL}s")
+    logger.info(f"Check interval: {CHECK_INTERVAL}s (max staleness: {MAX_STALENESS}s)")
     logger.info(f"Discord webhook: {'enabled' if DISCORD_WEBHOOK_URL else 'disabled'}")
 
     # Setup signal handlers
@@ -251,12 +553,16 @@ def main():
 
     # Start HTTP server
     try:
-        server = HTTPServer(("0.0.0.0", MONITOR_PORT), HealthCheckHandler)
+        server = ThreadingHTTPServer(("0.0.0.0", MONITOR_PORT), HealthCheckHandler)
+        server.daemon_threads = True
         logger.info(f"Health check endpoint available at http://0.0.0.0:{MONITOR_PORT}/health")
+        logger.info(f"Prometheus metrics available at http://0.0.0.0:{MONITOR_PORT}/metrics")
         server.serve_forever()
     except Exception as e:
         logger.error(f"Failed to start HTTP server: {e}")
         sys.exit(1)
+    finally:
+        notifier.flush(timeout=5)
 
 
 if __name__ == "__main__":
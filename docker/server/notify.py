@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Minecraft Server Notifications
+Background Discord webhook dispatcher shared by the monitor and backup scripts.
+
+Notifications are queued and delivered from a worker thread, so a slow or
+unavailable Discord never blocks the caller. Pending embeds are batched into
+a single webhook call, keyed events (such as online/offline) are coalesced,
+429 responses are retried after Discord's ``retry_after``, and the oldest
+notifications are dropped and summarised when the queue is full.
+"""
+
+import json
+import time
+import logging
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Discord accepts at most 10 embeds per message
+MAX_EMBEDS = 10
+MAX_ATTEMPTS = 3
+
+
+class DiscordDispatcher:
+    """Non-blocking, batching Discord webhook sender."""
+
+    def __init__(self, webhook_url: str, title: str, max_queue: int = 50,
+                 batch_window: float = 2.0, timeout: float = 10.0):
+        self.webhook_url = webhook_url
+        self.title = title
+        self.max_queue = max_queue
+        self.batch_window = batch_window
+        self.timeout = timeout
+
+        self._pending: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        # Last message per key handed to the worker (in flight or sent), and last one sent
+        self._latest: Dict[str, str] = {}
+        self._delivered: Dict[str, str] = {}
+        self._dropped = 0
+        self._sequence = 0
+        self._busy = False
+        self._flushing = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def send(self, message: str, color: int = 0x00ff00, key: Optional[str] = None):
+        """Queue a notification; a newer one with the same key replaces older pending ones."""
+        if not self.webhook_url:
+            return
+
+        embed = {
+            "title": self.title,
+            "description": message,
+            "color": color,
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
+
+        with self._cond:
+            if key is not None:
+                self._pending.pop(key, None)
+                # A flap that ends where it started needs no notification at all
+                if self._latest.get(key) == message:
+                    return
+            else:
+                self._sequence += 1
+
+            while len(self._pending) >= self.max_queue:
+                self._pending.popitem(last=False)
+                self._dropped += 1
+
+            self._pending[key if key is not None else ("seq", self._sequence)] = {
+                "key": key, "embed": embed
+            }
+            self._ensure_worker()
+            self._cond.notify()
+
+    def flush(self, timeout: float = 15.0):
+        """Wait until queued notifications have been delivered or timeout expires."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._flushing = False
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="discord-dispatcher", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        if self._dropped:
+            batch.append({"key": None, "embed": {
+                "title": self.title,
+                "description": f"⚠️ {self._dropped} notification(s) dropped because the queue was full",
+                "color": 0xffaa00,
+                "timestamp": datetime.utcnow().isoformat() + "Z"
+            }})
+            self._dropped = 0
+        while self._pending and len(batch) < MAX_EMBEDS:
+            item = self._pending.popitem(last=False)[1]
+            if item["key"] is not None:
+                self._latest[item["key"]] = item["embed"]["description"]
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._dropped:
+                    self._cond.wait()
+                # Give bursts a moment to accumulate so they share one request
+                deadline = time.monotonic() + self.batch_window
+                while not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+                self._busy = True
+
+            try:
+                delivered = self._post([item["embed"] for item in batch])
+                with self._cond:
+                    for item in batch:
+                        key = item["key"]
+                        if key is None:
+                            continue
+                        if delivered:
+                            self._delivered[key] = item["embed"]["description"]
+                        elif key in self._delivered:
+                            # Never arrived, so the same message sent again must not be dropped
+                            self._latest[key] = self._delivered[key]
+                        else:
+                            self._latest.pop(key, None)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _post(self, embeds: List[Dict[str, Any]]) -> bool:
+        data = json.dumps({"embeds": embeds}).encode("utf-8")
+        for attempt in range(MAX_ATTEMPTS):
+            req = urllib.request.Request(
+                self.webhook_url,
+                data=data,
+                headers={"Content-Type": "application/json", "User-Agent": "lumo-server"}
+            )
+            try:
+                urllib.request.urlopen(req, timeout=self.timeout).close()
+                logger.info(f"Discord notification sent ({len(embeds)} embed(s))")
+                return True
+            except urllib.error.HTTPError as e:
+                if e.code == 429:
+                    delay = self._retry_after(e)
+                    logger.warning(f"Discord rate limited, retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                if e.code < 500:
+                    logger.error(f"Failed to send Discord webhook: HTTP {e.code}")
+                    return False
+                logger.warning(f"Discord webhook error: HTTP {e.code}")
+            except Exception as e:
+                logger.warning(f"Discord webhook error: {e}")
+            time.sleep(2 ** attempt)
+
+        logger.error(f"Failed to send Discord webhook after {MAX_ATTEMPTS} attempts")
+        return False
+
+    @staticmethod
+    def _retry_after(error: urllib.error.HTTPError) -> float:
+        try:
+            return float(json.loads(error.read().decode("utf-8")).get("retry_after", 1.0))
+        except (ValueError, AttributeError, OSError):
+            pass
+        try:
+            return float(error.headers.get("Retry-After", 1.0))
+        except (TypeError, ValueError):
+            return 1.0
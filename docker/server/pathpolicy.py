@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup Path Policy
+Decide per path whether it is backed up, stored uncompressed, or left out.
+
+Rules are written one per line (or separated by ``;``) as ``<action>
+<pattern>``:
+
+    exclude  logs/                       Leave out (directories are pruned whole)
+    store    *.mca                       Back up without compressing
+    include  plugins/BlueMap/*.conf      Back up normally (overrides earlier rules)
+    every 7d bluemap/web/maps/*/tiles/   Back up only once per interval
+
+Patterns are globs relative to the data directory, in the style of
+.gitignore: a pattern without a slash matches a name at any depth, one with
+a slash is anchored to the data directory, ``**`` crosses directories and a
+trailing slash matches directories only. ``re:<regex>`` matches the whole
+relative path instead. When several rules match a path the last one wins,
+and a path no rule matches inherits the decision made for its directory.
+
+All rules are compiled into a single regular expression, each directory is
+evaluated once and cached, and excluded directories are never descended
+into, so skipped trees cost one lookup instead of one per file.
+"""
+
+import re
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+EXCLUDE = "exclude"
+STORE = "store"
+INCLUDE = "include"
+EVERY = "every"
+ACTIONS = (EXCLUDE, STORE, INCLUDE, EVERY)
+
+INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class PolicyError(ValueError):
+    """Raised for a rule that cannot be parsed."""
+
+
+def parse_interval(text: str) -> int:
+    """Parse "90", "30m", "12h", "7d" or "2w" into seconds."""
+    match = re.fullmatch(r"(\d+)([smhdw]?)", text.strip())
+    if not match:
+        raise PolicyError(f"Invalid interval: {text}")
+    return int(match.group(1)) * INTERVAL_UNITS[match.group(2) or "s"]
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a .gitignore-style glob into a regex for a data-relative path."""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "]") else i + 1)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    regex = "".join(out)
+    return regex if anchored else f"(?:.*/)?{regex}"
+
+
+class Rule:
+    """One parsed policy rule."""
+
+    def __init__(self, action: str, pattern: str, interval: Optional[int] = None):
+        self.action = action
+        self.pattern = pattern
+        self.interval = interval
+        self.dir_only = pattern.endswith("/") and not pattern.startswith("re:")
+        if pattern.startswith("re:"):
+            self.regex = pattern[3:]
+        else:
+            self.regex = glob_to_regex(pattern.rstrip("/"))
+
+    def __str__(self) -> str:
+        if self.action == EVERY:
+            unit = next(u for u in "wdhms" if self.interval % INTERVAL_UNITS[u] == 0)
+            return f"every {self.interval // INTERVAL_UNITS[unit]}{unit} {self.pattern}"
+        return f"{self.action} {self.pattern}"
+
+
+def parse_rules(text: str) -> List[Rule]:
+    """Parse rules separated by newlines or semicolons; # starts a comment."""
+    rules = []
+    for line in re.split(r"[;\n]", text):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split(None, 1)
+        action = parts[0].lower()
+        if action not in ACTIONS or len(parts) < 2:
+            raise PolicyError(f"Invalid backup policy rule: {line}")
+        if action == EVERY:
+            interval, _, pattern = parts[1].partition(" ")
+            if not pattern.strip():
+                raise PolicyError(f"Invalid backup policy rule: {line}")
+            rules.append(Rule(action, pattern.strip(), parse_interval(interval)))
+        else:
+            rules.append(Rule(action, parts[1].strip()))
+    for rule in rules:
+        try:
+            re.compile(rule.regex)
+        except re.error as e:
+            raise PolicyError(f"Invalid pattern in rule '{rule}': {e}")
+    return rules
+
+
+class PathPolicy:
+    """Compiled rule set answering "what happens to this path" for one backup run.
+
+    ``due`` holds the patterns of ``every`` rules whose interval has elapsed;
+    those paths are included this run and excluded otherwise.
+    """
+
+    def __init__(self, rules: Iterable[Rule], due: Iterable[str] = ()):
+        self.rules = list(rules)
+        self.due = list(due)
+        due_set: Set[str] = set(self.due)
+        self.actions: List[str] = []
+        for rule in self.rules:
+            if rule.action == EVERY:
+                self.actions.append(INCLUDE if rule.pattern in due_set else EXCLUDE)
+            else:
+                self.actions.append(rule.action)
+
+        # Alternation tries branches left to right, so list the last rule first
+        dir_branches, file_branches = [], []
+        for number in reversed(range(len(self.rules))):
+            branch = f"(?P<r{number}>{self.rules[number].regex})"
+            dir_branches.append(branch)
+            if not self.rules[number].dir_only:
+                file_branches.append(branch)
+        self.dir_re = re.compile("|".join(dir_branches)) if dir_branches else None
+        self.file_re = re.compile("|".join(file_branches)) if file_branches else None
+        self.dir_cache: Dict[str, str] = {"": INCLUDE}
+
+    def _match(self, regex: Optional["re.Pattern[str]"], rel: str) -> Optional[str]:
+        match = regex.fullmatch(rel) if regex else None
+        return self.actions[int(match.lastgroup[1:])] if match else None
+
+    def dir_action(self, rel: str) -> str:
+        action = self.dir_cache.get(rel)
+        if action is None:
+            parent = rel.rsplit("/", 1)[0] if "/" in rel else ""
+            inherited = self.dir_action(parent)
+            action = EXCLUDE if inherited == EXCLUDE else (self._match(self.dir_re, rel) or inherited)
+            self.dir_cache[rel] = action
+        return action
+
+    def action(self, rel: str, is_dir: bool = False) -> str:
+        """Return exclude, store or include for a data-relative path."""
+        rel = rel.strip("/")
+        if is_dir:
+            return self.dir_action(rel)
+        parent = self.dir_action(rel.rsplit("/", 1)[0] if "/" in rel else "")
+        if parent == EXCLUDE:
+            return EXCLUDE
+        return self._match(self.file_re, rel) or parent
+
+    def excluded(self, rel: str, is_dir: bool = False) -> bool:
+        return self.action(rel, is_dir) == EXCLUDE
+
+    def stored(self, rel: str) -> bool:
+        return self.action(rel) == STORE
+
+    def describe(self) -> List[str]:
+        return [f"{rule}" + ((" (due)" if action == INCLUDE else " (not due)") if rule.action == EVERY else "")
+                for rule, action in zip(self.rules, self.actions)]
+
+
+def due_rules(rules: Iterable[Rule], last_included: Dict[str, Optional[float]],
+              now: float) -> List[str]:
+    """Patterns of ``every`` rules that should be included in a backup taken now."""
+    due = []
+    for rule in rules:
+        if rule.action != EVERY:
+            continue
+        last = last_included.get(rule.pattern)
+        # Small slack so a daily rule is not pushed back a whole run by scheduling jitter
+        if last is None or now - last >= rule.interval * 0.95:
+            due.append(rule.pattern)
+    return due
@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+"""
+Minecraft Proxy - Owns the public port in front of the server when
+autopause is enabled.
+
+In forward mode every connection is passed through to the server's internal
+port. In sleeping mode (while the JVM is paused) server list pings get a
+"sleeping" status, and a login wakes the server. It is then either held and
+spliced through once the server is back (hold), or disconnected with a
+"please reconnect" message (disconnect).
+
+autopause.py runs the proxy in its own event loop: it switches modes
+directly, is told about wakes through a callback, and follows the number of
+players from the logins passing through. Run on its own, the proxy switches
+modes on SIGUSR1 (sleeping) and SIGUSR2 (forward) and only logs wakes. The
+port stays bound the whole time, so no connection is ever refused while
+switching, and one event loop serves every connection instead of a process
+per player. Live connection counts, bytes per connection and connect latency
+to the server are written to a JSON stats file, which the monitor exports.
+
+While sleeping, server list pings are answered from the server's own last
+status response (MOTD, version, max players, favicon), captured just before
+it was paused and kept pre-encoded, so a ping costs a dictionary lookup and
+the server looks the same in the list as when it is running. The client's
+protocol version is echoed back, as ViaVersion does on the live server,
+unless --status-protocol server is given. Legacy (0xFE) pings from pre-1.7
+clients are answered too.
+
+Sleeping-mode clients are served concurrently, so an idle or slow connection
+(or a port scanner) cannot hold up anyone else's ping or login. Packets are
+read with proper length-prefixed framing, every read has a deadline, and
+connections are capped in total and per IP so a flood from one address
+cannot starve real wake attempts.
+"""
+
+import os
+import abc
+import copy
+import asyncio
+import argparse
+import itertools
+import json
+import sys
+import signal
+import time
+
+from mcproto import (
+    MAX_PACKET_LENGTH, PROTOCOL_VERSION, READ_TIMEOUT, STATE_LOGIN, STATE_STATUS, STATE_TRANSFER,
+    ProtocolError, create_legacy_status_response, create_pong_packet, create_status_response,
+    create_string_packet, parse_handshake, read_packet, read_varint,
+)
+
+FORWARD = "forward"
+SLEEPING = "sleeping"
+WAKE_MODES = ("hold", "disconnect")
+STATUS_PROTOCOLS = ("client", "server")
+STATS_FILE = os.getenv("PROXY_STATS_FILE", "/tmp/proxy-stats.json")
+STATS_INTERVAL = 5.0           # Seconds between stats file updates
+
+# Limits (sleeping mode)
+BACKLOG = 128
+MAX_CONNECTIONS = 256          # Open connections in total
+MAX_CONNECTIONS_PER_IP = 8     # Open connections from one address
+CONNECT_RATE_PER_IP = 20       # New connections per address per RATE_WINDOW
+RATE_WINDOW = 10.0             # Seconds
+CONNECTION_TIMEOUT = 15.0      # Seconds a connection may stay open at all
+STATUS_CACHE_SIZE = 64         # Encoded status packets kept, one per client protocol version
+HOLD_TIMEOUT = 25.0            # Seconds to hold a login for the server; clients give up at 30
+BACKEND_RETRY_INTERVAL = 0.25  # Seconds between connection attempts to the waking server
+
+SLEEPING_HINT = "§6Server is sleeping, join to wake it up"
+
+# Shown while sleeping until the server's own status has been captured
+DEFAULT_STATUS = {
+    "version": {"name": "Sleeping", "protocol": PROTOCOL_VERSION},
+    "players": {"max": 0, "online": 0},
+    "description": {"text": "§6⏳ Server is sleeping\n§7Connect to wake it up!"},
+    "enforcesSecureChat": False
+}
+
+
+def log(message):
+    print(f"[Proxy] {message}", file=sys.stderr, flush=True)
+
+def create_disconnect_packet(state):
+    """Create a disconnect packet with a friendly message."""
+    if state == 'login':
+        # Login disconnect uses packet ID 0x00
+        message = json.dumps({
+            "text": "⏳ Server is starting up...\n\n",
+            "color": "gold",
+            "extra": [{"text": "Please reconnect in a moment!", "color": "gray"}]
+        })
+        return create_string_packet(0x00, message)
+    else:
+        # For status, we don't disconnect
+        return b''
+
+
+class StatusCache:
+    """The status shown while sleeping, kept encoded so answering a ping is a lookup.
+
+    Packets are encoded once per client protocol version; with protocol set
+    to "server" there is only one.
+    """
+
+    def __init__(self, protocol="client"):
+        self.protocol = protocol
+        self.set(None)
+
+    def set(self, status):
+        """Serve the server's captured status (None for the built-in one)."""
+        if status is None:
+            self.status = DEFAULT_STATUS
+        else:
+            self.status = copy.deepcopy(status)
+            # Hovering over the player count says why the server is quiet
+            self.status.setdefault("players", {})["sample"] = [
+                {"name": SLEEPING_HINT, "id": "00000000-0000-0000-0000-000000000000"}
+            ]
+        self.packets = {}
+        self.legacy = create_legacy_status_response(self.status)
+
+    def packet(self, protocol_version):
+        key = protocol_version if self.protocol == "client" and self.status is not DEFAULT_STATUS else None
+        packet = self.packets.get(key)
+        if packet is None:
+            status = self.status
+            if key is not None:
+                status = dict(status, version=dict(status.get("version", {}), protocol=key))
+            if len(self.packets) >= STATUS_CACHE_SIZE:
+                self.packets.clear()
+            packet = self.packets[key] = create_status_response(status)
+        return packet
+
+
+class ConnectionLimiter:
+    """Cap open connections in total and per IP, and new connections per IP."""
+
+    def __init__(self):
+        self.total = 0
+        self.open = {}      # ip -> open connections
+        self.recent = {}    # ip -> (window start, connections in window)
+        self.refused = {}   # ip -> connections refused since the last log line
+        self.last_prune = time.monotonic()
+
+    def acquire(self, ip):
+        now = time.monotonic()
+        if now - self.last_prune > RATE_WINDOW:
+            self.recent = {k: v for k, v in self.recent.items() if now - v[0] < RATE_WINDOW}
+            self.last_prune = now
+
+        start, count = self.recent.get(ip, (now, 0))
+        if now - start >= RATE_WINDOW:
+            start, count = now, 0
+        self.recent[ip] = (start, count + 1)
+
+        if (self.total >= MAX_CONNECTIONS or self.open.get(ip, 0) >= MAX_CONNECTIONS_PER_IP
+                or count >= CONNECT_RATE_PER_IP):
+            refused = self.refused.get(ip, 0)
+            if refused == 0:
+                log(f"Too many connections from {ip}, refusing for now")
+            self.refused[ip] = refused + 1
+            return False
+
+        if self.refused.pop(ip, 0):
+            log(f"Accepting connections from {ip} again")
+        self.total += 1
+        self.open[ip] = self.open.get(ip, 0) + 1
+        return True
+
+    def release(self, ip):
+        self.total -= 1
+        self.open[ip] -= 1
+        if not self.open[ip]:
+            del self.open[ip]
+
+
+class Session:
+    """Accounting for one client connection."""
+
+    ids = itertools.count(1)
+
+    def __init__(self, ip, port, state):
+        self.id = next(self.ids)
+        self.ip = ip
+        self.port = port
+        self.state = state          # forward, sleeping, held, spliced
+        self.login = None           # Whether the handshake asked to log in (None = not seen yet)
+        self.started = time.time()
+        self.bytes_up = 0           # Client to server
+        self.bytes_down = 0         # Server to client
+        self.connect_ms = None      # Time to connect to the server
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "client": f"{self.ip}:{self.port}",
+            "state": self.state,
+            "seconds": round(time.time() - self.started, 1),
+            "bytes_up": self.bytes_up,
+            "bytes_down": self.bytes_down,
+            "connect_ms": self.connect_ms,
+        }
+
+
+class Link(asyncio.Protocol, abc.ABC):
+    """One side of a proxied connection: whatever arrives is written to the peer.
+
+    Flow control is passed across, so a slow reader on one side pauses
+    reading on the other instead of buffering without bound.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.transport = None
+        self.peer = None
+        self.pending = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def link(self, peer):
+        self.peer = peer
+        for data in self.pending:
+            self.forward(data)
+        self.pending = []
+
+    @abc.abstractmethod
+    def forward(self, data):
+        """Write data that arrived on this side to the peer."""
+
+    def data_received(self, data):
+        if self.peer:
+            self.forward(data)
+        else:
+            self.pending.append(data)
+
+    def eof_received(self):
+        # Minecraft never half-closes; end the whole connection once buffered data is out
+        if self.peer:
+            self.peer.transport.close()
+        return False
+
+    def connection_lost(self, exc):
+        if self.peer:
+            self.peer.transport.close()
+
+    def pause_writing(self):
+        if self.peer:
+            self.peer.transport.pause_reading()
+
+    def resume_writing(self):
+        if self.peer:
+            self.peer.transport.resume_reading()
+
+
+class Backend(Link):
+    """The connection to the server's internal port."""
+
+    def forward(self, data):
+        self.session.bytes_down += len(data)
+        self.peer.transport.write(data)
+
+
+class Client(Link):
+    """A client connection, forwarded or handled as a sleeping server."""
+
+    def __init__(self, proxy):
+        super().__init__(None)
+        self.proxy = proxy
+        self.reader = None
+        self.limited = False
+        self.received = 0
+        self.head = b""
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        ip, port = transport.get_extra_info('peername')[:2]
+        proxy = self.proxy
+        if proxy.mode == SLEEPING:
+            if not proxy.limiter.acquire(ip):
+                proxy.refused += 1
+                transport.abort()
+                return
+            self.limited = True
+            self.session = proxy.open_session(ip, port, SLEEPING)
+            self.reader = asyncio.StreamReader()
+            proxy.spawn(proxy.sleeping(self))
+        else:
+            self.session = proxy.open_session(ip, port, FORWARD)
+            proxy.spawn(proxy.forward(self))
+
+    def forward(self, data):
+        self.session.bytes_up += len(data)
+        if self.session.login is None:
+            self.classify(data)
+        self.peer.transport.write(data)
+
+    def classify(self, data):
+        """Tell a login from a status ping by the handshake, the first packet a client sends."""
+        self.head += data
+        length, read = read_varint(self.head)
+        if length is None:
+            if len(self.head) >= 5:
+                self.proxy.set_login(self.session, False)
+            return
+        if length < 1 or length > MAX_PACKET_LENGTH:
+            self.proxy.set_login(self.session, False)
+            return
+        if len(self.head) < read + length:
+            return
+        next_state = None
+        if self.head[read] == 0x00:
+            try:
+                _, next_state = parse_handshake(self.head[read + 1:read + length])
+            except ProtocolError:
+                pass
+        self.proxy.set_login(self.session, next_state in (STATE_LOGIN, STATE_TRANSFER))
+        self.head = b""
+
+    def data_received(self, data):
+        if self.reader is None:
+            return super().data_received(data)
+        self.received += len(data)
+        if self.received > 4 * MAX_PACKET_LENGTH:
+            # More than a handshake, login start and ping could ever need
+            self.transport.abort()
+            return
+        self.reader.feed_data(data)
+
+    def eof_received(self):
+        if self.reader is not None:
+            self.reader.feed_eof()
+        return super().eof_received()
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        if self.reader is not None:
+            self.reader.feed_eof()
+        if self.session:
+            self.proxy.close_session(self.session)
+        if self.limited:
+            self.proxy.limiter.release(self.session.ip)
+
+    def write(self, data):
+        self.transport.write(data)
+
+    def close(self):
+        self.transport.close()
+
+
+class Proxy:
+    """Listen on the public port and forward, or stand in for the paused server."""
+
+    def __init__(self, backend_port, wake_mode, stats_file, mode, on_wake=None, on_players=None,
+                 on_ping=None, status_protocol="client"):
+        self.backend_port = backend_port
+        self.wake_mode = wake_mode
+        self.status = StatusCache(status_protocol)
+        self.stats_file = stats_file
+        self.mode = mode
+        self.on_wake = on_wake          # Called with the client's IP when a login asks for a wake
+        self.on_players = on_players    # Called with the player count and IP when a player joins or leaves
+        self.on_ping = on_ping          # Called with the client's IP for a server list ping while sleeping
+        self.limiter = ConnectionLimiter()
+        self.sessions = {}
+        self.tasks = set()
+        self.woken = False
+        self.players = 0
+        self.extra = {}                 # Sections added to the stats by whoever runs the proxy
+        # Totals since start
+        self.accepted = 0
+        self.refused = 0
+        self.wakes = 0
+        self.closed_bytes_up = 0
+        self.closed_bytes_down = 0
+        self.connect_failures = 0
+        self.connects = 0
+        self.connect_ms_sum = 0.0
+        self.connect_ms_max = None
+        self.last_connect_ms = None
+
+    def spawn(self, coro):
+        """Run a task, keeping a reference until it finishes."""
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def open_session(self, ip, port, state):
+        session = Session(ip, port, state)
+        self.sessions[session.id] = session
+        self.accepted += 1
+        return session
+
+    def close_session(self, session):
+        if self.sessions.pop(session.id, None):
+            self.closed_bytes_up += session.bytes_up
+            self.closed_bytes_down += session.bytes_down
+            if session.login:
+                self.set_players(self.players - 1, session.ip)
+
+    def set_login(self, session, login):
+        """Record what a forwarded connection is; logins count as players while open."""
+        session.login = login
+        if login and session.id in self.sessions:
+            self.set_players(self.players + 1, session.ip)
+
+    def set_players(self, count, ip):
+        self.players = count
+        if self.on_players:
+            self.on_players(count, ip)
+
+    def unclassified(self):
+        """Forwarded connections whose handshake has not arrived yet."""
+        return sum(1 for s in self.sessions.values() if s.login is None and s.state != SLEEPING)
+
+    def set_mode(self, mode):
+        if mode != self.mode:
+            log(f"Switching to {mode} mode")
+            self.mode = mode
+            self.woken = False
+            self.write_stats()
+
+    def wake(self, ip):
+        """Ask for the server to be resumed; logged and counted once per sleep."""
+        if not self.woken:
+            log(f"Login attempt from {ip}, waking the server")
+            self.wakes += 1
+        self.woken = True
+        if self.on_wake:
+            self.on_wake(ip)
+
+    async def connect(self, client, held, deadline=None):
+        """Connect a client to the server, replay held bytes and start forwarding.
+
+        With a deadline, refused connections are retried until then (the
+        server is waking); otherwise the client is dropped.
+        """
+        loop = asyncio.get_running_loop()
+        session = client.session
+        while True:
+            started = time.monotonic()
+            try:
+                _, backend = await loop.create_connection(
+                    lambda: Backend(session), '127.0.0.1', self.backend_port
+                )
+                break
+            except OSError:
+                if deadline is None or time.monotonic() + BACKEND_RETRY_INTERVAL > deadline:
+                    self.connect_failures += 1
+                    return False
+                await asyncio.sleep(BACKEND_RETRY_INTERVAL)
+
+        session.connect_ms = round((time.monotonic() - started) * 1000, 2)
+        self.connects += 1
+        self.connect_ms_sum += session.connect_ms
+        self.connect_ms_max = max(self.connect_ms_max or 0, session.connect_ms)
+        self.last_connect_ms = session.connect_ms
+        if client.transport.is_closing():
+            backend.transport.close()
+            return True
+        if held:
+            session.bytes_up += len(held)
+            backend.transport.write(held)
+        client.reader = None
+        backend.link(client)
+        client.link(backend)
+        return True
+
+    async def forward(self, client):
+        """Pass a client straight through to the server."""
+        if not await self.connect(client, b""):
+            client.close()
+
+    async def sleeping(self, client):
+        """Handle a client as the sleeping server."""
+        try:
+            held = await asyncio.wait_for(self.converse(client), CONNECTION_TIMEOUT)
+            if held is None:
+                client.close()
+                return
+            client.session.state = "held"
+            started = time.monotonic()
+            if await self.connect(client, held, started + HOLD_TIMEOUT):
+                client.session.state = "spliced"
+                self.set_login(client.session, True)
+                log(f"Splicing login from {client.session.ip} to port {self.backend_port} "
+                    f"(held {time.monotonic() - started:.1f}s)")
+            else:
+                log(f"Server did not come back within {HOLD_TIMEOUT:.0f}s, disconnecting {client.session.ip}")
+                client.write(create_disconnect_packet('login'))
+                client.close()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            # Idle, truncated or garbage connections are just dropped; they do not wake the server
+            client.close()
+        except Exception as e:
+            log(f"Error handling client {client.session.ip}: {e}")
+            client.close()
+
+    async def converse(self, client):
+        """Speak the protocol up to login; return the bytes to replay for a held login, else None."""
+        reader = client.reader
+        raw = bytearray()
+        first = await asyncio.wait_for(reader.readexactly(1), READ_TIMEOUT)
+        if first[0] == 0xFE:
+            # Legacy server list ping from a pre-1.7 client
+            client.write(self.status.legacy)
+            return None
+        packet_id, payload = await read_packet(reader, raw, first)
+        if packet_id != 0x00:
+            raise ProtocolError("expected handshake")
+        protocol_version, next_state = parse_handshake(payload)
+
+        if next_state == STATE_STATUS:
+            # Status request (server list ping): answer and echo the ping. It only
+            # wakes the server if the on_ping policy decides a login is likely
+            packet_id, _ = await read_packet(reader)
+            if packet_id != 0x00:
+                return None
+            client.write(self.status.packet(protocol_version))
+            if self.on_ping:
+                self.on_ping(client.session.ip)
+            packet_id, payload = await read_packet(reader)
+            if packet_id == 0x01 and len(payload) == 8:
+                client.write(create_pong_packet(payload))
+
+        elif next_state in (STATE_LOGIN, STATE_TRANSFER):
+            if self.wake_mode == "hold":
+                # Hold the login: keep its handshake and login start to replay to the server
+                await read_packet(reader, raw)
+                self.wake(client.session.ip)
+                return bytes(raw)
+            # Login attempt - trigger wake and send the "starting up" disconnect
+            self.wake(client.session.ip)
+            client.write(create_disconnect_packet('login'))
+        return None
+
+    def stats(self):
+        sessions = list(self.sessions.values())
+        stats = {
+            "timestamp": time.time(),
+            "mode": self.mode,
+            "backend_port": self.backend_port,
+            "connections": {
+                "active": len(sessions),
+                "players": self.players,
+                "forwarding": sum(1 for s in sessions if s.state in (FORWARD, "spliced")),
+                "accepted": self.accepted,
+                "refused": self.refused,
+                "connect_failures": self.connect_failures,
+            },
+            "bytes": {
+                "up": self.closed_bytes_up + sum(s.bytes_up for s in sessions),
+                "down": self.closed_bytes_down + sum(s.bytes_down for s in sessions),
+            },
+            "connect_ms": {
+                "last": self.last_connect_ms,
+                "max": self.connect_ms_max,
+                "sum": round(self.connect_ms_sum, 2),
+                "count": self.connects,
+            },
+            "wakes": self.wakes,
+            "sessions": [s.to_dict() for s in sessions],
+        }
+        stats.update(self.extra)
+        return stats
+
+    def write_stats(self):
+        if not self.stats_file:
+            return
+        tmp = f"{self.stats_file}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.stats(), f)
+            os.replace(tmp, self.stats_file)
+        except OSError as e:
+            log(f"Could not write stats: {e}")
+
+    async def stats_loop(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            self.write_stats()
+
+    async def serve(self, port):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: Client(self), '0.0.0.0', port,
+                                          backlog=BACKLOG, reuse_address=True)
+        loop.add_signal_handler(signal.SIGUSR1, self.set_mode, SLEEPING)
+        loop.add_signal_handler(signal.SIGUSR2, self.set_mode, FORWARD)
+        log(f"Listening on port {port} ({self.mode} mode, server on port {self.backend_port}, "
+            f"{self.wake_mode} logins while sleeping)")
+        self.write_stats()
+        async with server:
+            await self.stats_loop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy for the Minecraft server with autopause support.")
+    parser.add_argument("port", type=int, help="Public port to listen on")
+    parser.add_argument("backend_port", type=int, help="Internal port of the server")
+    parser.add_argument("--wake-mode", choices=WAKE_MODES, default="hold",
+                        help="What to do with logins while sleeping (default: hold)")
+    parser.add_argument("--status-protocol", choices=STATUS_PROTOCOLS, default="client",
+                        help="Protocol version shown while sleeping: the client's own or the server's (default: client)")
+    parser.add_argument("--stats-file", default=STATS_FILE, help=f"JSON stats output (default: {STATS_FILE})")
+    parser.add_argument("--sleeping", action="store_true", help="Start in sleeping mode")
+    args = parser.parse_args()
+
+    proxy = Proxy(args.backend_port, args.wake_mode, args.stats_file,
+                  SLEEPING if args.sleeping else FORWARD, status_protocol=args.status_protocol)
+    try:
+        asyncio.run(proxy.serve(args.port))
+    except OSError as e:
+        log(f"Cannot listen on port {args.port}: {e}")
+        sys.exit(1)
+    finally:
+        # Stale stats would look like a live proxy to the monitor
+        if args.stats_file and os.path.exists(args.stats_file):
+            os.remove(args.stats_file)
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, lambda s, f: sys.exit(0))
+    signal.signal(signal.SIGINT, lambda s, f: sys.exit(0))
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Minecraft RCON Client
+Persistent Source RCON protocol client shared by the monitor and backup scripts.
+
+Keeps one authenticated socket per (host, port, password) target, reconnects
+transparently when the connection drops, and supports pipelining several
+commands in a single round-trip.
+"""
+
+import re
+import socket
+import struct
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Packet types (https://wiki.vg/RCON)
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+# Minecraft rejects request payloads larger than this
+MAX_REQUEST_PAYLOAD = 1446
+
+# Strips both legacy section-sign colour codes and ANSI escape sequences
+FORMATTING_RE = re.compile(r"§[0-9a-fk-orx]|\x1b\[[0-9;]*[A-Za-z]", re.IGNORECASE)
+
+
+class RconError(Exception):
+    """Raised when an RCON request cannot be completed."""
+
+
+class RconAuthError(RconError):
+    """Raised when the server rejects the RCON password."""
+
+
+def strip_formatting(text: str) -> str:
+    """Remove Minecraft colour codes and ANSI escapes from command output."""
+    return FORMATTING_RE.sub("", text)
+
+
+# Called as observer(command, seconds, ok) once per command
+Observer = Callable[[str, float, bool], None]
+
+
+class RconClient:
+    """Thread-safe RCON client holding a single persistent connection."""
+
+    def __init__(self, host: str, port: int, password: str, timeout: float = 5.0,
+                 observer: Optional[Observer] = None):
+        self.host = host
+        self.port = int(port)
+        self.password = password
+        self.timeout = timeout
+        self.observer = observer
+        self._sock: Optional[socket.socket] = None
+        self._buffer = b""
+        self._received = False
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _request_id(self) -> int:
+        self._next_id = (self._next_id % 0x7FFFFFFE) + 1
+        return self._next_id
+
+    def _send_packet(self, request_id: int, packet_type: int, payload: str):
+        body = payload.encode("utf-8")
+        if len(body) > MAX_REQUEST_PAYLOAD:
+            raise RconError(f"Command too long ({len(body)} bytes)")
+        packet = struct.pack("<ii", request_id, packet_type) + body + b"\x00\x00"
+        self._sock.sendall(struct.pack("<i", len(packet)) + packet)
+
+    def _recv_exact(self, size: int, deadline: float) -> bytes:
+        while len(self._buffer) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("RCON request timed out")
+            self._sock.settimeout(remaining)
+            chunk = self._sock.recv(max(4096, size - len(self._buffer)))
+            if not chunk:
+                raise ConnectionError("RCON connection closed by server")
+            self._received = True
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _recv_packet(self, deadline: float) -> Tuple[int, int, str]:
+        (length,) = struct.unpack("<i", self._recv_exact(4, deadline))
+        if length < 10:
+            raise RconError(f"Malformed RCON packet (length {length})")
+        data = self._recv_exact(length, deadline)
+        request_id, packet_type = struct.unpack("<ii", data[:8])
+        payload = data[8:-2].decode("utf-8", errors="replace")
+        return request_id, packet_type, payload
+
+    def _connect(self):
+        deadline = time.monotonic() + self.timeout
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffer = b""
+
+        auth_id = self._request_id()
+        self._send_packet(auth_id, SERVERDATA_AUTH, self.password)
+        while True:
+            request_id, packet_type, _ = self._recv_packet(deadline)
+            if packet_type == SERVERDATA_AUTH_RESPONSE:
+                break
+        if request_id == -1 or request_id != auth_id:
+            self._disconnect()
+            raise RconAuthError("RCON authentication failed")
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._buffer = b""
+
+    def _observe(self, command: str, started: float, ok: bool):
+        if self.observer is not None:
+            try:
+                self.observer(command, time.monotonic() - started, ok)
+            except Exception as e:
+                logger.debug(f"RCON observer failed: {e}")
+
+    def _execute(self, commands: List[str], started: float, timeout: float) -> List[str]:
+        deadline = time.monotonic() + timeout * len(commands)
+        ids = []
+        for command in commands:
+            request_id = self._request_id()
+            self._send_packet(request_id, SERVERDATA_EXECCOMMAND, command)
+            ids.append(request_id)
+
+        # Minecraft answers unknown packet types with a single reply carrying the
+        # same ID, which marks the end of any fragmented response before it.
+        sentinel = self._request_id()
+        self._send_packet(sentinel, SERVERDATA_RESPONSE_VALUE, "")
+
+        responses: Dict[int, List[str]] = {request_id: [] for request_id in ids}
+        completed = 0
+        while completed < len(ids):
+            request_id, _, payload = self._recv_packet(deadline)
+            # Responses arrive in order, so a later ID completes every earlier one
+            position = len(ids) if request_id == sentinel else (
+                ids.index(request_id) if request_id in responses else completed
+            )
+            while completed < position:
+                self._observe(commands[completed], started, True)
+                completed += 1
+            if request_id in responses:
+                responses[request_id].append(payload)
+        return ["".join(responses[request_id]) for request_id in ids]
+
+    def commands(self, commands: List[str], timeout: Optional[float] = None) -> List[str]:
+        """Pipeline several commands over the connection, returning raw outputs in order.
+
+        ``timeout`` overrides the client's per-command timeout for these commands only.
+        """
+        with self._lock:
+            started = time.monotonic()
+            for attempt in range(2):
+                reused = self._sock is not None
+                self._received = False
+                try:
+                    if not reused:
+                        self._connect()
+                    return self._execute(commands, started, self.timeout if timeout is None else timeout)
+                except (OSError, RconError) as e:
+                    self._disconnect()
+                    # A stale pooled socket (reset, or closed before answering anything) gets
+                    # one transparent reconnect. Nothing else is retried: after a timeout
+                    # the commands may already have run
+                    stale = isinstance(e, ConnectionError) and not self._received
+                    if reused and attempt == 0 and stale:
+                        continue
+                    for command in commands:
+                        self._observe(command, started, False)
+                    if isinstance(e, RconError):
+                        raise
+                    raise RconError(str(e) or type(e).__name__) from e
+            raise RconError("RCON request failed")
+
+    def command(self, command: str, timeout: Optional[float] = None) -> str:
+        """Execute a single command and return its raw output."""
+        return self.commands([command], timeout)[0]
+
+    def close(self):
+        """Close the underlying connection."""
+        with self._lock:
+            self._disconnect()
+
+
+_clients: Dict[Tuple[str, int, str], RconClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host: str, port: int, password: str, timeout: float = 5.0,
+               observer: Optional[Observer] = None) -> RconClient:
+    """Return the shared client for a target, creating it on first use."""
+    key = (host, int(port), password)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = RconClient(host, port, password, timeout=timeout, observer=observer)
+            _clients[key] = client
+        return client
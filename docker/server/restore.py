@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Minecraft Server Restore
+Restore all or part of the data directory from a backup.
+
+Restores either everything or only the given paths (relative to the data
+directory), e.g. a world, a dimension or a single region file:
+
+    restore.py minecraft-backup-20251219_120000.tar.gz
+    restore.py minecraft-backup-20251219_120000.tar.gz world
+    restore.py minecraft-backup-20251219_120000.tar.gz world/DIM-1
+    restore.py minecraft-backup-20251219_120000.tar.gz world/region/r.0.0.mca
+
+Only the paths being restored are backed up beforehand (with the same
+parallel, indexed format) and replaced.
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import subprocess
+from datetime import datetime
+from typing import Callable, List, Optional
+
+import archive
+import chunkstore
+import compression
+from chunkstore import ChunkStore
+
+DATA_DIR = os.getenv("DATA_DIR", "/data")
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/backups")
+RESTORE_THREADS = int(os.getenv("RESTORE_THREADS", "0"))  # 0 = all cores
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [RESTORE] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+logger = logging.getLogger(__name__)
+
+
+def find_backup(name: str) -> Optional[str]:
+    for path in (name, os.path.join(BACKUP_DIR, name)):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def list_entries(data_dir: str, select: Optional[Callable[[str], bool]]) -> List[str]:
+    """Top-most existing paths under data_dir that a restore would replace."""
+    if select is None:
+        return sorted(os.listdir(data_dir)) if os.path.isdir(data_dir) else []
+    entries = []
+    for root, dirs, files in os.walk(data_dir):
+        rel_root = os.path.relpath(root, data_dir)
+        rel_root = "" if rel_root == "." else rel_root
+        for name in list(dirs) + files:
+            rel = os.path.join(rel_root, name)
+            if select(rel):
+                entries.append(rel)
+                if name in dirs:
+                    dirs.remove(name)
+    return sorted(entries)
+
+
+def safety_backup(data_dir: str, entries: List[str], threads: int) -> Optional[str]:
+    """Archive the paths about to be replaced, in the regular indexed backup format."""
+    if not entries:
+        return None
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_file = os.path.join(BACKUP_DIR, f"pre-restore-{timestamp}.tar.gz")
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+
+    selected = archive.path_selector(entries)
+
+    def exclude(rel: str, is_dir: bool) -> bool:
+        # Keep the parents of selected paths so the tree can be walked down to them
+        return not selected(rel) and not (is_dir and any(e.startswith(f"{rel}/") for e in entries))
+
+    writer = compression.open_writer(backup_file, "gz", threads=threads)
+    with writer:
+        members = archive.write_tar(data_dir, writer, exclude)
+    archive.write_index(backup_file, "gz", members, writer.blocks)
+    stats = writer.stats()
+    logger.info(f"Current data backed up to: {backup_file} "
+                f"({stats['compressed_bytes'] / (1024 * 1024):.2f} MB in {stats['seconds']:.1f}s)")
+    return backup_file
+
+
+def clear(data_dir: str, entries: List[str]):
+    for rel in entries:
+        path = os.path.join(data_dir, rel)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Restore the data directory, or parts of it, from a backup."
+    )
+    parser.add_argument("backup", help="Backup file (path, or name inside BACKUP_DIR)")
+    parser.add_argument("paths", nargs="*", help="Paths relative to the data directory to restore")
+    parser.add_argument("--to", default=DATA_DIR, help=f"Destination (default: {DATA_DIR})")
+    parser.add_argument("--threads", type=int, default=RESTORE_THREADS, help="Worker threads (0 = all cores)")
+    parser.add_argument("--list", action="store_true", help="List archive members and exit")
+    parser.add_argument("--no-safety-backup", action="store_true", help="Skip backing up current data")
+    parser.add_argument("-y", "--yes", action="store_true", help="Do not ask for confirmation")
+    args = parser.parse_args()
+
+    backup_file = find_backup(args.backup)
+    if not backup_file:
+        logger.error(f"Backup file not found: {args.backup}")
+        sys.exit(1)
+
+    select = archive.path_selector(args.paths) if args.paths else None
+    is_manifest = backup_file.endswith(chunkstore.MANIFEST_EXT)
+
+    if args.list:
+        index = None if is_manifest else archive.load_index(backup_file)
+        if is_manifest:
+            names = sorted(chunkstore.load_manifest(backup_file)["files"])
+        elif index:
+            names = [archive.member_path(m[0]) for m in index["members"]]
+        else:
+            logger.error("No index for this archive; use tar -t to list it")
+            sys.exit(1)
+        for name in names:
+            if name and (select is None or select(name)):
+                print(name)
+        return
+
+    logger.info(f"Backup file: {backup_file}")
+    logger.info(f"Data directory: {args.to}")
+    target = ", ".join(args.paths) if args.paths else "all data"
+    logger.warning(f"This will REPLACE {target} in {args.to}")
+    logger.warning("Make sure the server is STOPPED before restoring!")
+    if not args.yes:
+        reply = input("Continue? (yes/no): ")
+        if reply.strip().lower() != "yes":
+            logger.info("Restore cancelled")
+            return
+
+    threads = compression.resolve_threads(args.threads)
+    entries = list_entries(args.to, select)
+    safety_file = None
+    if not args.no_safety_backup:
+        logger.info("Creating safety backup of current data...")
+        safety_file = safety_backup(args.to, entries, threads)
+
+    logger.info(f"Clearing {len(entries)} path(s)...")
+    clear(args.to, entries)
+
+    logger.info("Extracting backup...")
+    if is_manifest:
+        default_store = os.path.join(os.path.dirname(os.path.abspath(backup_file)), "store")
+        store = ChunkStore(os.getenv("BACKUP_STORE_DIR", default_store))
+        store.restore(chunkstore.load_manifest(backup_file), args.to, select)
+    else:
+        stats = archive.Extractor(backup_file, args.to, select, threads).run()
+        logger.info(f"Extracted {stats['files']} files ({stats['bytes'] / (1024 * 1024):.2f} MB) "
+                    f"in {stats['seconds']:.1f}s")
+
+    logger.info("Fixing permissions...")
+    subprocess.run(["chown", "-R", "minecraft:minecraft", args.to], capture_output=True)
+
+    logger.info("Restore complete!")
+    logger.info("")
+    logger.info("Next steps:")
+    logger.info("  1. Start the server")
+    logger.info("  2. Verify worlds loaded correctly")
+    logger.info("  3. Check player data")
+    if safety_file:
+        logger.info("")
+        logger.info(f"If restore failed, original data is at: {safety_file}")
+
+
+if __name__ == "__main__":
+    main()
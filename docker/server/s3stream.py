@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup S3 Streaming
+S3 multipart uploads that run while the archive is still being written.
+
+Compressed output is cut into parts as it is produced. Each part is spooled
+to a small temporary file and uploaded concurrently with ``aws s3api
+upload-part``, so at most a few parts ever sit on local disk. Failed parts are
+retried with exponential backoff. Upload progress (upload ID and completed
+part ETags) is persisted to a state file, so an interrupted upload of a
+locally kept archive can be resumed later without re-sending finished parts.
+Works with any S3-compatible endpoint through ``S3_ENDPOINT``.
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# S3 requires every part but the last to be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+STATE_SUFFIX = ".s3-upload.json"
+PART_PREFIX = "part-"
+
+
+class S3Error(Exception):
+    """Raised when an S3 API call fails."""
+
+
+class S3Client:
+    """Thin wrapper over the aws CLI's s3api commands."""
+
+    def __init__(self, bucket: str, endpoint: str = "", timeout: float = 900):
+        self.bucket = bucket
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def _run(self, *args: str) -> Dict[str, Any]:
+        cmd = ["aws", "s3api", *args, "--bucket", self.bucket, "--output", "json"]
+        if self.endpoint:
+            cmd.extend(["--endpoint-url", self.endpoint])
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise S3Error(f"aws s3api {args[0]} timed out")
+        if result.returncode != 0:
+            raise S3Error(f"aws s3api {args[0]} failed: {result.stderr.strip()}")
+        return json.loads(result.stdout) if result.stdout.strip() else {}
+
+    def create_multipart_upload(self, key: str) -> str:
+        return self._run("create-multipart-upload", "--key", key)["UploadId"]
+
+    def upload_part(self, key: str, upload_id: str, number: int, path: str) -> str:
+        response = self._run(
+            "upload-part", "--key", key, "--upload-id", upload_id,
+            "--part-number", str(number), "--body", path
+        )
+        return response["ETag"]
+
+    def list_parts(self, key: str, upload_id: str) -> Dict[int, str]:
+        response = self._run("list-parts", "--key", key, "--upload-id", upload_id)
+        return {part["PartNumber"]: part["ETag"] for part in response.get("Parts", [])}
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: Dict[int, str]):
+        layout = {"Parts": [{"PartNumber": n, "ETag": parts[n]} for n in sorted(parts)]}
+        self._run(
+            "complete-multipart-upload", "--key", key, "--upload-id", upload_id,
+            "--multipart-upload", json.dumps(layout)
+        )
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        self._run("abort-multipart-upload", "--key", key, "--upload-id", upload_id)
+
+
+class MultipartUpload:
+    """Concurrent, retrying, resumable multipart upload of numbered parts."""
+
+    def __init__(self, client: S3Client, key: str, state_file: str, spool_dir: str,
+                 concurrency: int = 4, retries: int = 5):
+        self.client = client
+        self.key = key
+        self.state_file = state_file
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        self.retries = retries
+        self.upload_id: Optional[str] = None
+        self.parts: Dict[int, str] = {}
+        self.part_size = 0
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-part")
+        self.pending: List[Tuple[Future, str]] = []  # (future, spooled part) per queued part
+        # Caps how many spooled parts can wait on disk at once
+        self.slots = threading.BoundedSemaphore(concurrency * 2)
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+
+    def start(self, part_size: int):
+        self.part_size = part_size
+        self.upload_id = self.client.create_multipart_upload(self.key)
+        self._save_state()
+
+    def resume(self, state: Dict[str, Any]):
+        if not state.get("upload_id"):
+            # The streaming attempt never got as far as creating the upload
+            self.start(state["part_size"])
+            return
+        self.upload_id = state["upload_id"]
+        self.part_size = state["part_size"]
+        # Trust the server's view of finished parts over the state file
+        self.parts = self.client.list_parts(self.key, self.upload_id)
+
+    def _save_state(self):
+        state = {
+            "bucket": self.client.bucket,
+            "key": self.key,
+            "upload_id": self.upload_id,
+            "part_size": self.part_size,
+            "parts": {str(n): etag for n, etag in self.parts.items()},
+        }
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_file)
+
+    def _upload(self, number: int, path: str, size: int):
+        try:
+            for attempt in range(self.retries):
+                try:
+                    etag = self.client.upload_part(self.key, self.upload_id, number, path)
+                    with self.lock:
+                        self.parts[number] = etag
+                        self.bytes_sent += size
+                        self._save_state()
+                    return
+                except S3Error as e:
+                    if attempt == self.retries - 1:
+                        raise
+                    delay = 2 ** attempt
+                    logger.warning(f"S3 part {number} failed ({e}), retrying in {delay}s")
+                    time.sleep(delay)
+        finally:
+            os.remove(path)
+            self.slots.release()
+
+    def submit(self, number: int, data: bytes):
+        """Spool a part to disk and queue it for upload."""
+        if number in self.parts:
+            return
+        if number > MAX_PARTS:
+            raise S3Error(f"Upload exceeds {MAX_PARTS} parts; increase the part size")
+        self.slots.acquire()
+        try:
+            fd, path = tempfile.mkstemp(prefix=PART_PREFIX, dir=self.spool_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except BaseException:
+            self.slots.release()
+            raise
+        self.pending.append((self.executor.submit(self._upload, number, path, len(data)), path))
+        self._raise_failures()
+
+    def _raise_failures(self):
+        for item in [item for item in self.pending if item[0].done()]:
+            self.pending.remove(item)
+            item[0].result()
+
+    def finish(self):
+        """Wait for all parts and complete the upload."""
+        try:
+            for future, _ in self.pending:
+                future.result()
+            self.pending = []
+            self.client.complete_multipart_upload(self.key, self.upload_id, self.parts)
+            if os.path.exists(self.state_file):
+                os.remove(self.state_file)
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def abort(self, resumable: bool = False):
+        """Stop uploading; keep the upload and its state if a local copy can resume it."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        # Cancelled parts never ran, so nothing else removes their spool files
+        for future, path in self.pending:
+            if future.cancelled():
+                remove_part(path)
+        self.pending = []
+        if resumable:
+            self._save_state()
+            return
+        try:
+            if self.upload_id:
+                self.client.abort_multipart_upload(self.key, self.upload_id)
+        except S3Error as e:
+            logger.warning(f"Could not abort S3 upload: {e}")
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+
+class S3StreamWriter:
+    """File-like sink that uploads whatever is written to it as it arrives."""
+
+    def __init__(self, upload: MultipartUpload, part_size: int):
+        self.upload = upload
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.buffer = bytearray()
+        self.number = 0
+        self.closed = False
+        self.upload.start(self.part_size)
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= self.part_size:
+            self.number += 1
+            self.upload.submit(self.number, bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.buffer or self.number == 0:
+            self.number += 1
+            self.upload.submit(self.number, bytes(self.buffer))
+            self.buffer = bytearray()
+        self.upload.finish()
+
+
+class TeeWriter:
+    """Write to a local file and a remote stream; a remote failure never fails the local copy.
+
+    ``close()`` only closes the local file. The remote upload is completed by
+    ``finish()`` once the archive is known to be whole, or dropped by
+    ``discard()`` if writing it failed.
+    """
+
+    def __init__(self, local: Optional[BinaryIO], upload: MultipartUpload, part_size: int):
+        self.local = local
+        self.upload = upload
+        self.remote: Optional[S3StreamWriter] = None
+        self.error: Optional[Exception] = None
+        try:
+            self.remote = S3StreamWriter(upload, part_size)
+        except S3Error as e:
+            self._fail(e)
+
+    @property
+    def uploaded(self) -> bool:
+        return self.remote is not None and self.remote.closed and self.error is None
+
+    def write(self, data: bytes) -> int:
+        if self.local is not None:
+            self.local.write(data)
+        if self.remote is not None:
+            try:
+                self.remote.write(data)
+            except Exception as e:
+                self._fail(e)
+        return len(data)
+
+    def _fail(self, error: Exception):
+        logger.error(f"S3 streaming upload failed: {error}")
+        self.error = error
+        self.remote = None
+        self.upload.abort(resumable=self.local is not None)
+        # Without a local copy there is nothing left to write to
+        if self.local is None:
+            raise error
+
+    def flush(self):
+        if self.local is not None:
+            self.local.flush()
+
+    def close(self):
+        if self.local is not None:
+            self.local.close()
+
+    def finish(self):
+        """Upload the final part and complete the multipart upload."""
+        if self.remote is not None:
+            try:
+                self.remote.close()
+            except Exception as e:
+                self._fail(e)
+
+    def discard(self):
+        """Give up on the remote upload entirely (the archive itself failed)."""
+        self.remote = None
+        self.upload.abort()
+
+
+def remove_part(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def clear_spool(spool_dir: str) -> int:
+    """Delete parts left in the spool directory by uploads that were cut off; return how many."""
+    removed = 0
+    for name in os.listdir(spool_dir) if os.path.isdir(spool_dir) else []:
+        if name.startswith(PART_PREFIX):
+            remove_part(os.path.join(spool_dir, name))
+            removed += 1
+    return removed
+
+
+def state_file_for(path: str) -> str:
+    return f"{path}{STATE_SUFFIX}"
+
+
+def upload_file(client: S3Client, path: str, key: str, part_size: int, spool_dir: str,
+                concurrency: int = 4, retries: int = 5,
+                on_read: Optional[Callable[[int], None]] = None) -> bool:
+    """Upload (or resume uploading) a local file as a multipart upload.
+
+    ``on_read`` is called with the size of each part before it is sent,
+    e.g. to pace the upload.
+    """
+    state_file = state_file_for(path)
+    upload = MultipartUpload(client, key, state_file, spool_dir, concurrency, retries)
+    try:
+        if os.path.exists(state_file):
+            with open(state_file) as f:
+                state = json.load(f)
+            upload.resume(state)
+            logger.info(f"Resuming S3 upload of {os.path.basename(path)} "
+                        f"({len(upload.parts)} parts already uploaded)")
+        else:
+            size = os.path.getsize(path)
+            upload.start(max(part_size, MIN_PART_SIZE, -(-size // MAX_PARTS)))
+
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            # An empty file still needs one (empty) part
+            for number in range(1, max(1, -(-size // upload.part_size)) + 1):
+                if number in upload.parts:
+                    continue
+                f.seek((number - 1) * upload.part_size)
+                data = f.read(upload.part_size)
+                if on_read:
+                    on_read(len(data))
+                upload.submit(number, data)
+        upload.finish()
+        return True
+    except (S3Error, OSError) as e:
+        logger.error(f"S3 upload of {os.path.basename(path)} failed: {e}")
+        upload.abort(resumable=True)
+        return False
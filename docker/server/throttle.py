@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup Throttling
+Keep backups from costing players TPS.
+
+A backup reads the whole data directory and compresses it on every core, in
+competition with the server for disk bandwidth and CPU. The backup process
+runs at a lower CPU and I/O priority, and everything it reads passes through
+a rate limiter: a fixed ceiling if one is configured, and an adaptive one
+driven by the server's TPS. While TPS stays below the warning threshold the
+allowed rate is halved on every poll (down to a floor); once TPS recovers it
+climbs back in steps until the backup runs at full speed again.
+"""
+
+import os
+import time
+import ctypes
+import logging
+import platform
+import threading
+from typing import BinaryIO, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# I/O scheduling class and level for each BACKUP_IONICE value (linux/ioprio.h)
+IONICE_CLASSES = {"realtime": (1, 4), "best-effort": (2, 7), "idle": (3, 0)}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+# ioprio_set has no libc wrapper, so it is called by syscall number
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "aarch64": 30}
+MIN_FACTOR = 1 / 32
+RECOVERY_STEP = 0.125
+BURST_SECONDS = 0.25
+# Rate to back off from when there is no configured limit and nothing measured yet
+FALLBACK_RATE = 8 * 1024 * 1024
+
+
+def parse_tps(output: str) -> Optional[float]:
+    """Parse the 1m value from Paper's "TPS from last 1m, 5m, 15m: 20.0, 20.0, 20.0"."""
+    if ":" not in output:
+        return None
+    try:
+        return float(output.split(":", 1)[1].split(",")[0].strip().lstrip("*"))
+    except ValueError:
+        return None
+
+
+def lower_priority(nice: int, ionice_class: str):
+    """Lower the CPU and I/O priority of every thread in this process.
+
+    Threads (and child processes such as zstd) started afterwards inherit it.
+    """
+    tids = [int(tid) for tid in os.listdir("/proc/self/task")] if os.path.isdir("/proc/self/task") else [0]
+    if nice > 0:
+        for tid in tids:
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, min(os.getpriority(os.PRIO_PROCESS, tid) + nice, 19))
+            except OSError as e:
+                logger.warning(f"Could not lower CPU priority: {e}")
+                break
+    if ionice_class in IONICE_CLASSES:
+        syscall = IOPRIO_SET_SYSCALLS.get(platform.machine())
+        if syscall is None:
+            logger.warning(f"Could not lower I/O priority: ioprio_set unknown on {platform.machine()}")
+            return
+        io_class, level = IONICE_CLASSES[ionice_class]
+        libc = ctypes.CDLL(None, use_errno=True)
+        for tid in tids:
+            if libc.syscall(syscall, IOPRIO_WHO_PROCESS, tid, io_class << IOPRIO_CLASS_SHIFT | level) < 0:
+                logger.warning(f"Could not lower I/O priority: {os.strerror(ctypes.get_errno())}")
+                break
+
+
+class Throttle:
+    """Token-bucket rate limiter whose rate follows the server's TPS."""
+
+    def __init__(self, rate_limit: float = 0, tps_threshold: float = 0,
+                 tps_source: Optional[Callable[[], Optional[float]]] = None, poll_interval: float = 5.0):
+        self.rate_limit = rate_limit  # Bytes per second, 0 = unlimited
+        self.tps_threshold = tps_threshold
+        self.tps_source = tps_source
+        self.poll_interval = poll_interval
+
+        self.factor = 1.0
+        self.base_rate: Optional[float] = None
+        self.observed = 0.0
+        self.bytes = 0
+        self.next_free = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, float] = {}
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Current allowed rate in bytes per second, or None when unthrottled."""
+        if self.factor >= 1.0:
+            return self.rate_limit or None
+        return (self.rate_limit or self.base_rate or FALLBACK_RATE) * self.factor
+
+    def consume(self, size: int):
+        """Account for size bytes of I/O, sleeping as long as the current rate demands."""
+        with self.lock:
+            self.bytes += size
+            rate = self.rate
+            if rate is None:
+                return
+            now = time.monotonic()
+            # Allow a short burst so small writes are not each followed by a tiny sleep
+            self.next_free = max(self.next_free, now - BURST_SECONDS) + size / rate
+            delay = self.next_free - now
+        if delay > 0:
+            time.sleep(delay)
+            with self.lock:
+                self.stats["sleep_seconds"] += delay
+
+    def wrap(self, output: BinaryIO) -> "ThrottledWriter":
+        return ThrottledWriter(output, self)
+
+    def _poll(self):
+        last_bytes, last_time = 0, time.monotonic()
+        while not self.stop_event.wait(self.poll_interval):
+            now = time.monotonic()
+            with self.lock:
+                self.observed = (self.bytes - last_bytes) / max(now - last_time, 1e-6)
+                last_bytes, last_time = self.bytes, now
+
+            tps = self.tps_source()
+            if tps is None or tps <= 0:
+                continue
+            with self.lock:
+                self.stats["min_tps"] = min(self.stats["min_tps"], tps)
+                if tps < self.tps_threshold:
+                    if self.factor >= 1.0:
+                        # Back off from what the backup is actually doing, not from "unlimited"
+                        self.base_rate = self.observed or FALLBACK_RATE
+                        self.stats["backoffs"] += 1
+                        logger.info(f"TPS {tps:.1f} below {self.tps_threshold:.1f}, throttling backup I/O")
+                    self.factor = max(self.factor / 2, MIN_FACTOR)
+                    self.stats["min_factor"] = min(self.stats["min_factor"], self.factor)
+                elif self.factor < 1.0:
+                    self.factor = min(self.factor + RECOVERY_STEP, 1.0)
+                    if self.factor >= 1.0:
+                        self.base_rate = None
+                        logger.info(f"TPS recovered to {tps:.1f}, backup I/O unthrottled")
+                if self.factor < 1.0:
+                    self.stats["throttled_seconds"] += self.poll_interval
+
+    def __enter__(self):
+        self.factor = 1.0
+        self.base_rate = None
+        self.bytes = 0
+        self.next_free = 0.0
+        self.stats = {"sleep_seconds": 0.0, "throttled_seconds": 0.0, "backoffs": 0,
+                      "min_tps": float("inf"), "min_factor": 1.0}
+        if self.tps_source and self.tps_threshold > 0:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._poll, name="throttle", daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.stats["min_tps"] == float("inf"):
+            self.stats["min_tps"] = None
+        self.stats["sleep_seconds"] = round(self.stats["sleep_seconds"], 3)
+
+    def summary(self) -> str:
+        """One-line description of how much throttling was applied."""
+        if not self.stats["sleep_seconds"] and not self.stats["backoffs"]:
+            return "no throttling applied"
+        text = f"slept {self.stats['sleep_seconds']:.1f}s"
+        if self.stats["backoffs"]:
+            text += (f", backed off {self.stats['backoffs']} time(s) for ~{self.stats['throttled_seconds']:.0f}s, "
+                     f"down to {self.stats['min_factor']:.0%} speed (lowest TPS {self.stats['min_tps']:.1f})")
+        return text
+
+
+class ThrottledWriter:
+    """Write-only file object that passes writes through a Throttle."""
+
+    def __init__(self, output: BinaryIO, throttle: Throttle):
+        self.output = output
+        self.throttle = throttle
+
+    def write(self, data: bytes) -> int:
+        self.throttle.consume(len(data))
+        return self.output.write(data)
+
+    def set_stored(self, stored: bool):
+        self.output.set_stored(stored)
+
+    def close(self):
+        self.output.close()
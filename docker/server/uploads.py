@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup Uploads
+Send finished backups to every remote destination concurrently.
+
+Each destination (S3, rclone) has its own worker thread and queue, so a
+slow or unreachable remote never holds up another one, nor the next backup.
+Failed uploads are retried with exponential backoff and resume where they
+stopped: S3 archives go up as multipart uploads whose progress is kept in a
+state file, rclone skips whatever already arrived. Bandwidth can be capped
+per destination and in total; the total is shared evenly between the
+destinations that have uploads waiting. There is no wall-clock timeout, only
+stall timeouts, so large archives are no longer killed halfway.
+"""
+
+import os
+import abc
+import time
+import queue
+import logging
+import threading
+import subprocess
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import chunkstore
+import s3stream
+from throttle import Throttle
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 3600
+# rclone/aws give up on a connection that moves no data for this long
+STALL_TIMEOUT = 300
+
+
+class UploadError(Exception):
+    """Raised when an upload attempt fails."""
+
+
+def run_command(cmd: List[str]):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise UploadError(f"{' '.join(cmd[:3])} failed: {result.stderr.strip()[-500:]}")
+
+
+class Destination(abc.ABC):
+    """A remote that backups are copied to."""
+
+    name = ""
+
+    def __init__(self, rate_limit: float = 0, store_dir: str = ""):
+        self.rate_limit = rate_limit  # Bytes per second, 0 = unlimited
+        self.store_dir = store_dir
+
+    @abc.abstractmethod
+    def location(self, backup_file: str) -> str:
+        """Where the backup ends up, for the upload status."""
+
+    @abc.abstractmethod
+    def upload(self, backup_file: str, rate_limit: float):
+        """Copy one backup (and, for manifests, its new blobs); raise UploadError on failure."""
+
+
+class S3Destination(Destination):
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str, endpoint: str, part_size: int, spool_dir: str,
+                 concurrency: int = 4, timeout: float = 300, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint = endpoint
+        self.part_size = part_size
+        self.spool_dir = spool_dir
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def key(self, backup_file: str) -> str:
+        return f"{self.prefix}/{os.path.basename(backup_file)}"
+
+    def location(self, backup_file: str) -> str:
+        return f"s3://{self.bucket}/{self.key(backup_file)}"
+
+    def _aws(self, *args: str) -> List[str]:
+        cmd = ["aws", "s3", *args, "--cli-read-timeout", str(STALL_TIMEOUT)]
+        if self.endpoint:
+            cmd.extend(["--endpoint-url", self.endpoint])
+        return cmd
+
+    def upload(self, backup_file: str, rate_limit: float):
+        if backup_file.endswith(chunkstore.MANIFEST_EXT):
+            # Manifests need their blobs first; sync only sends new ones. aws s3 has no rate limit flag
+            run_command(self._aws("sync", self.store_dir, f"s3://{self.bucket}/{self.prefix}/store"))
+            run_command(self._aws("cp", backup_file, self.location(backup_file)))
+            return
+
+        client = s3stream.S3Client(self.bucket, self.endpoint, timeout=self.timeout)
+        with Throttle(rate_limit) as pace:
+            if not s3stream.upload_file(client, backup_file, self.key(backup_file), self.part_size,
+                                        self.spool_dir, self.concurrency, on_read=pace.consume):
+                raise UploadError("multipart upload failed (progress kept for the next attempt)")
+
+
+class RcloneDestination(Destination):
+    name = "rclone"
+
+    def __init__(self, remote: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.remote = remote.rstrip("/")
+
+    def location(self, backup_file: str) -> str:
+        return f"{self.remote}/{os.path.basename(backup_file)}"
+
+    def _rclone(self, source: str, dest: str, rate_limit: float) -> List[str]:
+        cmd = ["rclone", "copy", source, dest, "--timeout", f"{STALL_TIMEOUT}s", "--retries", "1"]
+        if rate_limit:
+            cmd.extend(["--bwlimit", f"{max(int(rate_limit / 1024), 1)}k"])
+        return cmd
+
+    def upload(self, backup_file: str, rate_limit: float):
+        if backup_file.endswith(chunkstore.MANIFEST_EXT):
+            # copy skips blobs that are already there
+            run_command(self._rclone(self.store_dir, f"{self.remote}/store", rate_limit))
+        run_command(self._rclone(backup_file, self.remote, rate_limit))
+
+
+class UploadManager:
+    """Per-destination upload queues with retries, backoff and shared bandwidth."""
+
+    def __init__(self, destinations: List[Destination], total_limit: float = 0, retries: int = 5,
+                 backoff: float = 30,
+                 on_result: Optional[Callable[[str, Destination, Dict[str, Any]], None]] = None):
+        self.destinations = destinations
+        self.total_limit = total_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.on_result = on_result
+        self.queues: Dict[str, "queue.Queue[str]"] = {d.name: queue.Queue() for d in destinations}
+        self.pending: Dict[str, Set[str]] = {d.name: set() for d in destinations}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def start(self):
+        for destination in self.destinations:
+            thread = threading.Thread(target=self._worker, args=(destination,),
+                                      name=f"upload-{destination.name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def submit(self, backup_file: str, destinations: Optional[List[str]] = None):
+        """Queue a backup for all (or the named) destinations and return immediately."""
+        for destination in self.destinations:
+            if destinations is not None and destination.name not in destinations:
+                continue
+            with self.lock:
+                if backup_file in self.pending[destination.name]:
+                    continue
+                self.pending[destination.name].add(backup_file)
+            self.queues[destination.name].put(backup_file)
+
+    def busy(self) -> Set[str]:
+        """Names of backups that are queued or uploading somewhere."""
+        with self.lock:
+            return {os.path.basename(f) for files in self.pending.values() for f in files}
+
+    def _rate_limit(self, destination: Destination) -> float:
+        # Share the total between destinations that have work, not just those mid-attempt,
+        # so uploads of the same backup split it evenly from the start
+        with self.lock:
+            sharing = max(sum(1 for files in self.pending.values() if files), 1)
+        limits = [limit for limit in (destination.rate_limit, self.total_limit / sharing) if limit]
+        return min(limits) if limits else 0
+
+    def _worker(self, destination: Destination):
+        while not self.stop_event.is_set():
+            try:
+                backup_file = self.queues[destination.name].get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                result = self._upload(destination, backup_file)
+                if self.on_result and result is not None:
+                    self.on_result(backup_file, destination, result)
+            except Exception as e:
+                # Keep the worker alive for the next backup
+                logger.error(f"Upload of {os.path.basename(backup_file)} to {destination.name} crashed: {e}")
+            finally:
+                with self.lock:
+                    self.pending[destination.name].discard(backup_file)
+
+    def _upload(self, destination: Destination, backup_file: str) -> Optional[Dict[str, Any]]:
+        name = os.path.basename(backup_file)
+        started = time.monotonic()
+        error = ""
+        attempt = 0
+        for attempt in range(1, self.retries + 2):
+            if not os.path.exists(backup_file):
+                error = "local copy no longer exists"
+                break
+            rate_limit = self._rate_limit(destination)
+            limit_text = f" at up to {rate_limit / (1024 * 1024):.1f} MB/s" if rate_limit else ""
+            logger.info(f"Uploading {name} to {destination.name} (attempt {attempt}){limit_text}")
+            try:
+                destination.upload(backup_file, rate_limit)
+                error = ""
+                break
+            except (UploadError, OSError) as e:
+                error = str(e)
+
+            if attempt > self.retries:
+                break
+            delay = min(self.backoff * 2 ** (attempt - 1), MAX_BACKOFF)
+            logger.warning(f"Upload of {name} to {destination.name} failed: {error}; retrying in {delay:.0f}s")
+            if self.stop_event.wait(delay):
+                return None
+
+        seconds = time.monotonic() - started
+        size = os.path.getsize(backup_file) if os.path.exists(backup_file) else 0
+        if error:
+            logger.error(f"Upload of {name} to {destination.name} failed after {attempt} attempt(s): {error}")
+        else:
+            logger.info(f"Uploaded {name} to {destination.name} in {seconds:.1f}s "
+                        f"({size / (1024 * 1024) / max(seconds, 0.001):.2f} MB/s)")
+        return {
+            "ok": not error,
+            "attempts": attempt,
+            "seconds": round(seconds, 3),
+            "bytes": size,
+            "error": error or None,
+            "location": destination.location(backup_file),
+            "timestamp": time.time(),
+        }
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Minecraft Backup Verification
+Check that backup archives are complete and readable, locally and remotely.
+
+A backup is verified against the checksums recorded in its index: the
+SHA-256 and size of the compressed archive catch truncation and bit rot,
+every member is decompressed and hashed against the per-file checksum taken
+while the backup was written, and region files must have a header whose
+chunk entries point at well-formed chunk records. Only the archive is read,
+never the data directory. Local archives with a block index are verified on
+all cores; remote copies are streamed through once with bounded memory.
+
+Usage:
+    verify.py <backup> [--remote]   Verify one backup (path or name in BACKUP_DIR)
+    verify.py --all [--remote]      Verify every backup in the catalog
+"""
+
+import os
+import sys
+import zlib
+import lzma
+import time
+import struct
+import tarfile
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import archive
+import compression
+from catalog import BackupCatalog
+from chunkstore import HEADER_SIZE, MANIFEST_EXT, REGION_SUFFIXES, SECTOR_SIZE, parse_region_header
+
+logger = logging.getLogger(__name__)
+
+# What a damaged archive can raise while being decompressed and parsed
+READ_ERRORS = (tarfile.TarError, OSError, EOFError, RuntimeError, ValueError, zlib.error, lzma.LZMAError)
+READ_SIZE = 1024 * 1024  # Multiple of SECTOR_SIZE, so chunk records never straddle reads
+COMPRESSION_TYPES = {1, 2, 3, 4, 127}
+
+
+def scan_member(f: BinaryIO, size: int, region: bool) -> Tuple[str, Optional[str]]:
+    """Hash a member's data and, for region files, check its chunk table.
+
+    Returns the SHA-256 and an error message (or None).
+    """
+    reader = archive.HashingReader(f)
+    error = None
+    chunks: Dict[int, int] = {}
+    position = 0
+
+    while True:
+        data = reader.read(READ_SIZE)
+        if not data:
+            break
+        if region and error is None:
+            if position == 0:
+                if len(data) < HEADER_SIZE:
+                    error = "region header is truncated"
+                else:
+                    for index, offset, count, _ in parse_region_header(data[:HEADER_SIZE]):
+                        if offset < 2 or (offset + count) * SECTOR_SIZE > size:
+                            error = f"chunk {index} points outside the file"
+                            break
+                        chunks[offset * SECTOR_SIZE] = count
+            for start in range(position, position + len(data), SECTOR_SIZE):
+                count = chunks.get(start)
+                if count is None or error:
+                    continue
+                record = data[start - position:start - position + 5]
+                if len(record) < 5:
+                    error = f"chunk record at sector {start // SECTOR_SIZE} is truncated"
+                    continue
+                length, kind = struct.unpack(">IB", record)
+                if length == 0 or 4 + length > count * SECTOR_SIZE or (kind & 0x7F) not in COMPRESSION_TYPES:
+                    error = f"malformed chunk record at sector {start // SECTOR_SIZE}"
+        position += len(data)
+
+    if position != size:
+        error = f"expected {size} bytes, read {position}"
+    return reader.hash.hexdigest(), error
+
+
+class Verifier:
+    """Verify one archive against its index."""
+
+    def __init__(self, index: Optional[Dict[str, Any]], method: Optional[str],
+                 checksum: Optional[str] = None, threads: int = 0):
+        self.index = index
+        self.method = method
+        self.checksum = (index or {}).get("checksum") or checksum
+        self.threads = compression.resolve_threads(threads)
+        self.members = {m[1]: m for m in index["members"]} if index else {}
+        self.errors: List[str] = []
+        self.stats = {"files": 0, "bytes": 0, "regions": 0}
+        self.lock = threading.Lock()
+
+    def _check(self, tar: tarfile.TarFile, tarinfo: tarfile.TarInfo, base: int) -> List[str]:
+        errors = []
+        with self.lock:
+            expected = self.members.pop(base + tarinfo.offset, None)
+        if self.index and (expected is None or expected[0] != tarinfo.name):
+            errors.append(f"{tarinfo.name}: not in the index at this position")
+        if not tarinfo.isreg():
+            return errors
+
+        region = tarinfo.name.endswith(REGION_SUFFIXES) and tarinfo.size > 0
+        digest, error = scan_member(tar.extractfile(tarinfo), tarinfo.size, region)
+        if error:
+            errors.append(f"{tarinfo.name}: {error}")
+        if expected is not None and expected[4] and expected[4] != digest:
+            errors.append(f"{tarinfo.name}: checksum mismatch")
+        with self.lock:
+            self.stats["files"] += 1
+            self.stats["bytes"] += tarinfo.size
+            self.stats["regions"] += region
+        return errors
+
+    def _walk(self, stream: BinaryIO, count: Optional[int] = None, base: int = 0) -> List[str]:
+        errors = []
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            while count is None or count > 0:
+                tarinfo = tar.next()
+                if tarinfo is None:
+                    break
+                errors.extend(self._check(tar, tarinfo, base))
+                if count is not None:
+                    count -= 1
+        return errors
+
+    def _run(self, path: str, start: int, count: int) -> List[str]:
+        reader = archive.BlockReader(path, self.method, self.index["blocks"], start)
+        try:
+            return self._walk(reader, count, start)
+        except READ_ERRORS as e:
+            return [f"unreadable data at offset {start}: {e}"]
+        finally:
+            reader.close()
+
+    def _hash_file(self, path: str) -> List[str]:
+        with open(path, "rb") as f:
+            reader = archive.HashingReader(f)
+            for _ in iter(lambda: reader.read(READ_SIZE), b""):
+                pass
+        return self._compare_archive(reader)
+
+    def _compare_archive(self, reader: archive.HashingReader) -> List[str]:
+        errors = []
+        size = (self.index or {}).get("size")
+        if size is not None and reader.bytes != size:
+            errors.append(f"archive is {reader.bytes} bytes, expected {size} (truncated?)")
+        if self.checksum and self.checksum != f"sha256:{reader.hash.hexdigest()}":
+            errors.append("archive checksum mismatch")
+        return errors
+
+    def _finish(self, started: float) -> Dict[str, Any]:
+        if self.members:
+            self.errors.append(f"{len(self.members)} indexed member(s) missing from the archive")
+        return {
+            "ok": not self.errors,
+            "errors": self.errors,
+            "seconds": round(time.monotonic() - started, 3),
+            **self.stats,
+        }
+
+    def verify_file(self, path: str) -> Dict[str, Any]:
+        """Verify a local archive, in parallel when it has a block index."""
+        started = time.monotonic()
+        if not (self.index and self.index.get("blocks") and self.method in archive.DECOMPRESSORS):
+            with open(path, "rb") as raw:
+                return self.verify_stream(raw, started)
+
+        members = self.index["members"]
+        runs = archive.plan_runs(members, [True] * len(members), self.threads)
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="verify") as executor:
+            futures = [executor.submit(self._hash_file, path)]
+            futures += [executor.submit(self._run, path, *run) for run in runs]
+            for future in futures:
+                self.errors.extend(future.result())
+        return self._finish(started)
+
+    def verify_stream(self, raw: BinaryIO, started: Optional[float] = None) -> Dict[str, Any]:
+        """Verify an archive read once from a stream (a local file or a download)."""
+        started = started or time.monotonic()
+        reader = archive.HashingReader(raw)
+        try:
+            stream, finish = archive.open_stream(reader, self.method)
+            self.errors.extend(self._walk(stream))
+            # Hash whatever trails the tar end-of-archive marker too
+            for _ in iter(lambda: stream.read(READ_SIZE), b""):
+                pass
+            finish()
+            for _ in iter(lambda: reader.read(READ_SIZE), b""):
+                pass
+        except READ_ERRORS as e:
+            self.errors.append(f"archive is unreadable: {e}")
+        else:
+            self.errors.extend(self._compare_archive(reader))
+        return self._finish(started)
+
+
+def remote_command(location: str) -> List[str]:
+    """Command that writes a remote copy to stdout."""
+    if location.startswith("s3://"):
+        cmd = ["aws", "s3", "cp", location, "-"]
+        if os.getenv("S3_ENDPOINT"):
+            cmd.extend(["--endpoint-url", os.getenv("S3_ENDPOINT")])
+        return cmd
+    return ["rclone", "cat", location]
+
+
+def verify_remote(location: str, index: Optional[Dict[str, Any]], method: Optional[str],
+                  checksum: Optional[str]) -> Dict[str, Any]:
+    process = subprocess.Popen(remote_command(location), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    result = Verifier(index, method, checksum).verify_stream(process.stdout)
+    process.stdout.close()
+    stderr = process.stderr.read().decode("utf-8", errors="replace").strip()
+    # A broken archive stops the read early, which the download then reports as a broken pipe
+    if process.wait() != 0 and result["ok"]:
+        result["ok"] = False
+        result["errors"].append(f"download failed: {stderr}")
+    return result
+
+
+def verify_backup(backup_file: str, entry: Optional[Dict[str, Any]] = None, remote: bool = False,
+                  threads: int = 0) -> Dict[str, Dict[str, Any]]:
+    """Verify the local copy and optionally the remote copies; return results by destination."""
+    index = archive.load_index(backup_file)
+    method = archive.archive_method(backup_file)
+    checksum = entry.get("checksum") if entry else None
+    results: Dict[str, Dict[str, Any]] = {}
+
+    if os.path.exists(backup_file):
+        results["local"] = Verifier(index, method, checksum, threads).verify_file(backup_file)
+    if remote and entry:
+        for destination in ("s3", "rclone"):
+            location = entry["destinations"].get(destination)
+            if location:
+                results[destination] = verify_remote(location, index, method, checksum)
+    return results
+
+
+def log_results(name: str, results: Dict[str, Dict[str, Any]]) -> bool:
+    ok = True
+    for destination, result in results.items():
+        if result["ok"]:
+            logger.info(f"{name} ({destination}): OK, {result['files']} files, "
+                        f"{result['regions']} region files in {result['seconds']:.1f}s")
+            continue
+        ok = False
+        logger.error(f"{name} ({destination}): FAILED")
+        for error in result["errors"][:20]:
+            logger.error(f"  {error}")
+        if len(result["errors"]) > 20:
+            logger.error(f"  ... and {len(result['errors']) - 20} more")
+    return ok
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [BACKUP] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    backup_dir = os.getenv("BACKUP_DIR", "/backups")
+
+    parser = argparse.ArgumentParser(description="Verify backup archives.")
+    parser.add_argument("backup", nargs="?", help="Backup file (path, or name inside BACKUP_DIR)")
+    parser.add_argument("--all", action="store_true", help="Verify every backup in the catalog")
+    parser.add_argument("--remote", action="store_true", help="Also verify S3/rclone copies")
+    parser.add_argument("--threads", type=int, default=0, help="Worker threads (0 = all cores)")
+    args = parser.parse_args()
+    if not args.backup and not args.all:
+        parser.error("give a backup or --all")
+
+    catalog = BackupCatalog(os.getenv("BACKUP_CATALOG_FILE", os.path.join(backup_dir, "catalog.json")))
+    if args.all:
+        names = [name for name, _ in catalog.entries()]
+    else:
+        names = [os.path.basename(args.backup)]
+        if os.path.dirname(args.backup):
+            backup_dir = os.path.dirname(args.backup)
+
+    ok = True
+    for name in names:
+        if name.endswith(MANIFEST_EXT):
+            logger.info(f"{name}: incremental manifests are not verified")
+            continue
+        results = verify_backup(os.path.join(backup_dir, name), catalog.backups.get(name),
+                                args.remote, args.threads)
+        if not results:
+            logger.error(f"{name}: no copy to verify")
+            ok = False
+            continue
+        ok &= log_results(name, results)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
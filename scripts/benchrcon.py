@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+RCON Benchmarks
+Measures what the monitor and the backup system cost, by running their own
+code against mockrcon.py instead of a Paper server:
+
+    poll      monitor.get_server_status() in a loop: time and client CPU per poll
+    probe     One "list" over the persistent connection, over a new connection,
+              and against a frozen (paused) server
+    saveoff   backup.create_backup() on a generated world: how long auto-save
+              stays off, and how long the whole backup takes
+
+The mock runs as its own process, so the CPU figures are the client's alone.
+Its latency and faults are set with the same options as mockrcon.py, and
+backup settings can be changed with --backup-env (BACKUP_SNAPSHOT=false, ...).
+
+Usage:
+    benchrcon.py
+    benchrcon.py --only probe --latency 0.02 --jitter 0.01
+    benchrcon.py --only saveoff --save-delay 2 --world-mb 64 --backup-env BACKUP_SNAPSHOT=false
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import zlib
+import logging
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.join(SCRIPTS_DIR, "..", "docker", "server")
+sys.path.insert(0, SERVER_DIR)
+
+BENCHMARKS = ("poll", "probe", "saveoff")
+PASSWORD = "benchmark"
+STARTUP_TIMEOUT = 10.0  # Seconds to wait for the mock to listen
+
+logger = logging.getLogger("benchrcon")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile, in milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+
+def timings(samples: List[float]) -> Dict[str, Any]:
+    return {"count": len(samples), "p50_ms": percentile(samples, 0.50), "p99_ms": percentile(samples, 0.99)}
+
+
+def start_mock(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    """Run mockrcon.py with the fault options given to the benchmark."""
+    cmd = [
+        sys.executable, os.path.join(SCRIPTS_DIR, "mockrcon.py"), "--port", str(port), "--password", PASSWORD,
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--save-delay", str(args.save_delay),
+        "--timeout-rate", str(args.timeout_rate), "--auth-fail-rate", str(args.auth_fail_rate),
+        "--colour", args.colour,
+    ]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    process = subprocess.Popen(cmd, stderr=None if args.verbose else subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"mockrcon.py exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("mockrcon.py did not start listening")
+
+
+def region_file(size: int) -> bytes:
+    """A valid region file of about size bytes, its chunks part random, part empty space."""
+    locations, chunks = [], []
+    sector = 2  # After the location and timestamp tables
+    while (sector + 2) * 4096 <= size and len(locations) < 1024:
+        data = zlib.compress(os.urandom(2048) + bytes(6144))
+        record = struct.pack(">IB", len(data) + 1, 2) + data
+        count = -(-len(record) // 4096)
+        locations.append(struct.pack(">I", sector << 8 | count))
+        chunks.append(record.ljust(count * 4096, b"\0"))
+        sector += count
+    header = b"".join(locations).ljust(4096, b"\0") + struct.pack(">I", int(time.time())) * 1024
+    return header + b"".join(chunks)
+
+
+def generate_world(data_dir: str, size_mb: int):
+    """A world of size_mb one-megabyte region files."""
+    region_dir = os.path.join(data_dir, "world", "region")
+    os.makedirs(region_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "world", "level.dat"), "wb") as f:
+        f.write(os.urandom(4096))
+    for i in range(size_mb):
+        with open(os.path.join(region_dir, f"r.{i}.0.mca"), "wb") as f:
+            f.write(region_file(1024 * 1024))
+
+
+def bench_poll(monitor: Any, iterations: int) -> Dict[str, Any]:
+    samples = []
+    failures = 0
+    cpu_started = time.process_time()
+    for _ in range(iterations):
+        started = time.monotonic()
+        status = monitor.get_server_status()
+        samples.append(time.monotonic() - started)
+        if not status["online"]:
+            failures += 1
+    cpu = time.process_time() - cpu_started
+    return {**timings(samples), "cpu_ms_per_poll": round(cpu / iterations * 1000, 3), "failures": failures,
+            "parsed_tps": monitor.server_status["tps"]}
+
+
+def bench_probe(rcon: Any, port: int, mock: subprocess.Popen, iterations: int,
+                timeout: float) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+
+    persistent = rcon.RconClient("127.0.0.1", port, PASSWORD, timeout=timeout)
+    samples, failures = [], 0
+    for _ in range(iterations):
+        started = time.monotonic()
+        try:
+            persistent.command("list")
+            samples.append(time.monotonic() - started)
+        except rcon.RconError:
+            failures += 1
+    results["persistent"] = {**timings(samples), "failures": failures}
+
+    samples, failures = [], 0
+    for _ in range(iterations):
+        client = rcon.RconClient("127.0.0.1", port, PASSWORD, timeout=timeout)
+        started = time.monotonic()
+        try:
+            client.command("list")
+            samples.append(time.monotonic() - started)
+        except rcon.RconError:
+            failures += 1
+        client.close()
+    results["new_connection"] = {**timings(samples), "failures": failures}
+
+    # What a probe of a paused server costs before it gives up
+    mock.send_signal(signal.SIGUSR1)
+    time.sleep(0.1)
+    started = time.monotonic()
+    try:
+        persistent.command("list")
+        answered = True
+    except rcon.RconError:
+        answered = False
+    results["frozen"] = {"seconds": round(time.monotonic() - started, 3), "answered": answered,
+                         "client_timeout": timeout}
+    mock.send_signal(signal.SIGUSR2)
+    persistent.close()
+    return results
+
+
+def bench_saveoff(backup: Any, iterations: int) -> Dict[str, Any]:
+    windows, durations = [], []
+    failures = 0
+    for i in range(iterations):
+        if i:
+            # Backups are named by the second they start in
+            time.sleep(1.0 - time.time() % 1.0)
+        if backup.create_backup() is None:
+            failures += 1
+            continue
+        with open(backup.BACKUP_STATUS_FILE) as f:
+            status = json.load(f)
+        windows.append(status["save_off_seconds"])
+        durations.append(status["duration_seconds"])
+    return {
+        "save_off": timings(windows),
+        "backup": timings(durations),
+        "failures": failures,
+    }
+
+
+def run(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    port = free_port()
+    data_dir = os.path.join(workdir, "data")
+    backup_dir = os.path.join(workdir, "backups")
+    os.environ.update({
+        "RCON_HOST": "127.0.0.1",
+        "RCON_PORT": str(port),
+        "RCON_PASSWORD": PASSWORD,
+        "DATA_DIR": data_dir,
+        "BACKUP_DIR": backup_dir,
+        "BACKUP_STATUS_FILE": os.path.join(backup_dir, "last-backup.json"),
+    })
+    for setting in args.backup_env:
+        key, _, value = setting.partition("=")
+        os.environ[key] = value
+
+    # Both read their settings from the environment when imported
+    import rcon
+    import monitor
+    import backup
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    mock = start_mock(args, port)
+    results: Dict[str, Any] = {
+        "mock": {"latency": args.latency, "jitter": args.jitter, "save_delay": args.save_delay,
+                 "timeout_rate": args.timeout_rate, "auth_fail_rate": args.auth_fail_rate},
+    }
+    try:
+        if "poll" in args.only:
+            logger.info(f"Polling server status {args.iterations} times")
+            results["poll"] = bench_poll(monitor, args.iterations)
+        if "probe" in args.only:
+            logger.info(f"Probing {args.iterations} times per connection kind, then once frozen")
+            results["probe"] = bench_probe(rcon, port, mock, args.iterations, args.probe_timeout)
+        if "saveoff" in args.only:
+            generate_world(data_dir, args.world_mb)
+            logger.info(f"Backing up a {args.world_mb} MB world {args.backups} times")
+            results["saveoff"] = bench_saveoff(backup, args.backups)
+    finally:
+        mock.terminate()
+        mock.wait()
+    return results
+
+
+def print_results(results: Dict[str, Any], prefix: str = ""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print_results(value, f"{prefix}{key}.")
+        else:
+            print(f"{prefix}{key:<{max(1, 40 - len(prefix))}} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the monitor and backup RCON paths against mockrcon.py.")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help=f"Benchmarks to run, comma separated (default: {','.join(BENCHMARKS)})")
+    parser.add_argument("--iterations", type=int, default=200, help="Polls and probes (default: 200)")
+    parser.add_argument("--backups", type=int, default=3, help="Backups to time (default: 3)")
+    parser.add_argument("--world-mb", type=int, default=16, help="Size of the generated world (default: 16)")
+    parser.add_argument("--probe-timeout", type=float, default=5.0,
+                        help="RCON timeout for probes, as the monitor uses (default: 5)")
+    parser.add_argument("--backup-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Backup setting to use, may be repeated")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock: seconds before every reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Mock: up to this many extra seconds")
+    parser.add_argument("--save-delay", type=float, default=0.5, help="Mock: seconds \"save-all\" takes")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Mock: share of replies held back")
+    parser.add_argument("--auth-fail-rate", type=float, default=0.0, help="Mock: share of logins rejected")
+    parser.add_argument("--colour", choices=("section", "ansi", "none"), default="section",
+                        help="Mock: colour codes in replies (default: section)")
+    parser.add_argument("--seed", type=int, help="Mock: random seed for jitter and faults")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the mock's and the scripts' logs")
+    args = parser.parse_args()
+
+    args.only = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [BENCH] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    # Stays at INFO when the monitor's and backup's own logs are quietened
+    logger.setLevel(logging.INFO)
+    with tempfile.TemporaryDirectory(prefix="benchrcon-") as workdir:
+        try:
+            results = run(args, workdir)
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Minecraft Proxy Load Test
+Drives a swarm of synthetic clients at a Minecraft port and reports how it
+held up: accept rate, p50/p99 latency and errors, per kind of client.
+
+Each connection is one of:
+    status      Handshake, status request, ping; done when the pong arrives
+    legacy      Pre-1.7 (0xFE) server list ping; done when the kick arrives
+    login       Handshake and login start; done at the first reply (the
+                backend's, once spliced, or the proxy's "starting up" disconnect)
+    handshake   A handshake, then hang up; measures connect and accept only
+    idle        Slowloris: one byte of a handshake, then silence; done when
+                the server drops the socket
+    malformed   A garbage, oversized or truncated packet; done when the
+                server drops the socket
+
+"Accepted" means the TCP connect succeeded, "ok" that the exchange finished
+as a well-behaved server would finish it. Latency is measured from the start
+of the connect to that point.
+
+With --local, a mock backend and docker/server/proxy.py are started on free
+loopback ports, so changes to the network path can be benchmarked without a
+server or a container. Clients are spread over several 127.x.y.z source
+addresses (Linux routes all of 127/8 to loopback), so the proxy's per-address
+limits see a crowd rather than one very busy address. The local proxy's own
+stats (connections refused, connect latency to the backend) are included in
+the --json output.
+
+Usage:
+    loadtest.py --local sleeping --connections 5000 --concurrency 200
+    loadtest.py --local forward --mix status=1,login=1
+    loadtest.py --target 127.0.0.1:25565 --mix idle=1 --idle-hold 30
+    loadtest.py --serve-backend 25566          Only run the mock backend
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import collections
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker", "server"))
+
+from mcproto import (
+    MAX_STATUS_LENGTH, READ_TIMEOUT, STATE_LOGIN, STATE_STATUS, ProtocolError, create_handshake,
+    create_legacy_ping, create_legacy_status_response, create_login_start, create_ping_packet,
+    create_pong_packet, create_status_request, create_status_response, create_string_packet,
+    parse_handshake, read_packet, write_varint,
+)
+
+PROXY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker", "server", "proxy.py")
+SCENARIOS = ("status", "legacy", "login", "handshake", "idle", "malformed")
+DEFAULT_MIX = "status=50,legacy=5,login=20,handshake=10,idle=5,malformed=10"
+CONNECT_TIMEOUT = 5.0          # Seconds to wait for the TCP connect
+RESPONSE_TIMEOUT = 30.0        # Seconds to wait for a reply; held logins may take up to 25
+STARTUP_TIMEOUT = 10.0         # Seconds to wait for the local proxy to listen
+STATS_WAIT = 6.0               # Seconds to wait for the proxy's next stats snapshot (it writes every 5)
+
+MOCK_STATUS = {
+    "version": {"name": "Mock 1.21.1", "protocol": 767},
+    "players": {"max": 20, "online": 0},
+    "description": {"text": "Load test backend"},
+    "enforcesSecureChat": False
+}
+
+
+def log(message):
+    print(f"[LoadTest] {message}", file=sys.stderr, flush=True)
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def parse_mix(text):
+    """Parse "status=50,login=20" into scenario weights."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown client kind {name!r} (one of {', '.join(SCENARIOS)})")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight for {name}: {weight!r}")
+    if not any(w > 0 for w in mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def malformed_packet(rng):
+    """Pick one of the ways a broken client or a scanner gets the protocol wrong."""
+    return rng.choice((
+        b"\xff\xff\xff\xff\xff\x01",                     # VarInt longer than 5 bytes
+        write_varint(1 << 20) + b"\x00" * 16,            # Length far over the limit
+        write_varint(0),                                 # Empty packet
+        create_string_packet(0x05, "not a handshake"),   # Wrong packet ID
+        b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n",    # Wrong protocol entirely
+        write_varint(40) + b"\x00\x01",                  # Truncated, then silence
+    ))
+
+
+class Results:
+    """Outcomes and latencies per client kind."""
+
+    def __init__(self):
+        self.attempts = collections.Counter()
+        self.accepted = collections.Counter()
+        self.ok = collections.Counter()
+        self.errors = collections.defaultdict(collections.Counter)
+        self.latencies = collections.defaultdict(list)
+
+    def record(self, kind, accepted, error, elapsed):
+        self.attempts[kind] += 1
+        if accepted:
+            self.accepted[kind] += 1
+        if error:
+            self.errors[kind][error] += 1
+        else:
+            self.ok[kind] += 1
+            self.latencies[kind].append(elapsed)
+
+    def summary(self, duration):
+        kinds = {}
+        for kind in SCENARIOS:
+            if not self.attempts[kind]:
+                continue
+            latencies = sorted(self.latencies[kind])
+            kinds[kind] = {
+                "attempts": self.attempts[kind],
+                "accepted": self.accepted[kind],
+                "ok": self.ok[kind],
+                "accept_rate": round(self.accepted[kind] / self.attempts[kind], 4),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+                "errors": dict(self.errors[kind]),
+            }
+        attempts = sum(self.attempts.values())
+        return {
+            "duration_s": round(duration, 3),
+            "attempts": attempts,
+            "connections_per_s": round(attempts / duration, 1) if duration else None,
+            "accept_rate": round(sum(self.accepted.values()) / attempts, 4) if attempts else None,
+            "ok_rate": round(sum(self.ok.values()) / attempts, 4) if attempts else None,
+            "kinds": kinds,
+        }
+
+
+def print_report(summary):
+    print(f"{summary['attempts']} connections in {summary['duration_s']:.1f}s "
+          f"({summary['connections_per_s']}/s), accepted {summary['accept_rate']:.1%}, "
+          f"ok {summary['ok_rate']:.1%}")
+    print(f"{'kind':<10} {'attempts':>8} {'accept':>7} {'ok':>7} {'p50 ms':>9} {'p99 ms':>9}  errors")
+    for kind, k in summary["kinds"].items():
+        p50 = f"{k['p50_ms']:.2f}" if k["p50_ms"] is not None else "-"
+        p99 = f"{k['p99_ms']:.2f}" if k["p99_ms"] is not None else "-"
+        errors = ", ".join(f"{name}={count}" for name, count in sorted(k["errors"].items())) or "-"
+        print(f"{kind:<10} {k['attempts']:>8} {k['accept_rate']:>7.1%} {k['ok'] / k['attempts']:>7.1%} "
+              f"{p50:>9} {p99:>9}  {errors}")
+
+
+class Swarm:
+    """Opens connections of the configured mix from a pool of workers."""
+
+    def __init__(self, host, port, mix, sources, idle_hold, seed=None):
+        self.host = host
+        self.port = port
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.idle_hold = idle_hold
+        self.rng = random.Random(seed)
+        self.results = Results()
+        # Only loopback targets can be reached from arbitrary 127.x.y.z sources
+        loopback = host.startswith("127.") or host == "localhost"
+        self.sources = [f"127.0.{i // 254}.{1 + i % 254}"
+                        for i in range(sources)] if loopback and sources > 1 else [None]
+        self.next_source = 0
+
+    async def open(self):
+        source = self.sources[self.next_source % len(self.sources)]
+        self.next_source += 1
+        return await asyncio.wait_for(asyncio.open_connection(
+            self.host, self.port, local_addr=(source, 0) if source else None), CONNECT_TIMEOUT)
+
+    async def exchange(self, kind, reader, writer):
+        """Play one client; raises on anything a well-behaved server would not do."""
+        if kind == "status":
+            writer.write(create_handshake(STATE_STATUS, self.host, self.port) + create_status_request())
+            packet_id, _ = await read_packet(reader, max_length=MAX_STATUS_LENGTH, timeout=RESPONSE_TIMEOUT)
+            if packet_id != 0x00:
+                raise ProtocolError("expected a status response")
+            token = self.rng.getrandbits(64).to_bytes(8, "big")
+            writer.write(create_ping_packet(token))
+            packet_id, payload = await read_packet(reader, timeout=RESPONSE_TIMEOUT)
+            if packet_id != 0x01 or payload != token:
+                raise ProtocolError("bad pong")
+        elif kind == "legacy":
+            writer.write(create_legacy_ping())
+            head = await asyncio.wait_for(reader.readexactly(3), RESPONSE_TIMEOUT)
+            if head[0] != 0xFF:
+                raise ProtocolError("expected a legacy kick")
+            await asyncio.wait_for(reader.readexactly(2 * int.from_bytes(head[1:], "big")), RESPONSE_TIMEOUT)
+        elif kind == "login":
+            name = f"load{self.rng.randrange(10000)}"
+            writer.write(create_handshake(STATE_LOGIN, self.host, self.port) + create_login_start(name))
+            await read_packet(reader, max_length=MAX_STATUS_LENGTH, timeout=RESPONSE_TIMEOUT)
+        elif kind == "handshake":
+            writer.write(create_handshake(STATE_STATUS, self.host, self.port))
+            await writer.drain()
+        else:
+            writer.write(b"\x10" if kind == "idle" else malformed_packet(self.rng))
+            await writer.drain()
+            limit = self.idle_hold if kind == "idle" else RESPONSE_TIMEOUT
+            # Anything the server sends back is fine; what matters is that it hangs up
+            while await asyncio.wait_for(reader.read(4096), limit):
+                pass
+
+    async def client(self, kind):
+        started = time.monotonic()
+        accepted = False
+        error = None
+        writer = None
+        try:
+            reader, writer = await self.open()
+            accepted = True
+            await self.exchange(kind, reader, writer)
+        except ConnectionRefusedError:
+            error = "refused"
+        except (asyncio.TimeoutError, TimeoutError):
+            error = "timeout" if accepted else "connect_timeout"
+        except asyncio.IncompleteReadError:
+            error = "closed"
+        except ConnectionResetError:
+            # A drop is the expected end of an idle or malformed client
+            error = None if kind in ("idle", "malformed") else "reset"
+        except ProtocolError:
+            error = "protocol"
+        except OSError as e:
+            error = f"os_{e.errno}" if e.errno else "os"
+        finally:
+            if writer is not None:
+                writer.close()
+        self.results.record(kind, accepted, error, time.monotonic() - started)
+
+    async def run(self, connections, concurrency, duration=None):
+        """Open connections until the count or the duration runs out; return the wall time."""
+        started = time.monotonic()
+        remaining = [connections]
+
+        async def worker():
+            while remaining[0] > 0 and (duration is None or time.monotonic() - started < duration):
+                remaining[0] -= 1
+                await self.client(self.rng.choices(self.kinds, self.weights)[0])
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.monotonic() - started
+
+
+class MockBackend:
+    """Stands in for the server: answers pings and turns every login away."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            first = await asyncio.wait_for(reader.readexactly(1), READ_TIMEOUT)
+            if first[0] == 0xFE:
+                await asyncio.sleep(self.delay)
+                writer.write(create_legacy_status_response(MOCK_STATUS))
+                return
+            packet_id, payload = await read_packet(reader, first=first)
+            if packet_id != 0x00:
+                return
+            _, next_state = parse_handshake(payload)
+            await read_packet(reader)
+            await asyncio.sleep(self.delay)
+            if next_state == STATE_STATUS:
+                writer.write(create_status_response(MOCK_STATUS))
+                packet_id, payload = await read_packet(reader)
+                if packet_id == 0x01:
+                    writer.write(create_pong_packet(payload))
+            else:
+                writer.write(create_string_packet(0x00, json.dumps({"text": "Mock backend"})))
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, port):
+        return await asyncio.start_server(self.handle, "127.0.0.1", port, backlog=1024)
+
+
+async def start_proxy(mode, wake_mode, backend_port, stats_file, proxy_log):
+    """Run proxy.py in front of the mock backend and wait until it listens."""
+    port = free_port()
+    cmd = [sys.executable, PROXY, str(port), str(backend_port), "--wake-mode", wake_mode,
+           "--stats-file", stats_file]
+    if mode == "sleeping":
+        cmd.append("--sleeping")
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
+                               stderr=proxy_log if proxy_log else subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"proxy exited with status {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return process, port
+        except OSError:
+            await asyncio.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("proxy did not start listening")
+
+async def read_proxy_stats(stats_file, after, timeout=STATS_WAIT):
+    """The proxy's own stats, from the first snapshot written after the run ended."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(stats_file) as f:
+                stats = json.load(f)
+            if stats.get("timestamp", 0) >= after:
+                return stats
+        except (OSError, ValueError):
+            pass
+        await asyncio.sleep(0.25)
+    return None
+
+
+async def run(args):
+    swarm_args = (args.mix, args.sources, args.idle_hold, args.seed)
+    if not args.local:
+        host, _, port = args.target.rpartition(":")
+        swarm = Swarm(host or "127.0.0.1", int(port), *swarm_args)
+        return {"target": args.target, **swarm.results.summary(
+            await swarm.run(args.connections, args.concurrency, args.duration))}
+
+    backend = MockBackend(args.backend_delay)
+    backend_port = free_port()
+    server = await backend.start(backend_port)
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_file = os.path.join(tmp, "proxy-stats.json")
+        proxy_log = open(args.proxy_log, "a") if args.proxy_log else None
+        process, port = await start_proxy(args.local, args.wake_mode, backend_port, stats_file, proxy_log)
+        try:
+            swarm = Swarm("127.0.0.1", port, *swarm_args)
+            log(f"Proxy ({args.local}, {args.wake_mode}) on port {port}, mock backend on port {backend_port}")
+            summary = swarm.results.summary(await swarm.run(args.connections, args.concurrency, args.duration))
+            summary["target"] = f"local {args.local}"
+            summary["backend_connections"] = backend.connections
+            summary["proxy"] = await read_proxy_stats(stats_file, time.time())
+            return summary
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+            server.close()
+            if proxy_log:
+                proxy_log.close()
+
+async def serve_backend(port, delay):
+    server = await MockBackend(delay).start(port)
+    log(f"Mock backend listening on port {port}")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a Minecraft port with a swarm of synthetic clients.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--target", help="HOST:PORT to test")
+    target.add_argument("--local", choices=("sleeping", "forward"),
+                        help="Start proxy.py in this mode in front of a mock backend and test it")
+    target.add_argument("--serve-backend", type=int, metavar="PORT", help="Only run the mock backend")
+    parser.add_argument("--connections", type=int, default=1000, help="Connections to open (default: 1000)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Connections open at once (default: 50)")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds even if connections remain")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Weights of each kind of client (default: {DEFAULT_MIX})")
+    parser.add_argument("--idle-hold", type=float, default=20.0,
+                        help="Seconds an idle client waits to be dropped before counting a timeout (default: 20)")
+    parser.add_argument("--sources", type=int, default=256,
+                        help="Loopback source addresses to spread clients over; 1 puts every client "
+                             "behind the proxy's per-address limits (default: 256)")
+    parser.add_argument("--seed", type=int, help="Random seed, for a repeatable sequence of clients")
+    parser.add_argument("--wake-mode", choices=("hold", "disconnect"), default="hold",
+                        help="Wake mode of the local proxy (default: hold)")
+    parser.add_argument("--backend-delay", type=float, default=0.0,
+                        help="Seconds the mock backend waits before each reply (default: 0)")
+    parser.add_argument("--proxy-log", help="Append the local proxy's log to this file")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    if args.serve_backend:
+        try:
+            asyncio.run(serve_backend(args.serve_backend, args.backend_delay))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    try:
+        summary = asyncio.run(run(args))
+    except RuntimeError as e:
+        log(str(e))
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+if __name__ == '__main__':
+    main()
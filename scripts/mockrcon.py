@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Mock RCON Server
+Source RCON stand-in for a Paper server, for measuring the monitor and the
+backup system without one.
+
+Answers the commands they send (list, tps, save-off, save-on, save-all) in
+Paper's own formats, with its section-sign colour codes or as ANSI escapes,
+splits long replies into 4096-byte packets and answers unknown packet types
+the way the vanilla server does. Faults can be injected:
+
+    latency     A fixed delay, plus random jitter, before every reply
+    timeouts    A share of replies held back long enough for clients to time out
+    auth        A share of logins rejected even with the right password
+    frozen      Connections are accepted but nothing is read or answered, as
+                with a JVM stopped by autopause; queued requests are answered
+                once it thaws
+
+Usage:
+    mockrcon.py --port 25575 --password minecraft
+    mockrcon.py --latency 0.05 --jitter 0.02 --timeout-rate 0.01
+    mockrcon.py --tps 14.2,17.9,19.6 --colour ansi
+
+While running, SIGUSR1 freezes the server and SIGUSR2 thaws it.
+"""
+
+import re
+import sys
+import time
+import random
+import signal
+import socket
+import struct
+import logging
+import argparse
+import threading
+import socketserver
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Packet types (https://wiki.vg/RCON)
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+MAX_RESPONSE_PAYLOAD = 4096  # The server splits longer replies over several packets
+MAX_PACKET_LENGTH = 4096 + 14
+
+# Section-sign colour codes as the server console prints them
+ANSI_CODES = {
+    "0": "\x1b[0;30;22m", "1": "\x1b[0;34;22m", "2": "\x1b[0;32;22m", "3": "\x1b[0;36;22m",
+    "4": "\x1b[0;31;22m", "5": "\x1b[0;35;22m", "6": "\x1b[0;33;22m", "7": "\x1b[0;37;22m",
+    "8": "\x1b[0;30;1m", "9": "\x1b[0;34;1m", "a": "\x1b[0;32;1m", "b": "\x1b[0;36;1m",
+    "c": "\x1b[0;31;1m", "d": "\x1b[0;35;1m", "e": "\x1b[0;33;1m", "f": "\x1b[0;37;1m",
+    "r": "\x1b[m",
+}
+COLOUR_CODE_RE = re.compile(r"§([0-9a-fr])")
+COLOURS = ("section", "ansi", "none")
+
+
+def tps_colour(tps: float) -> str:
+    """Paper's colour for a TPS value: green, yellow or red."""
+    return "§a" if tps >= 18.0 else "§e" if tps >= 16.0 else "§c"
+
+
+def format_tps(values: Tuple[float, ...]) -> str:
+    """Paper's reply to "tps"; values over 20 are capped and starred."""
+    shown = [f"{tps_colour(v)}{'*' if v > 20.0 else ''}{min(round(v, 2), 20.0)}" for v in values]
+    return f"§6TPS from last 1m, 5m, 15m: {', '.join(shown)}"
+
+
+class MockState:
+    """Scripted server state and fault settings, shared by every connection."""
+
+    def __init__(self, password: str = "minecraft", players: Optional[List[str]] = None,
+                 max_players: int = 20, tps: Tuple[float, ...] = (20.0, 20.0, 20.0),
+                 colour: str = "section", latency: float = 0.0, jitter: float = 0.0,
+                 save_delay: float = 0.5, timeout_rate: float = 0.0, timeout_seconds: float = 15.0,
+                 auth_fail_rate: float = 0.0, frozen: bool = False, seed: Optional[int] = None):
+        self.password = password
+        self.players = players if players is not None else ["Alex", "Steve"]
+        self.max_players = max_players
+        self.tps = tps
+        self.colour = colour
+        self.latency = latency
+        self.jitter = jitter
+        self.save_delay = save_delay
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.auth_fail_rate = auth_fail_rate
+        self.saving = True
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thawed = threading.Event()
+        if not frozen:
+            self.thawed.set()
+        self.counts: Dict[str, int] = {}
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def chance(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    def freeze(self):
+        self.thawed.clear()
+        logger.info("Frozen: requests are queued unanswered")
+
+    def thaw(self):
+        self.thawed.set()
+        logger.info("Thawed")
+
+    def delay(self):
+        """Wait out the configured latency, or a timeout if one is injected."""
+        if self.chance(self.timeout_rate):
+            self.count("timeouts")
+            time.sleep(self.timeout_seconds)
+            return
+        with self.lock:
+            jitter = self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency or jitter:
+            time.sleep(self.latency + jitter)
+
+    def colourize(self, text: str) -> str:
+        if self.colour == "ansi":
+            return COLOUR_CODE_RE.sub(lambda m: ANSI_CODES[m.group(1)], text) + ANSI_CODES["r"]
+        if self.colour == "none":
+            return COLOUR_CODE_RE.sub("", text)
+        return text
+
+    def execute(self, command: str) -> str:
+        """The server's reply to a console command."""
+        name, _, args = command.strip().lstrip("/").partition(" ")
+        self.count(f"command_{name or 'empty'}")
+        if name == "list":
+            reply = f"There are {len(self.players)} of a max of {self.max_players} players online: "
+            return reply + ", ".join(self.players)
+        if name == "tps":
+            return self.colourize(format_tps(self.tps))
+        if name == "save-off":
+            if not self.saving:
+                return "Saving is already turned off"
+            self.saving = False
+            return "Automatic saving is now disabled"
+        if name == "save-on":
+            if self.saving:
+                return "Saving is already turned on"
+            self.saving = True
+            return "Automatic saving is now enabled"
+        if name == "save-all":
+            # The reply only comes once the world is written, as with "flush"
+            time.sleep(self.save_delay)
+            return "Saving the game (this may take a moment!)Saved the game"
+        return self.colourize("§cUnknown or incomplete command, see below for error")
+
+
+class RconHandler(socketserver.BaseRequestHandler):
+    """One RCON connection: authenticate, then answer commands in order."""
+
+    def read_exact(self, size: int) -> Optional[bytes]:
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def read_packet(self) -> Optional[Tuple[int, int, str]]:
+        header = self.read_exact(4)
+        if header is None:
+            return None
+        (length,) = struct.unpack("<i", header)
+        if length < 10 or length > MAX_PACKET_LENGTH:
+            return None
+        data = self.read_exact(length)
+        if data is None:
+            return None
+        request_id, packet_type = struct.unpack("<ii", data[:8])
+        return request_id, packet_type, data[8:-2].decode("utf-8", errors="replace")
+
+    def send_packet(self, request_id: int, packet_type: int, payload: str):
+        body = payload.encode("utf-8")
+        chunks = [body[i:i + MAX_RESPONSE_PAYLOAD] for i in range(0, len(body), MAX_RESPONSE_PAYLOAD)] or [b""]
+        for chunk in chunks:
+            packet = struct.pack("<ii", request_id, packet_type) + chunk + b"\x00\x00"
+            self.request.sendall(struct.pack("<i", len(packet)) + packet)
+
+    def handle(self):
+        state: MockState = self.server.state
+        state.count("connections")
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        authenticated = False
+        try:
+            while True:
+                # A stopped JVM reads nothing; the kernel still accepts and buffers
+                state.thawed.wait()
+                packet = self.read_packet()
+                if packet is None:
+                    return
+                state.thawed.wait()
+                request_id, packet_type, payload = packet
+                if packet_type == SERVERDATA_AUTH:
+                    state.delay()
+                    if payload == state.password and not state.chance(state.auth_fail_rate):
+                        authenticated = True
+                        state.count("auth_ok")
+                        self.send_packet(request_id, SERVERDATA_AUTH_RESPONSE, "")
+                    else:
+                        state.count("auth_failed")
+                        self.send_packet(-1, SERVERDATA_AUTH_RESPONSE, "")
+                elif not authenticated:
+                    # The vanilla server drops unauthenticated connections
+                    return
+                elif packet_type == SERVERDATA_EXECCOMMAND:
+                    state.delay()
+                    self.send_packet(request_id, SERVERDATA_RESPONSE_VALUE, state.execute(payload))
+                else:
+                    # Unknown types get one reply with the same ID, which clients use as an end marker
+                    self.send_packet(request_id, SERVERDATA_RESPONSE_VALUE, f"Unknown request {packet_type:x}")
+        except OSError:
+            pass
+
+
+class MockRconServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], state: MockState):
+        self.state = state
+        super().__init__(address, RconHandler)
+
+
+def parse_tps_values(text: str) -> Tuple[float, ...]:
+    values = tuple(float(v) for v in text.split(","))
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError("give the 1m, 5m and 15m TPS, e.g. 19.8,20,20")
+    return values
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [MOCKRCON] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="Source RCON stand-in for a Paper server.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=25575, help="Port to listen on (default: 25575)")
+    parser.add_argument("--password", default="minecraft", help="RCON password (default: minecraft)")
+    parser.add_argument("--players", default="Alex,Steve", help="Online players, comma separated")
+    parser.add_argument("--max-players", type=int, default=20, help="Player limit (default: 20)")
+    parser.add_argument("--tps", type=parse_tps_values, default=(20.0, 20.0, 20.0),
+                        help="1m, 5m and 15m TPS (default: 20,20,20)")
+    parser.add_argument("--colour", choices=COLOURS, default="section",
+                        help="Colour codes in replies: section signs, ANSI escapes or none (default: section)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before every reply (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds, at random")
+    parser.add_argument("--save-delay", type=float, default=0.5,
+                        help="Seconds \"save-all\" takes to write the world (default: 0.5)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0,
+                        help="Share of replies held back for --timeout-seconds (default: 0)")
+    parser.add_argument("--timeout-seconds", type=float, default=15.0,
+                        help="How long a held-back reply waits (default: 15, past the clients' timeouts)")
+    parser.add_argument("--auth-fail-rate", type=float, default=0.0,
+                        help="Share of logins rejected despite the right password (default: 0)")
+    parser.add_argument("--frozen", action="store_true", help="Start frozen, as a paused server")
+    parser.add_argument("--seed", type=int, help="Random seed for jitter and injected faults")
+    args = parser.parse_args()
+
+    state = MockState(
+        password=args.password, players=[p for p in args.players.split(",") if p],
+        max_players=args.max_players, tps=args.tps, colour=args.colour, latency=args.latency,
+        jitter=args.jitter, save_delay=args.save_delay, timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds, auth_fail_rate=args.auth_fail_rate,
+        frozen=args.frozen, seed=args.seed,
+    )
+    try:
+        server = MockRconServer((args.host, args.port), state)
+    except OSError as e:
+        logger.error(f"Cannot listen on port {args.port}: {e}")
+        sys.exit(1)
+
+    signal.signal(signal.SIGUSR1, lambda s, f: state.freeze())
+    signal.signal(signal.SIGUSR2, lambda s, f: state.thaw())
+    signal.signal(signal.SIGTERM, lambda s, f: sys.exit(0))
+    logger.info(f"Listening on {args.host}:{args.port}{' (frozen)' if args.frozen else ''}")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Served: {state.counts}")
+
+
+if __name__ == "__main__":
+    main()